@@ -1,2 +1,9 @@
-from .constants import Direction, ScreenType, DEFAULTS, SUPPORTED_EXTENSIONS
-from .core import Pixelgreat, pixelgreat
+from .constants import Direction, ScreenType, Quality, DEFAULTS, get_supported_extensions
+from .core import Pixelgreat, PixelgreatVariants, pixelgreat
+
+
+# Compute SUPPORTED_EXTENSIONS lazily, on first access
+def __getattr__(name):
+    if name == "SUPPORTED_EXTENSIONS":
+        return get_supported_extensions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
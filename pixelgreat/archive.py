@@ -0,0 +1,137 @@
+import io
+import os
+import time
+import struct
+import tarfile
+import zipfile
+
+from .constants import ARCHIVE_EXTENSIONS
+
+# The header before each file in a zip archive, and its size
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+# Writes the frames of an image sequence into one uncompressed archive (.tar or .zip), in order, as they are made
+# Each frame is flushed as soon as it is added, so readers can use the frames before the archive is closed
+# The data is only forced to the disk (fsync) every fsync_every frames, and when closed (0 - only when closed)
+class SequenceArchive:
+    def __init__(self, file_name, fsync_every=0):
+        self.file_name = file_name
+        self.ext = os.path.splitext(file_name)[1].lower()
+        if self.ext not in ARCHIVE_EXTENSIONS:
+            raise ValueError(f"\"{self.ext}\" is not a supported archive format "
+                             f"(expected one of: {', '.join(ARCHIVE_EXTENSIONS)})")
+
+        if fsync_every < 0:
+            raise ValueError(f"Frames between syncs must be no less than 0 (got {fsync_every})")
+        self.fsync_every = fsync_every
+
+        self.file = open(file_name, "wb")
+        if self.ext == ".tar":
+            self.archive = tarfile.open(fileobj=self.file, mode="w")
+        else:
+            self.archive = zipfile.ZipFile(self.file, mode="w", compression=zipfile.ZIP_STORED)
+
+        self.names = set()
+        self.unsynced_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Add a file (the bytes of an encoded frame) to the end of the archive
+    def add(self, name, data):
+        if name in self.names:
+            raise ValueError(f"\"{name}\" is already in the archive")
+        self.names.add(name)
+
+        now = time.time()
+        if self.ext == ".tar":
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(now)
+            info.mode = 0o644
+            self.archive.addfile(info, io.BytesIO(data))
+        else:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(now)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self.archive.writestr(info, data)
+        self.file.flush()
+
+        self.unsynced_count += 1
+        if 0 < self.fsync_every <= self.unsynced_count:
+            self.sync()
+
+    # Force everything added so far to the disk
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced_count = 0
+
+    # Finish the archive (the end of a tar, or the directory of a zip), and force it to the disk
+    def close(self):
+        if self.file.closed:
+            return
+
+        self.archive.close()
+        self.sync()
+        self.file.close()
+
+
+# Get the name, data offset and size of every complete file in an archive made by SequenceArchive, in order
+# This also works while the archive is still being written (only the files that are completely written are listed)
+def list_archive(file_name):
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext not in ARCHIVE_EXTENSIONS:
+        raise ValueError(f"\"{ext}\" is not a supported archive format "
+                         f"(expected one of: {', '.join(ARCHIVE_EXTENSIONS)})")
+
+    file_size = os.path.getsize(file_name)
+    members = list()
+    with open(file_name, "rb") as file:
+        if ext == ".tar":
+            try:
+                with tarfile.open(fileobj=file, mode="r|") as archive:
+                    for info in archive:
+                        if not info.isfile() or info.offset_data + info.size > file_size:
+                            break
+                        members.append((info.name, info.offset_data, info.size))
+            except (tarfile.ReadError, EOFError):
+                pass
+        else:
+            # The directory of a zip is only written when it is closed, so walk the headers before each file instead
+            position = 0
+            while True:
+                file.seek(position)
+                header = file.read(ZIP_LOCAL_HEADER_SIZE)
+                if len(header) < ZIP_LOCAL_HEADER_SIZE or header[:4] != ZIP_LOCAL_HEADER_SIGNATURE:
+                    break
+
+                flags, method = struct.unpack("<HH", header[6:10])
+                size, name_length, extra_length = struct.unpack("<4xIHH", header[18:30])
+                # Files with their sizes after the data, or compressed files, aren't made by SequenceArchive
+                if flags & 0x08 or method != zipfile.ZIP_STORED:
+                    break
+
+                name = file.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+                offset = position + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+                if offset + size > file_size:
+                    break
+
+                members.append((name, offset, size))
+                position = offset + size
+
+    return members
+
+
+# Read every complete file in an archive made by SequenceArchive, in order, as (name, bytes)
+# This also works while the archive is still being written
+def read_archive(file_name):
+    members = list_archive(file_name)
+    with open(file_name, "rb") as file:
+        for name, offset, size in members:
+            file.seek(offset)
+            yield name, file.read(size)
@@ -0,0 +1,336 @@
+import os
+import warnings
+from PIL import Image, ImageChops, ImageEnhance, ImageStat
+
+from . import helpers
+
+# The environment variable used to pick a backend when none is given
+BACKEND_ENVIRONMENT_VARIABLE = "PIXELGREAT_BACKEND"
+
+# The backend used when none is given, and when the requested one isn't available
+DEFAULT_BACKEND = "pillow"
+
+# Every known backend class, by name
+BACKENDS = dict()
+
+
+# A class decorator that adds a backend to the registry
+def register_backend(backend_class):
+    BACKENDS[backend_class.name] = backend_class
+
+    return backend_class
+
+
+# Get the names of the backends that can run on this system
+def get_available_backends():
+    return [name for name, backend_class in BACKENDS.items() if backend_class.is_available()]
+
+
+# Get a backend object by name (or from the environment), falling back to Pillow if it can't be used
+def get_backend(name=None, color_mode="RGB"):
+    if name is None:
+        name = os.environ.get(BACKEND_ENVIRONMENT_VARIABLE, DEFAULT_BACKEND)
+    name = name.lower()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend \"{name}\" (expected one of: {', '.join(BACKENDS)})")
+
+    backend_class = BACKENDS[name]
+    if not backend_class.is_available():
+        warnings.warn(f"The \"{name}\" backend is not available on this system, using \"{DEFAULT_BACKEND}\"")
+        backend_class = BACKENDS[DEFAULT_BACKEND]
+    elif not backend_class.supports_mode(color_mode):
+        warnings.warn(f"The \"{name}\" backend does not support the color mode \"{color_mode}\", "
+                      f"using \"{DEFAULT_BACKEND}\"")
+        backend_class = BACKENDS[DEFAULT_BACKEND]
+
+    return backend_class()
+
+
+# Get the pixel value a color has in a color mode (ex. the alpha channel Pillow adds for RGBA)
+def get_mode_color(color_mode, color):
+    value = Image.new(color_mode, (1, 1), color).getpixel((0, 0))
+    if not isinstance(value, tuple):
+        value = (value,)
+
+    return value
+
+
+# Get the mean that ImageEnhance.Contrast blends towards (of the grayscale image, rounded)
+def get_contrast_mean(image):
+    return int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+
+
+# The reference backend, every stage is a Pillow operation
+@register_backend
+class PillowBackend:
+    name = "pillow"
+
+    @staticmethod
+    def is_available():
+        return True
+
+    @staticmethod
+    def supports_mode(color_mode):
+        return True
+
+    # Convert a mask (an image, or an array from another backend) to the form used by apply_masks()
+    def prepare_mask(self, mask):
+        if not isinstance(mask, Image.Image):
+            return Image.fromarray(mask)
+
+        return mask
+
+    # Get the size of a prepared mask
+    def get_mask_size(self, mask):
+        return mask.size
+
+    # Raise contrast and brightness by the same factor
+    # The contrast is around the mean of the image, or the given mean (ex. of the image before it was downscaled)
+    def tone(self, image, value, mean=None):
+        if mean is None:
+            image = ImageEnhance.Contrast(image).enhance(value)
+        else:
+            # The same as ImageEnhance.Contrast, with the given mean
+            degenerate = Image.new("L", image.size, mean).convert(image.mode)
+            if "A" in image.getbands():
+                degenerate.putalpha(image.getchannel("A"))
+            image = Image.blend(degenerate, image, value)
+        image = ImageEnhance.Brightness(image).enhance(value)
+
+        return image
+
+    # Multiply by the scanline mask, lighten to the washout color, and multiply by the grid mask
+    # The box is the area of the masks that the image covers
+    def apply_masks(self, image, box, scanline_mask=None, washout_color=None, grid_mask=None):
+        if scanline_mask is not None:
+            image = ImageChops.multiply(image, self.crop_mask(scanline_mask, box))
+
+        if washout_color is not None:
+            image = ImageChops.lighter(image, Image.new(image.mode, image.size, washout_color))
+
+        if grid_mask is not None:
+            image = ImageChops.multiply(image, self.crop_mask(grid_mask, box))
+
+        return image
+
+    def crop_mask(self, mask, box):
+        if box == (0, 0) + mask.size:
+            return mask
+
+        return mask.crop(box)
+
+    # Lighten an image with a darkened, blurred copy of itself
+    # With box_blur, it is blurred with a single box blur instead of a gaussian (see helpers.get_blur_filter)
+    def bloom(self, image, bloom_size, bloom_strength, box_blur=False):
+        bloom = image.filter(helpers.get_blur_filter(bloom_size, box_blur=box_blur))
+        bloom = helpers.mix_color_with_image(bloom, (0, 0, 0), 1 - bloom_strength)
+
+        return ImageChops.lighter(image, bloom)
+
+
+# Runs the pointwise stages as NumPy array operations, with the masks kept as arrays
+# Results are identical to the Pillow backend (the same integer and float32 math is used)
+@register_backend
+class NumpyBackend(PillowBackend):
+    name = "numpy"
+
+    @staticmethod
+    def is_available():
+        try:
+            import numpy
+        except ImportError:
+            return False
+
+        return True
+
+    @staticmethod
+    def supports_mode(color_mode):
+        return color_mode in ["RGB", "RGBA"]
+
+    def __init__(self):
+        import numpy
+        self.np = numpy
+
+    def to_array(self, image):
+        return self.np.asarray(image)
+
+    def from_array(self, array):
+        return Image.fromarray(array)
+
+    def prepare_mask(self, mask):
+        return self.to_array(mask)
+
+    def get_mask_size(self, mask):
+        return mask.shape[1], mask.shape[0]
+
+    def crop_mask(self, mask, box):
+        return mask[box[1]:box[3], box[0]:box[2]]
+
+    # Blend towards a color like Image.blend() does: float32 math, truncated to 8 bits
+    def blend_array(self, array, target, factor):
+        np = self.np
+        result = array.astype(np.float32)
+        result += np.float32(factor) * (np.asarray(target, dtype=np.float32) - result)
+
+        return np.clip(result, 0, 255).astype(np.uint8)
+
+    def tone(self, image, value, mean=None):
+        np = self.np
+        array = self.to_array(image)
+        if mean is None:
+            mean = get_contrast_mean(image)
+
+        # Only the color channels change, alpha is kept as-is (like ImageEnhance)
+        result = array.copy()
+        color = result[..., :3]
+        color[...] = self.blend_array(np.full_like(color, mean), array[..., :3], value)
+        color[...] = self.blend_array(np.zeros_like(color), color, value)
+
+        return self.from_array(result)
+
+    def apply_masks(self, image, box, scanline_mask=None, washout_color=None, grid_mask=None):
+        np = self.np
+        if scanline_mask is None and washout_color is None and grid_mask is None:
+            return image
+
+        result = self.to_array(image).astype(np.uint16)
+
+        if scanline_mask is not None:
+            result *= self.crop_mask(scanline_mask, box)
+            result //= 255
+
+        if washout_color is not None:
+            np.maximum(result, np.asarray(washout_color, dtype=np.uint16), out=result)
+
+        if grid_mask is not None:
+            result *= self.crop_mask(grid_mask, box)
+            result //= 255
+
+        return self.from_array(result.astype(np.uint8))
+
+    def bloom(self, image, bloom_size, bloom_strength, box_blur=False):
+        np = self.np
+        bloom = self.to_array(image.filter(helpers.get_blur_filter(bloom_size, box_blur=box_blur)))
+
+        factor = 1 - bloom_strength
+        if factor > 0:
+            bloom = self.blend_array(bloom, get_mode_color(image.mode, (0, 0, 0)), factor)
+
+        return self.from_array(np.maximum(self.to_array(image), bloom))
+
+
+# Runs the pointwise stages as JIT compiled per-pixel loops (needs numba)
+# The masks and washout are fused into a single pass over the image
+@register_backend
+class NumbaBackend(NumpyBackend):
+    name = "numba"
+
+    # The compiled kernels, shared by every instance
+    kernels = None
+
+    @staticmethod
+    def is_available():
+        try:
+            import numpy
+            import numba
+        except ImportError:
+            return False
+
+        return True
+
+    def __init__(self):
+        super().__init__()
+        if NumbaBackend.kernels is None:
+            NumbaBackend.kernels = make_numba_kernels()
+
+    def apply_masks(self, image, box, scanline_mask=None, washout_color=None, grid_mask=None):
+        np = self.np
+        if scanline_mask is None and washout_color is None and grid_mask is None:
+            return image
+
+        array = self.to_array(image)
+        channels = array.shape[2]
+
+        # Missing stages are passed as empty arrays so there is only one kernel
+        empty_mask = np.empty((0, 0, channels), dtype=np.uint8)
+        if scanline_mask is None:
+            scanline_mask = empty_mask
+        else:
+            scanline_mask = self.crop_mask(scanline_mask, box)
+        if grid_mask is None:
+            grid_mask = empty_mask
+        else:
+            grid_mask = self.crop_mask(grid_mask, box)
+        if washout_color is None:
+            washout_color = np.empty(0, dtype=np.uint8)
+        else:
+            washout_color = np.asarray(washout_color, dtype=np.uint8)
+
+        result = np.empty_like(array)
+        self.kernels["apply_masks"](array, scanline_mask, washout_color, grid_mask, result)
+
+        return self.from_array(result)
+
+    def bloom(self, image, bloom_size, bloom_strength, box_blur=False):
+        np = self.np
+        bloom = self.to_array(image.filter(helpers.get_blur_filter(bloom_size, box_blur=box_blur)))
+
+        factor = 1 - bloom_strength
+        if factor <= 0:
+            return self.from_array(np.maximum(self.to_array(image), bloom))
+
+        result = np.empty_like(bloom)
+        self.kernels["bloom"](
+            self.to_array(image),
+            bloom,
+            np.asarray(get_mode_color(image.mode, (0, 0, 0)), dtype=np.float32),
+            np.float32(factor),
+            result
+        )
+
+        return self.from_array(result)
+
+
+# Compile the numba kernels (only done the first time a NumbaBackend is made)
+def make_numba_kernels():
+    import numpy as np
+    import numba
+
+    @numba.njit(parallel=True, cache=False)
+    def apply_masks(image, scanline_mask, washout_color, grid_mask, result):
+        use_scanlines = scanline_mask.shape[0] > 0
+        use_washout = washout_color.shape[0] > 0
+        use_grid = grid_mask.shape[0] > 0
+        for y in numba.prange(image.shape[0]):
+            for x in range(image.shape[1]):
+                for c in range(image.shape[2]):
+                    value = np.int32(image[y, x, c])
+                    if use_scanlines:
+                        value = (value * np.int32(scanline_mask[y, x, c])) // 255
+                    if use_washout:
+                        value = max(value, np.int32(washout_color[c]))
+                    if use_grid:
+                        value = (value * np.int32(grid_mask[y, x, c])) // 255
+                    result[y, x, c] = value
+
+    @numba.njit(parallel=True, cache=False)
+    def bloom(image, blurred, color, factor, result):
+        for y in numba.prange(image.shape[0]):
+            for x in range(image.shape[1]):
+                for c in range(image.shape[2]):
+                    # Same float32 math and truncation as Image.blend()
+                    value = np.float32(blurred[y, x, c])
+                    value = value + factor * (color[c] - value)
+                    if value <= 0:
+                        darkened = 0
+                    elif value >= 255:
+                        darkened = 255
+                    else:
+                        darkened = np.int32(value)
+                    result[y, x, c] = max(np.int32(image[y, x, c]), darkened)
+
+    return {
+        "apply_masks": apply_masks,
+        "bloom": bloom
+    }
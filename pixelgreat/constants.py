@@ -1,8 +1,71 @@
+import functools
 from enum import Enum
-from PIL import Image
 
 DESCRIPTION = "A highly realistic RGB pixel filter"
 
+# The command line arguments a --variant can change, as (short name, long name)
+VARIANT_ARGUMENTS = (
+    ("o", "output"),
+    ("s", "size"),
+    ("os", "output-scale"),
+    ("t", "type"),
+    ("d", "direction"),
+    ("a", "aspect"),
+    ("npx", "no-pixelate"),
+    ("br", "brighten"),
+    ("b", "blur"),
+    ("w", "washout"),
+    ("sst", "scanline-strength"),
+    ("ssp", "scanline-spacing"),
+    ("ssz", "scanline-size"),
+    ("sb", "scanline-blur"),
+    ("gst", "grid-strength"),
+    ("p", "padding"),
+    ("r", "rounding"),
+    ("bst", "bloom-strength"),
+    ("bsz", "bloom-size"),
+    ("fb", "fast-blur"),
+    ("ft", "fast-tone"),
+    ("q", "quality"),
+    ("rg", "reducing-gap"),
+    ("pcl", "png-compress-level"),
+    ("pst", "png-strategy"),
+    ("wm", "webp-method"),
+    ("jq", "jpeg-quality"),
+    ("jss", "jpeg-subsampling"),
+    ("j", "threads")
+)
+
+# The extra arguments a --variant can change for single images
+SINGLE_VARIANT_ARGUMENTS = VARIANT_ARGUMENTS + (
+    ("dts", "dzi-tile-size"),
+    ("dov", "dzi-overlap"),
+    ("dtf", "dzi-tile-format")
+)
+
+# The extra arguments a --variant can change for image sequences
+SEQUENCE_VARIANT_ARGUMENTS = VARIANT_ARGUMENTS + (
+    ("inc", "incremental"),
+    ("ar", "archive"),
+    ("fsy", "fsync-every")
+)
+
+# The command line arguments that apply to the whole run, so a --variant can't change them
+RUN_ARGUMENTS = (
+    ("i", "input"),
+    ("v", "variant"),
+    ("nd", "no-draft"),
+    ("ms", "memory-stats"),
+    ("dr", "dry-run"),
+    ("et", "encode-threads"),
+    ("fs", "start"),
+    ("fe", "end"),
+    ("fst", "step"),
+    ("sh", "shard"),
+    ("shi", "shard-interleaved"),
+    ("pj", "progress-json")
+)
+
 
 class Direction(Enum):
     VERTICAL = "V"
@@ -15,6 +78,20 @@ class ScreenType(Enum):
     CRT_MONITOR = "CRT_MONITOR"
 
 
+class PngStrategy(Enum):
+    DEFAULT = "DEFAULT"
+    FILTERED = "FILTERED"
+    HUFFMAN_ONLY = "HUFFMAN_ONLY"
+    RLE = "RLE"
+    FIXED = "FIXED"
+
+
+class Quality(Enum):
+    DRAFT = "DRAFT"
+    BALANCED = "BALANCED"
+    FINAL = "FINAL"
+
+
 DEFAULTS = {
     "screen_type": ScreenType.LCD,
     "pixel_padding": {
@@ -56,7 +133,91 @@ DEFAULTS = {
     "bloom_strength": 1.0,
     "grid_strength": 1.0,
     "pixelate": True,
-    "output_scale": 1.0
+    "output_scale": 1.0,
+    "threads": 1,
+    "preview_scale": 0.25,
+    "preview_area": 480 * 270,
+    "quality": Quality.FINAL
+}
+
+# What each quality uses, FINAL is the exact rendering
+# subpixels: how many times larger the grid tile is drawn before it is scaled down
+# tile_resample: the Pillow resampling filter (by name) that scales the grid tile down and resizes it to fit
+# box_blur: if the bloom and scanlines use a single box blur instead of a gaussian
+# reducing_gap, fast_blur, fast_tone: the defaults of the Pixelgreat() arguments with the same names
+QUALITY_SETTINGS = {
+    "DRAFT": {
+        "subpixels": 4,
+        "tile_resample": "BILINEAR",
+        "box_blur": True,
+        "reducing_gap": 1.0,
+        "fast_blur": True,
+        "fast_tone": True
+    },
+    "BALANCED": {
+        "subpixels": 8,
+        "tile_resample": "LANCZOS",
+        "box_blur": False,
+        "reducing_gap": 3.0,
+        "fast_blur": True,
+        "fast_tone": True
+    },
+    "FINAL": {
+        "subpixels": 8,
+        "tile_resample": "LANCZOS",
+        "box_blur": False,
+        "reducing_gap": None,
+        "fast_blur": False,
+        "fast_tone": False
+    }
 }
 
-SUPPORTED_EXTENSIONS = tuple([ex for ex, f in Image.registered_extensions().items() if f in Image.OPEN])
+# Settings for saving output images (None keeps Pillow's own default)
+ENCODER_DEFAULTS = {
+    "png_compress_level": None,
+    "png_strategy": None,
+    "webp_method": None,
+    "jpeg_quality": None,
+    "jpeg_subsampling": None,
+    "encode_threads": 2,
+    "fsync_every": 0
+}
+
+# The archive types an image sequence can be saved into (see archive.py)
+ARCHIVE_EXTENSIONS = (".tar", ".zip")
+
+# The output extension that saves a Deep Zoom tile pyramid instead of one image (see deepzoom.py)
+DEEP_ZOOM_EXTENSION = ".dzi"
+
+# Settings for Deep Zoom tile pyramids
+DEEP_ZOOM_DEFAULTS = {
+    "tile_size": 254,
+    "overlap": 1,
+    "tile_ext": ".png"
+}
+
+# Settings for the time estimates of Pixelgreat.explain()
+EXPLAIN_DEFAULTS = {
+    "samples": 3,  # How many synthetic frames are timed (after one that isn't, to warm up)
+    "calibration_pixels": 2000000  # Larger outputs only time a band of about this many pixels, then scale it up
+}
+
+# The version of the compiled filter file format (see Pixelgreat.save_compiled())
+# Change this whenever the masks built from the same settings change, so old files are rejected
+COMPILED_VERSION = 1
+
+
+# Get the file extensions Pillow can open
+# This makes Pillow load every image plugin, so it is only done the first time it's needed
+@functools.lru_cache(maxsize=None)
+def get_supported_extensions():
+    from PIL import Image
+
+    return tuple([ex for ex, f in Image.registered_extensions().items() if f in Image.OPEN])
+
+
+# Compute SUPPORTED_EXTENSIONS lazily, on first access
+def __getattr__(name):
+    if name == "SUPPORTED_EXTENSIONS":
+        return get_supported_extensions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
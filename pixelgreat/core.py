@@ -1,12 +1,18 @@
 import os
+import sys
+import shlex
 import argparse
+import contextlib
 import warnings
 import time
+import functools
+import collections
 from PIL import Image
 
-from .constants import ScreenType, Direction, DESCRIPTION, DEFAULTS, SUPPORTED_EXTENSIONS
+from .constants import ScreenType, Direction, PngStrategy, Quality, DESCRIPTION, DEFAULTS, QUALITY_SETTINGS, \
+    ENCODER_DEFAULTS, COMPILED_VERSION, ARCHIVE_EXTENSIONS, DEEP_ZOOM_EXTENSION, DEEP_ZOOM_DEFAULTS, \
+    SINGLE_VARIANT_ARGUMENTS, SEQUENCE_VARIANT_ARGUMENTS, RUN_ARGUMENTS, get_supported_extensions
 from . import helpers
-from . import filters
 
 
 # ---- MAIN CLASSES AND FUNCTIONS ----
@@ -32,7 +38,16 @@ class Pixelgreat:
                  rounding=None,  # Set default based on screen type
                  bloom_strength=None,  # Set to a static default
                  bloom_size=None,  # Set to a static default
-                 color_mode=None  # Set to a static default
+                 color_mode=None,  # Set to a static default
+                 incremental=False,
+                 backend=None,  # Set from the PIXELGREAT_BACKEND environment variable, or Pillow
+                 threads=None,  # Set to a static default
+                 masks=None,  # Precomputed masks (ex. from pixelgreat.shared), built if not given
+                 lazy=False,  # Build the masks on the first full render, instead of now
+                 fast_blur=False,  # Upscale and blur in one step with an exact gaussian (needs NumPy, not identical)
+                 fast_tone=False,  # Brighten after downscaling instead of before (not identical)
+                 reducing_gap=None,  # Reduce by a whole factor before the exact downscale (faster, not identical)
+                 quality=None  # Set to a static default
                  ):
         # Get basic settings used for all filters
         helpers.assert_value_in_range(
@@ -255,6 +270,15 @@ class Pixelgreat:
             raise ValueError(f"The color mode must have a red channel, "
                              f"a green channel, and a blue channel (got {color_mode})")
 
+        if threads is None:
+            threads = DEFAULTS["threads"]
+        helpers.assert_value_in_range(
+            threads,
+            minimum=1,
+            message="Threads must be no less than {min} (got {val})"
+        )
+        self.threads = int(threads)
+
         # Compute actual pixel width based on the desired size of the smallest side
         if pixel_aspect > 1:
             # Wider than tall, use as height (to compute width)
@@ -263,7 +287,49 @@ class Pixelgreat:
             # Taller than wide, use as width
             self.pixel_width = round(self.pixel_size)
 
+        # Optionally only re-render what changed between consecutive images
+        if not isinstance(incremental, bool):
+            raise ValueError("The incremental argument must be a valid boolean value")
+        self.incremental = incremental
+
+        if not isinstance(lazy, bool):
+            raise ValueError("The lazy argument must be a valid boolean value")
+        self.lazy = lazy
+
+        # The quality picks how exact the slowest parts of the rendering are (see QUALITY_SETTINGS)
+        # It only turns the fast options on, never off (and the fast blur only if NumPy is available)
+        if quality is None:
+            quality = DEFAULTS["quality"]
+        if not isinstance(quality, Quality):
+            raise ValueError("The quality argument must be a valid Quality instance")
+        self.quality = quality
+        quality_settings = QUALITY_SETTINGS[self.quality.value]
+
+        if not isinstance(fast_blur, bool):
+            raise ValueError("The fast_blur argument must be a valid boolean value")
+        self.fast_blur = fast_blur
+        if quality_settings["fast_blur"] and not self.fast_blur:
+            from . import backends
+            self.fast_blur = "numpy" in backends.get_available_backends()
+
+        if not isinstance(fast_tone, bool):
+            raise ValueError("The fast_tone argument must be a valid boolean value")
+        self.fast_tone = fast_tone or quality_settings["fast_tone"]
+
+        if reducing_gap is None:
+            reducing_gap = quality_settings["reducing_gap"]
+        if reducing_gap is not None:
+            helpers.assert_value_in_range(
+                reducing_gap,
+                minimum=1,
+                message="Reducing gap must be no less than {min} (got {val})"
+            )
+        self.reducing_gap = reducing_gap
+
         # Create the composite filter object with the selected settings
+        # (filters is imported here so "import pixelgreat" and "--help" don't have to load it)
+        from . import filters
+        self.backend = backend
         self.filter = filters.CompositeFilter(
             screen_type=self.screen_type,
             pixel_width=self.pixel_width,
@@ -283,11 +349,247 @@ class Pixelgreat:
             grid_strength=self.grid_strength,
             pixelate=self.pixelate,
             output_size=self.output_size,
-            color_mode=self.color_mode
+            color_mode=self.color_mode,
+            backend=self.backend,
+            threads=self.threads,
+            masks=masks,
+            lazy_masks=self.lazy,
+            fast_blur=self.fast_blur,
+            fast_tone=self.fast_tone,
+            reducing_gap=self.reducing_gap,
+            subpixels=quality_settings["subpixels"],
+            tile_resample=Image.Resampling[quality_settings["tile_resample"]],
+            box_blur=quality_settings["box_blur"]
+        )
+
+        if self.incremental:
+            self.incremental_filter = filters.IncrementalFilter(self.filter)
+        else:
+            self.incremental_filter = None
+
+        # Smaller copies of this object used by preview(), by scale
+        self.preview_converters = dict()
+
+    # With a region (a box of the output image), only that box is rendered (identical to cropping the full output)
+    # Regions don't use or change the previous image kept for incremental renders
+    def apply(self, image, profiler=None, region=None):
+        if region is not None:
+            return self.filter.apply(image, profiler=profiler, region=region)
+
+        if self.incremental_filter is not None:
+            return self.incremental_filter.apply(image, profiler=profiler)
+
+        return self.filter.apply(image, profiler=profiler)
+
+    # Get the smallest size an image can be decoded at without changing the pixelated image (see helpers.draft_image)
+    # None if not pixelating, the full image is needed then
+    def get_draft_size(self):
+        return self.filter.get_downscale_size()
+
+    # Render an image without blocking the asyncio event loop (a coroutine)
+    # The render runs on an executor (the event loop's default one if not given), use pool.ConverterPool to limit how
+    # many renders run at once. Cancelling stops a render that hasn't started, a running one finishes and is dropped
+    async def apply_async(self, image, executor=None, profiler=None, region=None):
+        # asyncio is only imported when it's used, it is slow to import
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor,
+            functools.partial(self.apply, image, profiler=profiler, region=region)
         )
 
-    def apply(self, image):
-        return self.filter.apply(image)
+    # Render a quick, scaled down version of an image first, then the full version (a generator)
+    # Each step yields (scale, image), and the full render only runs when the next step is asked for
+    def preview(self, image, scale=None):
+        preview_converter = self.get_preview_converter(scale)
+        if preview_converter is not None:
+            preview_size = preview_converter.output_size
+            yield preview_size[0] / self.output_size[0], preview_converter.apply(image)
+
+        yield 1.0, self.apply(image)
+
+    # Render a quick, scaled down version of an image, then the full version on a background thread
+    # The callback is called as callback(scale, image) for each step, returns a Future of the full image
+    def preview_async(self, image, callback, scale=None):
+        import concurrent.futures
+
+        steps = self.preview(image, scale=scale)
+
+        # The preview step is done right away
+        scale, result = next(steps)
+        callback(scale, result)
+        if scale == 1.0:
+            future = concurrent.futures.Future()
+            future.set_result(result)
+            return future
+
+        def refine():
+            refined_scale, refined = next(steps)
+            callback(refined_scale, refined)
+            return refined
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(refine)
+        executor.shutdown(wait=False)
+
+        return future
+
+    # Get the smaller copy of this object used by preview(), or None if it wouldn't be smaller
+    # The pixel size is scaled with the output size, so the blur and bloom radii scale too
+    def get_preview_converter(self, scale=None):
+        if scale is None:
+            # Use a quarter of the size, but keep large previews small enough to be quick
+            output_area = self.output_size[0] * self.output_size[1]
+            scale = min(DEFAULTS["preview_scale"], (DEFAULTS["preview_area"] / output_area) ** 0.5)
+        helpers.assert_value_in_range(
+            scale,
+            minimum=0,
+            maximum=1,
+            message="Preview scale must be between {min} and {max} (got {val})"
+        )
+        # Pixels can't be made smaller than 3 pixels
+        scale = max(scale, 3 / self.pixel_size)
+
+        preview_size = (max(round(self.output_size[0] * scale), 3), max(round(self.output_size[1] * scale), 3))
+        if scale >= 1 or preview_size == self.output_size:
+            return None
+
+        if scale not in self.preview_converters:
+            settings = self.get_settings()
+            settings["output_size"] = preview_size
+            settings["pixel_size"] = self.pixel_size * scale
+            settings["incremental"] = False
+            settings["threads"] = 1
+            # Small pixels are expected here, they're only used for a preview
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                self.preview_converters[scale] = Pixelgreat(backend=self.backend, **settings)
+
+        return self.preview_converters[scale]
+
+    # Get the settings this object was made with (after defaults are applied)
+    # Passing them back to Pixelgreat() makes an identical object
+    def get_settings(self):
+        return {
+            "output_size": self.output_size,
+            "pixel_size": self.pixel_size,
+            "screen_type": self.screen_type,
+            "direction": self.direction,
+            "pixel_aspect": self.pixel_aspect,
+            "pixelate": self.pixelate,
+            "brighten": self.brighten,
+            "blur": self.blur,
+            "washout": self.washout,
+            "scanline_strength": self.scanline_strength,
+            "scanline_spacing": self.scanline_spacing,
+            "scanline_size": self.scanline_size,
+            "scanline_blur": self.scanline_blur,
+            "grid_strength": self.grid_strength,
+            "pixel_padding": self.pixel_padding,
+            "rounding": self.rounding,
+            "bloom_strength": self.bloom_strength,
+            "bloom_size": self.bloom_size,
+            "color_mode": self.color_mode,
+            "incremental": self.incremental,
+            "threads": self.threads,
+            "fast_blur": self.fast_blur,
+            "fast_tone": self.fast_tone,
+            "reducing_gap": self.reducing_gap,
+            "quality": self.quality
+        }
+
+    # Get the adjusted masks used while rendering, in the form the backend uses
+    def get_masks(self):
+        return self.filter.get_masks()
+
+    # Save the settings, grid tile, and masks to a file, so load_compiled() doesn't have to build the masks again
+    # The file is an .npz file (needs NumPy), optionally compressed (smaller, but can't be memory-mapped)
+    def save_compiled(self, file_name, compress=False):
+        import json
+        import numpy as np
+
+        settings = get_compiled_settings(self.get_settings())
+        arrays = {
+            "settings": np.array(json.dumps(settings, sort_keys=True)),
+            "hash": np.array(get_compiled_hash(settings))
+        }
+
+        grid_tile = self.get_grid_filter_tile()
+        if grid_tile is not None:
+            arrays["grid_tile"] = np.asarray(grid_tile)
+        for name, mask in self.get_masks().items():
+            if mask is not None:
+                arrays[name] = np.asarray(mask)
+
+        helpers.save_npz(file_name, arrays, compress=compress)
+
+    # Make a Pixelgreat object from a file made by save_compiled(), without building the masks
+    # With mmap, the masks are memory-mapped from the file (only if it isn't compressed)
+    # The backend, threads, and incremental settings don't change the masks, so they can be changed here
+    @staticmethod
+    def load_compiled(file_name, mmap=False, backend=None, threads=None, incremental=None):
+        import json
+
+        arrays = helpers.load_npz(file_name, mmap=mmap)
+        if "settings" not in arrays or "hash" not in arrays:
+            raise ValueError(f"\"{file_name}\" is not a compiled Pixelgreat file")
+
+        settings = json.loads(str(arrays["settings"]))
+        if get_compiled_hash(settings) != str(arrays["hash"]):
+            raise ValueError(f"\"{file_name}\" was made by a different version of Pixelgreat, "
+                             f"or has been changed (save it again with save_compiled())")
+
+        settings = get_settings_from_compiled(settings)
+        if threads is not None:
+            settings["threads"] = threads
+        if incremental is not None:
+            settings["incremental"] = incremental
+
+        masks = {name: arrays[name] for name in ["scanline", "grid", "grid_tile"] if name in arrays}
+
+        return Pixelgreat(backend=backend, masks=masks, **settings)
+
+    # Get the bytes held by each mask (and incremental frame) this object keeps in memory, plus a "total"
+    def memory_report(self):
+        report = self.filter.memory_report()
+        if self.incremental_filter is not None:
+            report.pop("total")
+            report.update(self.incremental_filter.memory_report())
+            report["total"] = sum(byte_count for name, byte_count in report.items() if name != "total")
+
+        return report
+
+    # Describe what rendering an image will do and cost, without a real image: the stages that run, the sizes the
+    # settings work out to, the memory the masks hold (estimated if they aren't built yet), the time each frame
+    # takes and the time building the masks takes (from rendering a few synthetic frames, see
+    # CompositeFilter.calibrate)
+    # Prints the description (if verbose) to stream (the standard output if None), and returns it as a dict
+    def explain(self, input_size=None, samples=None, verbose=True, stream=None):
+        if input_size is None:
+            input_size = self.filter.output_size
+
+        timings, build_time = self.filter.calibrate(input_size, samples=samples)
+        plan = {
+            "stages": self.filter.get_stage_plan(),
+            "values": self.filter.get_derived_values(),
+            "input_size": tuple(input_size),
+            "masks_built": self.filter.masks_built,
+            "mask_memory": self.filter.estimate_mask_memory(),
+            "build_time": build_time,
+            "timings": timings,
+            "frame_time": sum(timings.values())
+        }
+
+        if verbose:
+            print_plan(plan, stream=stream)
+
+        return plan
+
+    # Forget the previous image, so the next incremental render is a full render
+    def reset(self):
+        if self.incremental_filter is not None:
+            self.incremental_filter.reset()
 
     def get_grid_filter(self, adjusted=False):
         return self.filter.get_grid_filter(adjusted=adjusted)
@@ -299,6 +601,87 @@ class Pixelgreat:
         return self.filter.get_scanline_filter(adjusted=adjusted)
 
 
+# Print a plan made by Pixelgreat.explain() to stream (the standard output if None)
+def print_plan(plan, stream=None):
+    if stream is None:
+        stream = sys.stdout
+    values = plan["values"]
+
+    def print_line(line):
+        print(line, file=stream)
+
+    def format_size(size):
+        return f"{size[0]}x{size[1]}"
+
+    print_line(f"Stages: {', '.join(plan['stages'])}")
+    if values["downscale_size"] is None:
+        print_line(f"Size: {format_size(plan['input_size'])} to {format_size(values['output_size'])} (not pixelated)")
+    else:
+        print_line(f"Size: {format_size(plan['input_size'])} pixelated to {format_size(values['downscale_size'])}, "
+                   f"then {format_size(values['output_size'])}")
+    print_line(f"Pixel width: {values['pixel_width']} px")
+    print_line(f"Blur: {values['blur_px']} px")
+    print_line(f"Bloom size: {values['bloom_size_px']} px")
+    if values["scanline_spacing_px"] is None:
+        print_line("Scanline spacing: no scanlines")
+    else:
+        print_line(f"Scanline spacing: {values['scanline_spacing_px']} px")
+    if values["grid_tile_size"] is None:
+        print_line("Grid tile: no grid")
+    else:
+        tile_count = values["grid_tile_count"]
+        print_line(f"Grid tile: {format_size(values['grid_tile_size'])} px, {tile_count[0]}x{tile_count[1]} tiles "
+                   f"({tile_count[0] * tile_count[1]} total)")
+    print_line(f"Render strips: {values['strips']}")
+    if plan["masks_built"]:
+        print_line(f"Mask memory: {helpers.format_bytes(plan['mask_memory'])}")
+    else:
+        print_line(f"Mask memory: {helpers.format_bytes(plan['mask_memory'])} (estimated, not built yet)")
+        print_line(f"Estimated time to build the masks: {plan['build_time']:.3f} seconds (once, on the first full "
+                   f"render, or a part of it for every region)")
+    print_line(f"Estimated time per frame: {plan['frame_time']:.3f} seconds")
+    for name, seconds in plan["timings"].items():
+        print_line(f"  {name}: {seconds:.3f} seconds")
+
+
+# Convert the settings from Pixelgreat.get_settings() to JSON-compatible values
+def get_compiled_settings(settings):
+    settings = dict(settings)
+    settings["output_size"] = list(settings["output_size"])
+    settings["screen_type"] = settings["screen_type"].value
+    settings["direction"] = settings["direction"].value
+    settings["quality"] = settings["quality"].value
+
+    return settings
+
+
+# Convert settings from get_compiled_settings() back to the arguments of Pixelgreat()
+def get_settings_from_compiled(settings):
+    settings = dict(settings)
+    settings["output_size"] = tuple(settings["output_size"])
+    settings["screen_type"] = ScreenType(settings["screen_type"])
+    settings["direction"] = Direction(settings["direction"])
+    settings["quality"] = Quality(settings["quality"])
+
+    return settings
+
+
+# Get the hash saved in compiled files, which changes with the settings and the file format version
+def get_compiled_hash(settings):
+    return helpers.get_settings_hash({"version": COMPILED_VERSION, "settings": settings})
+
+
+# Get the output size for an input size and an output scale
+def get_output_size(input_size, output_scale=None):
+    if output_scale is None:
+        output_scale = DEFAULTS["output_scale"]
+
+    return (
+        max(round(input_size[0] * output_scale), 3),
+        max(round(input_size[1] * output_scale), 3)
+    )
+
+
 # A single use helper function to process a single image
 def pixelgreat(image,
                pixel_size,
@@ -318,15 +701,14 @@ def pixelgreat(image,
                pixel_padding=None,
                rounding=None,
                bloom_strength=None,
-               bloom_size=None
+               bloom_size=None,
+               threads=None,
+               fast_blur=False,
+               fast_tone=False,
+               reducing_gap=None,
+               quality=None
                ):
-    if output_scale is None:
-        output_scale = DEFAULTS["output_scale"]
-
-    output_size = (
-        max(round(image.width * output_scale), 3),
-        max(round(image.height * output_scale), 3)
-    )
+    output_size = get_output_size(image.size, output_scale)
     pg_object = Pixelgreat(
         output_size=output_size,
         pixel_size=pixel_size,
@@ -346,18 +728,135 @@ def pixelgreat(image,
         bloom_strength=bloom_strength,
         grid_strength=grid_strength,
         pixelate=pixelate,
-        color_mode=image.mode
+        color_mode=image.mode,
+        threads=threads,
+        fast_blur=fast_blur,
+        fast_tone=fast_tone,
+        reducing_gap=reducing_gap,
+        quality=quality
     )
     result = pg_object.apply(image)
 
     return result
 
 
+# Renders several variants of the same images, sharing the work the variants have in common
+# Each variant is a dict of pixelgreat() arguments (without the image), ex. {"pixel_size": 10, "output_scale": 2}
+class PixelgreatVariants:
+    def __init__(self, variants):
+        if len(variants) < 1:
+            raise ValueError("At least 1 variant is required")
+
+        self.variants = list()
+        for variant in variants:
+            if "pixel_size" not in variant:
+                raise ValueError("Every variant requires the argument pixel_size")
+            if "output_size" in variant and "output_scale" in variant:
+                raise ValueError("A variant can't have both an output_size and an output_scale")
+            self.variants.append(dict(variant))
+
+        # The converters for each input size and color mode, in the same order as the variants
+        self.converters = dict()
+
+    # Get the converters for an input size and color mode, made the first time they're needed
+    # Variants with the same settings share a converter, so their masks are only built once
+    # When every variant has an output size, the input size doesn't change the converters
+    def get_converters(self, input_size, color_mode):
+        if all("output_size" in variant for variant in self.variants):
+            key = (None, color_mode)
+        else:
+            key = (tuple(input_size), color_mode)
+        if key not in self.converters:
+            converters_by_settings = dict()
+            converters = list()
+            for variant in self.variants:
+                settings = dict(variant)
+                output_scale = settings.pop("output_scale", None)
+                if "output_size" not in settings:
+                    settings["output_size"] = get_output_size(input_size, output_scale)
+                if "color_mode" not in settings:
+                    settings["color_mode"] = color_mode
+
+                settings_key = repr(sorted(settings.items()))
+                if settings_key not in converters_by_settings:
+                    converters_by_settings[settings_key] = Pixelgreat(**settings)
+                converters.append(converters_by_settings[settings_key])
+            self.converters[key] = converters
+
+        return self.converters[key]
+
+    # Get the smallest size an image can be decoded at without changing what any variant pixelates it to
+    # None if a variant doesn't pixelate (it needs the full image)
+    def get_draft_size(self, input_size, color_mode):
+        draft_size = (0, 0)
+        for converter in self.get_converters(input_size, color_mode):
+            downscale_size = converter.get_draft_size()
+            if downscale_size is None:
+                return None
+            draft_size = (max(draft_size[0], downscale_size[0]), max(draft_size[1], downscale_size[1]))
+
+        return draft_size
+
+    # Apply every variant to an image, returns a list of images in the same order as the variants
+    # The image is converted and brightened once for each color mode and brighten value, and pixelated once
+    # for each pixel size and output size, then every variant only has to do its own rendering
+    def apply(self, image, profiler=None):
+        toned_images = dict()
+        sources = dict()
+        results = dict()
+        outputs = list()
+        for converter in self.get_converters(image.size, image.mode):
+            if id(converter) in results:
+                # The same settings as an earlier variant
+                outputs.append(results[id(converter)].copy())
+                continue
+
+            if converter.incremental:
+                result = converter.apply(image, profiler=profiler)
+            else:
+                composite_filter = converter.filter
+
+                tone_key = composite_filter.get_tone_key()
+                if tone_key not in toned_images:
+                    toned_images[tone_key] = composite_filter.tone_source(image, profiler=profiler)
+
+                source_key = composite_filter.get_source_key()
+                if source_key not in sources:
+                    sources[source_key] = composite_filter.downscale_source(toned_images[tone_key], profiler=profiler)
+
+                result = composite_filter.render(sources[source_key], profiler=profiler)
+
+            results[id(converter)] = result
+            outputs.append(result)
+
+        return outputs
+
+    # Get the bytes held by each converter's masks, named by variant number, plus a "total"
+    def memory_report(self):
+        if len(self.variants) == 1 and len(self.converters) == 1:
+            return list(self.converters.values())[0][0].memory_report()
+
+        report = dict()
+        seen = set()
+        for converters in self.converters.values():
+            for index, converter in enumerate(converters):
+                if id(converter) in seen:
+                    continue
+                seen.add(id(converter))
+                for name, byte_count in converter.memory_report().items():
+                    if name != "total":
+                        report[f"variant_{index + 1}_{name}"] = report.get(f"variant_{index + 1}_{name}", 0) + byte_count
+        report["total"] = sum(report.values())
+
+        return report
+
+
 # ---- PROGRAM EXECUTION ----
 
 
 # Parse arguments for a single image
-def parse_args_single():
+# With variants, the arguments of each --variant are parsed too (as the other arguments with them added at the end)
+def parse_args_single(argv=None, variants=True):
     parser = argparse.ArgumentParser(
         description=f"{DESCRIPTION}\n\n"
                     f"Valid values are shown in {{braces}}\n"
@@ -475,7 +974,117 @@ def parse_args_single():
                             default=DEFAULTS["bloom_size"])
                         )
 
-    parsed_args = parser.parse_args()
+    parser.add_argument("-fb", "--fast-blur", dest="fast_blur", action="store_true",
+                        help="if given, pixelated images are upscaled and blurred in one step with an exact gaussian "
+                             "(faster, within a few levels of the normal blur, needs NumPy)"
+                        )
+
+    parser.add_argument("-ft", "--fast-tone", dest="fast_tone", action="store_true",
+                        help="if given, pixelated images are brightened after they are downscaled instead of before "
+                             "(faster, within a few levels of brightening first)"
+                        )
+
+    parser.add_argument("-rg", "--reducing-gap", dest="reducing_gap", type=float, required=False,
+                        default=None,
+                        help="if given, pixelated images are first reduced by a whole factor (averaging blocks of "
+                             "pixels) to at least this many times the pixelated size, then downscaled exactly "
+                             "(faster, smaller is faster but less exact, 3 is within a few levels) {1 - no limit} "
+                             "[one exact downscale]"
+                        )
+
+    parser.add_argument("-q", "--quality", dest="quality", type=str, required=False,
+                        default=None,
+                        help="how exact the slowest parts of the rendering are, BALANCED turns on -fb, -ft and "
+                             "\"-rg 3\" (faster, within a few levels), DRAFT uses \"-rg 1\", less antialiasing of "
+                             "the grid, and box blurs for the bloom and scanlines too {{{options}}} [{default}]".format(
+                            options=", ".join([quality.value for quality in Quality]),
+                            default=DEFAULTS["quality"].value)
+                        )
+
+    parser.add_argument("-pcl", "--png-compress-level", dest="png_compress_level", type=int, required=False,
+                        default=None,
+                        help="the PNG compression level, lower is faster but larger {0 - 9} [6]"
+                        )
+
+    parser.add_argument("-pst", "--png-strategy", dest="png_strategy", type=str, required=False,
+                        default=None,
+                        help="the zlib strategy used for PNG compression "
+                             "{{{default}, {filtered}, {huffman}, {rle}, {fixed}}} [{default}]".format(
+                            default=PngStrategy.DEFAULT.value,
+                            filtered=PngStrategy.FILTERED.value,
+                            huffman=PngStrategy.HUFFMAN_ONLY.value,
+                            rle=PngStrategy.RLE.value,
+                            fixed=PngStrategy.FIXED.value)
+                        )
+
+    parser.add_argument("-wm", "--webp-method", dest="webp_method", type=int, required=False,
+                        default=None,
+                        help="if given, WEBP images are saved losslessly with this method, "
+                             "lower is faster but larger {0 - 6}"
+                        )
+
+    parser.add_argument("-jq", "--jpeg-quality", dest="jpeg_quality", type=int, required=False,
+                        default=None,
+                        help="the JPEG quality {0 - 100} [75]"
+                        )
+
+    parser.add_argument("-jss", "--jpeg-subsampling", dest="jpeg_subsampling", type=int, required=False,
+                        default=None,
+                        help="the JPEG chroma subsampling, 0 is 4:4:4, 1 is 4:2:2, 2 is 4:2:0 {0 - 2} [2]"
+                        )
+
+    parser.add_argument("-dts", "--dzi-tile-size", dest="dzi_tile_size", type=int, required=False,
+                        default=DEEP_ZOOM_DEFAULTS["tile_size"],
+                        help="the size of the tiles of a Deep Zoom output (an output ending in \"{ext}\", "
+                             "saved as a tile pyramid that is rendered one row of tiles at a time) "
+                             "{{1 - no limit}} [{default}]".format(
+                            ext=DEEP_ZOOM_EXTENSION,
+                            default=DEEP_ZOOM_DEFAULTS["tile_size"])
+                        )
+
+    parser.add_argument("-dov", "--dzi-overlap", dest="dzi_overlap", type=int, required=False,
+                        default=DEEP_ZOOM_DEFAULTS["overlap"],
+                        help="how many pixels the tiles of a Deep Zoom output overlap their neighbors by "
+                             "{{0 - no limit}} [{default}]".format(
+                            default=DEEP_ZOOM_DEFAULTS["overlap"])
+                        )
+
+    parser.add_argument("-dtf", "--dzi-tile-format", dest="dzi_tile_format", type=str, required=False,
+                        default=DEEP_ZOOM_DEFAULTS["tile_ext"][1:],
+                        help="the file type of the tiles of a Deep Zoom output, ex. png or jpg [{default}]".format(
+                            default=DEEP_ZOOM_DEFAULTS["tile_ext"][1:])
+                        )
+
+    parser.add_argument("-j", "--threads", dest="threads", type=int, required=False,
+                        default=None,
+                        help="how many threads to render each image with {{1 - no limit}} [{default}]".format(
+                            default=DEFAULTS["threads"])
+                        )
+
+    parser.add_argument("-nd", "--no-draft", dest="draft", action="store_false",
+                        help="if given, JPEG images are always decoded at full size (by default, when every output is "
+                             "pixelated, they are decoded at the smallest 1/2, 1/4 or 1/8 of their size that isn't "
+                             "smaller than the pixelated image, which is faster)"
+                        )
+
+    parser.add_argument("-ms", "--memory-stats", dest="memory_stats", action="store_true",
+                        help="if given, print the memory held by the filter masks and the peak extra memory "
+                             "used by each stage"
+                        )
+
+    parser.add_argument("-dr", "--dry-run", dest="dry_run", action="store_true",
+                        help="if given, nothing is converted or saved, instead print what converting would do and "
+                             "cost: the stages, the sizes in pixels, the memory held by the masks, and the time per "
+                             "image (timed on a few synthetic images)"
+                        )
+
+    parser.add_argument("-v", "--variant", dest="variant_specs", type=str, required=False, action="append",
+                        help="also save a variant of the output, given as name=value arguments that change the ones "
+                             "above (ex. -v \"os=2 o=out_2x.png\"), can be given more than once "
+                             "(the image is only opened and brightened once for every variant)"
+                        )
+
+    parsed_args = parser.parse_args(argv)
 
     # Interpret string arguments
     if parsed_args.screen_type is not None:
@@ -496,20 +1105,129 @@ def parse_args_single():
         else:
             parser.error(f"\"{parsed_args.direction}\" is not a valid direction")
 
+    if parsed_args.png_strategy is not None:
+        try:
+            parsed_args.png_strategy = PngStrategy(parsed_args.png_strategy.upper())
+        except ValueError:
+            parser.error(f"\"{parsed_args.png_strategy}\" is not a valid PNG strategy")
+
+    if parsed_args.quality is not None:
+        try:
+            parsed_args.quality = Quality(parsed_args.quality.upper())
+        except ValueError:
+            parser.error(f"\"{parsed_args.quality}\" is not a valid quality")
+
+    # Verify the encoder settings are in range
+    for value, minimum, maximum, name in (
+            (parsed_args.png_compress_level, 0, 9, "PNG compress level"),
+            (parsed_args.webp_method, 0, 6, "WEBP method"),
+            (parsed_args.jpeg_quality, 0, 100, "JPEG quality"),
+            (parsed_args.jpeg_subsampling, 0, 2, "JPEG subsampling")
+    ):
+        if value is not None and not minimum <= value <= maximum:
+            parser.error(f"{name} must be between {minimum} and {maximum} (got {value})")
+
     # Verify the target file extensions are supported
     input_name, input_ext = os.path.splitext(parsed_args.image_in)
     input_ext = input_ext.lower()
-    if input_ext not in SUPPORTED_EXTENSIONS:
+    if input_ext not in get_supported_extensions():
         parser.error(f"\"{input_ext}\" is not a supported input format")
 
     output_name, output_ext = os.path.splitext(parsed_args.image_out)
     output_ext = output_ext.lower()
-    if output_ext not in SUPPORTED_EXTENSIONS:
+    if output_ext not in get_supported_extensions() and output_ext != DEEP_ZOOM_EXTENSION:
         parser.error(f"\"{output_ext}\" is not a supported output format")
 
+    # Verify the Deep Zoom settings
+    if parsed_args.dzi_tile_size < 1:
+        parser.error(f"DZI tile size must be no less than 1 (got {parsed_args.dzi_tile_size})")
+    if parsed_args.dzi_overlap < 0:
+        parser.error(f"DZI overlap must be no less than 0 (got {parsed_args.dzi_overlap})")
+    parsed_args.dzi_tile_ext = f".{parsed_args.dzi_tile_format.lower().lstrip('.')}"
+    if parsed_args.dzi_tile_ext not in get_supported_extensions():
+        parser.error(f"\"{parsed_args.dzi_tile_format}\" is not a supported DZI tile format")
+
+    parsed_args.variants = get_variant_args(parser, parse_args_single, parsed_args, argv, variants,
+                                            SINGLE_VARIANT_ARGUMENTS)
+
     return parsed_args
 
 
+# Parse the arguments of every --variant, as the other arguments with the variant's arguments added at the end
+# Variants can only change the arguments in variant_arguments, a list of (short name, long name)
+def get_variant_args(parser, parse_function, parsed_args, argv, variants, variant_arguments):
+    if not variants or parsed_args.variant_specs is None:
+        return list()
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Both names of each argument lead to its option string
+    variant_options = dict()
+    for short_name, long_name in variant_arguments:
+        variant_options[short_name] = f"-{short_name}"
+        variant_options[long_name] = f"--{long_name}"
+    run_names = set([name for names in RUN_ARGUMENTS for name in names])
+
+    variant_args = list()
+    output_names = {os.path.realpath(parsed_args.image_out)}
+    for spec in parsed_args.variant_specs:
+        # Turn "name=value" into "--name value" (or "-name value" for short names), and "name" into a flag
+        variant_argv = list()
+        for token in shlex.split(spec):
+            name, has_value, value = token.partition("=")
+            if name in variant_options:
+                variant_argv.append(variant_options[name])
+            elif name in run_names:
+                parser.error(f"\"{name}\" in the variant \"{spec}\" applies to the whole run, "
+                             f"it can't be changed by a variant")
+            else:
+                parser.error(f"\"{name}\" in the variant \"{spec}\" is not an argument")
+            if has_value:
+                variant_argv.append(value)
+
+        this_args = parse_function(argv + variant_argv, variants=False)
+
+        output_name = os.path.realpath(this_args.image_out)
+        if output_name in output_names:
+            parser.error(f"The variant \"{spec}\" needs its own output (-o)")
+        output_names.add(output_name)
+
+        variant_args.append(this_args)
+
+    return variant_args
+
+
+# Get the pixelgreat() arguments (without the image) from parsed arguments
+def get_variant_from_args(args, color_mode):
+    return {
+        "pixel_size": args.pixel_size,
+        "output_scale": args.output_scale,
+        "screen_type": args.screen_type,
+        "pixel_padding": args.padding,
+        "direction": args.direction,
+        "washout": args.washout,
+        "brighten": args.brighten,
+        "blur": args.blur_amount,
+        "bloom_size": args.bloom_size,
+        "pixel_aspect": args.pixel_aspect,
+        "rounding": args.rounding,
+        "scanline_spacing": args.scanline_spacing,
+        "scanline_size": args.scanline_size,
+        "scanline_blur": args.scanline_blur,
+        "scanline_strength": args.scanline_strength,
+        "bloom_strength": args.bloom_strength,
+        "grid_strength": args.grid_strength,
+        "pixelate": args.pixelate,
+        "color_mode": color_mode,
+        "incremental": getattr(args, "incremental", False),
+        "threads": args.threads,
+        "fast_blur": args.fast_blur,
+        "fast_tone": args.fast_tone,
+        "reducing_gap": args.reducing_gap,
+        "quality": args.quality
+    }
+
+
 # Process a single image
 def single():
     # Parse args
@@ -520,44 +1238,134 @@ def single():
 
     start_time = time.time()
 
-    # Apply the filter to a single image
+    # Make the converter (with every variant)
+    # The output size comes from the full image size, so it doesn't change if the image is decoded at a reduced size
+    # Deep Zoom outputs get their own lazy converters, so their masks are only made one row of tiles at a time
+    # A dry run only estimates the masks, so every converter is lazy then
     print("Converting image...")
-    result = pixelgreat(image=image,
-                        pixel_size=args.pixel_size,
-                        screen_type=args.screen_type,
-                        pixel_padding=args.padding,
-                        direction=args.direction,
-                        washout=args.washout,
-                        brighten=args.brighten,
-                        blur=args.blur_amount,
-                        bloom_size=args.bloom_size,
-                        pixel_aspect=args.pixel_aspect,
-                        rounding=args.rounding,
-                        scanline_spacing=args.scanline_spacing,
-                        scanline_size=args.scanline_size,
-                        scanline_blur=args.scanline_blur,
-                        scanline_strength=args.scanline_strength,
-                        bloom_strength=args.bloom_strength,
-                        grid_strength=args.grid_strength,
-                        pixelate=args.pixelate,
-                        output_scale=args.output_scale
-                        )
-
-    # Save it
-    print("Saving image...")
-    output_name = os.path.realpath(args.image_out)
-    output_dir = os.path.dirname(output_name)
-    os.makedirs(output_dir, exist_ok=True)
-    result.save(output_name)
+    all_args = [args] + args.variants
+    image_args = list()
+    image_variants = list()
+    deep_zoom_outputs = list()
+    for this_args in all_args:
+        variant = get_variant_from_args(this_args, image.mode)
+        variant["output_size"] = get_output_size(image.size, variant.pop("output_scale"))
+        if os.path.splitext(this_args.image_out)[1].lower() == DEEP_ZOOM_EXTENSION:
+            deep_zoom_outputs.append((this_args, Pixelgreat(**variant, lazy=True)))
+        else:
+            if args.dry_run:
+                variant["lazy"] = True
+            image_args.append(this_args)
+            image_variants.append(variant)
+    if len(image_variants) > 0:
+        converter = PixelgreatVariants(image_variants)
+        draft_sizes = [converter.get_draft_size(image.size, image.mode)]
+    else:
+        converter = None
+        draft_sizes = list()
+
+    # Decode JPEGs at a reduced size if it's still larger than the pixelated image
+    draft_sizes += [deep_zoom_converter.get_draft_size() for this_args, deep_zoom_converter in deep_zoom_outputs]
+    if args.draft and None not in draft_sizes:
+        helpers.draft_image(image, (max([size[0] for size in draft_sizes]), max([size[1] for size in draft_sizes])))
+
+    # Only describe what converting would do
+    if args.dry_run:
+        converters = list()
+        if converter is not None:
+            converters += zip(image_args, converter.get_converters(image.size, image.mode))
+        converters += deep_zoom_outputs
+        for this_args, this_converter in converters:
+            print(f"Plan for {this_args.image_out}:")
+            this_converter.explain(input_size=image.size)
+        return
+
+    # Apply the filter to a single image
+    if args.memory_stats:
+        from .profiling import MemoryProfiler
+        memory_profiler = MemoryProfiler()
+    else:
+        memory_profiler = None
+    if converter is not None:
+        results = converter.apply(image, profiler=memory_profiler)
+    else:
+        results = list()
+
+    # Render the Deep Zoom outputs straight into their tiles
+    if len(deep_zoom_outputs) > 0:
+        from .deepzoom import save_deep_zoom
+    for this_args, deep_zoom_converter in deep_zoom_outputs:
+        print(f"Saving Deep Zoom image {this_args.image_out}...")
+        output_name = os.path.realpath(this_args.image_out)
+        os.makedirs(os.path.dirname(output_name), exist_ok=True)
+        save_deep_zoom(
+            deep_zoom_converter,
+            image,
+            output_name,
+            tile_size=this_args.dzi_tile_size,
+            overlap=this_args.dzi_overlap,
+            tile_ext=this_args.dzi_tile_ext,
+            save_options=get_save_options_from_args(this_args, this_args.dzi_tile_ext),
+            profiler=memory_profiler
+        )
+
+    # Save them
+    for this_args, result in zip(image_args, results):
+        print(f"Saving image {this_args.image_out}...")
+        output_name = os.path.realpath(this_args.image_out)
+        output_dir = os.path.dirname(output_name)
+        os.makedirs(output_dir, exist_ok=True)
+        output_ext = os.path.splitext(output_name)[1]
+        helpers.save_image(
+            result,
+            output_name,
+            mode=helpers.get_save_mode(result.mode, output_ext),
+            save_options=get_save_options_from_args(this_args, output_ext)
+        )
 
     end_time = time.time()
     process_time = round(end_time - start_time, 1)
 
-    print(f"Done converting 1 image in {process_time} seconds!\nSaved image: {args.image_out}")
+    if len(all_args) > 1:
+        saved_names = ", ".join([this_args.image_out for this_args in all_args])
+        print(f"Done converting 1 image in {process_time} seconds!\nSaved images: {saved_names}")
+    else:
+        print(f"Done converting 1 image in {process_time} seconds!\nSaved image: {args.image_out}")
+
+    if memory_profiler is not None:
+        converters = [deep_zoom_converter for this_args, deep_zoom_converter in deep_zoom_outputs]
+        if converter is not None:
+            converters.insert(0, converter)
+        print_memory_stats(converters, memory_profiler)
+
+
+# Print the memory held by the converters and the peak extra memory used by each stage
+def print_memory_stats(converters, memory_profiler):
+    for converter in converters:
+        print("Memory held by the converter:")
+        for name, byte_count in converter.memory_report().items():
+            print(f"  {name}: {helpers.format_bytes(byte_count)}")
+
+    print("Peak extra memory used by each stage:")
+    for name, byte_count in memory_profiler.peaks.items():
+        print(f"  {name}: {helpers.format_bytes(byte_count)}")
+
+
+# Get the Image.save() options from the parsed encoder arguments
+def get_save_options_from_args(args, ext):
+    return helpers.get_save_options(
+        ext,
+        png_compress_level=args.png_compress_level,
+        png_strategy=args.png_strategy,
+        webp_method=args.webp_method,
+        jpeg_quality=args.jpeg_quality,
+        jpeg_subsampling=args.jpeg_subsampling
+    )
 
 
 # Parse arguments for an image sequence
-def parse_args_sequence():
+# With variants, the arguments of each --variant are parsed too (as the other arguments with them added at the end)
+def parse_args_sequence(argv=None, variants=True):
     parser = argparse.ArgumentParser(
         description=f"{DESCRIPTION}\n\n"
                     f"Valid values are shown in {{braces}}\n"
@@ -676,7 +1484,155 @@ def parse_args_sequence():
                             default=DEFAULTS["bloom_size"])
                         )
 
-    parsed_args = parser.parse_args()
+    parser.add_argument("-fb", "--fast-blur", dest="fast_blur", action="store_true",
+                        help="if given, pixelated images are upscaled and blurred in one step with an exact gaussian "
+                             "(faster, within a few levels of the normal blur, needs NumPy)"
+                        )
+
+    parser.add_argument("-ft", "--fast-tone", dest="fast_tone", action="store_true",
+                        help="if given, pixelated images are brightened after they are downscaled instead of before "
+                             "(faster, within a few levels of brightening first)"
+                        )
+
+    parser.add_argument("-rg", "--reducing-gap", dest="reducing_gap", type=float, required=False,
+                        default=None,
+                        help="if given, pixelated images are first reduced by a whole factor (averaging blocks of "
+                             "pixels) to at least this many times the pixelated size, then downscaled exactly "
+                             "(faster, smaller is faster but less exact, 3 is within a few levels) {1 - no limit} "
+                             "[one exact downscale]"
+                        )
+
+    parser.add_argument("-q", "--quality", dest="quality", type=str, required=False,
+                        default=None,
+                        help="how exact the slowest parts of the rendering are, BALANCED turns on -fb, -ft and "
+                             "\"-rg 3\" (faster, within a few levels), DRAFT uses \"-rg 1\", less antialiasing of "
+                             "the grid, and box blurs for the bloom and scanlines too {{{options}}} [{default}]".format(
+                            options=", ".join([quality.value for quality in Quality]),
+                            default=DEFAULTS["quality"].value)
+                        )
+
+    parser.add_argument("-pcl", "--png-compress-level", dest="png_compress_level", type=int, required=False,
+                        default=None,
+                        help="the PNG compression level, lower is faster but larger {0 - 9} [6]"
+                        )
+
+    parser.add_argument("-pst", "--png-strategy", dest="png_strategy", type=str, required=False,
+                        default=None,
+                        help="the zlib strategy used for PNG compression "
+                             "{{{default}, {filtered}, {huffman}, {rle}, {fixed}}} [{default}]".format(
+                            default=PngStrategy.DEFAULT.value,
+                            filtered=PngStrategy.FILTERED.value,
+                            huffman=PngStrategy.HUFFMAN_ONLY.value,
+                            rle=PngStrategy.RLE.value,
+                            fixed=PngStrategy.FIXED.value)
+                        )
+
+    parser.add_argument("-wm", "--webp-method", dest="webp_method", type=int, required=False,
+                        default=None,
+                        help="if given, WEBP images are saved losslessly with this method, "
+                             "lower is faster but larger {0 - 6}"
+                        )
+
+    parser.add_argument("-jq", "--jpeg-quality", dest="jpeg_quality", type=int, required=False,
+                        default=None,
+                        help="the JPEG quality {0 - 100} [75]"
+                        )
+
+    parser.add_argument("-jss", "--jpeg-subsampling", dest="jpeg_subsampling", type=int, required=False,
+                        default=None,
+                        help="the JPEG chroma subsampling, 0 is 4:4:4, 1 is 4:2:2, 2 is 4:2:0 {0 - 2} [2]"
+                        )
+
+    parser.add_argument("-j", "--threads", dest="threads", type=int, required=False,
+                        default=None,
+                        help="how many threads to render each image with {{1 - no limit}} [{default}]".format(
+                            default=DEFAULTS["threads"])
+                        )
+
+    parser.add_argument("-nd", "--no-draft", dest="draft", action="store_false",
+                        help="if given, JPEG images are always decoded at full size (by default, when every output is "
+                             "pixelated, they are decoded at the smallest 1/2, 1/4 or 1/8 of their size that isn't "
+                             "smaller than the pixelated image, which is faster)"
+                        )
+
+    parser.add_argument("-ms", "--memory-stats", dest="memory_stats", action="store_true",
+                        help="if given, print the memory held by the filter masks and the peak extra memory "
+                             "used by each stage"
+                        )
+
+    parser.add_argument("-dr", "--dry-run", dest="dry_run", action="store_true",
+                        help="if given, nothing is converted or saved, instead print what converting would do and "
+                             "cost: the stages, the sizes in pixels, the memory held by the masks, and the time per "
+                             "frame (timed on a few synthetic images)"
+                        )
+
+    parser.add_argument("-pj", "--progress-json", dest="progress_json", type=str, required=False,
+                        default=None,
+                        help="if given, write the progress as JSON lines to this file (\"-\" for the standard "
+                             "output, the other messages then go to the standard error), with the time each frame "
+                             "took, frames per second, ETA, bytes written, and a summary at the end [no progress]"
+                        )
+
+    parser.add_argument("-et", "--encode-threads", dest="encode_threads", type=int, required=False,
+                        default=None,
+                        help="how many images to save in the background while the next ones are converted "
+                             "{{0 - no limit, 0 saves each image before converting the next}} [{default}]".format(
+                            default=ENCODER_DEFAULTS["encode_threads"])
+                        )
+
+    parser.add_argument("-fs", "--start", dest="start", type=int, required=False,
+                        default=None,
+                        help="the first frame number to convert {0 - no limit} [the first frame]"
+                        )
+
+    parser.add_argument("-fe", "--end", dest="end", type=int, required=False,
+                        default=None,
+                        help="the last frame number to convert (inclusive) {0 - no limit} [the last frame]"
+                        )
+
+    parser.add_argument("-fst", "--step", dest="step", type=int, required=False,
+                        default=1,
+                        help="only convert every step-th frame number, counting from the start {1 - no limit} [1]"
+                        )
+
+    parser.add_argument("-inc", "--incremental", dest="incremental", action="store_true",
+                        help="if given, only the parts of each image that changed since the previous image are "
+                             "re-rendered (faster for screen recordings, the output is identical)"
+                        )
+
+    parser.add_argument("-sh", "--shard", dest="shard", type=helpers.shard, required=False,
+                        default=None,
+                        help="only convert one part of the frames, given as K/N for the K-th of N parts, so several "
+                             "machines can convert the same sequence without overlapping (ex. -sh 2/4), needs the "
+                             "start and end frames (-fs and -fe) unless the parts are interleaved (-shi) [all frames]"
+                        )
+
+    parser.add_argument("-shi", "--shard-interleaved", dest="shard_interleaved", action="store_true",
+                        help="if given, each part (-sh) gets every N-th frame instead of a block of frames "
+                             "(every part finishes the whole length of the sequence at about the same time)"
+                        )
+
+    parser.add_argument("-ar", "--archive", dest="archive", type=str, required=False,
+                        default=None,
+                        help="if given, the images are saved into this uncompressed archive {.tar, .zip} instead of "
+                             "as separate files, in frame order, named like the output files (the archive can be "
+                             "read while it is being written) [no archive]"
+                        )
+
+    parser.add_argument("-fsy", "--fsync-every", dest="fsync_every", type=int, required=False,
+                        default=None,
+                        help="force the archive to the disk after every this many images {{0 - no limit, 0 only "
+                             "when done}} [{default}]".format(
+                            default=ENCODER_DEFAULTS["fsync_every"])
+                        )
+
+    parser.add_argument("-v", "--variant", dest="variant_specs", type=str, required=False, action="append",
+                        help="also save a variant of the output, given as name=value arguments that change the ones "
+                             "above (ex. -v \"os=2 o=out_2x/frame.png\"), can be given more than once "
+                             "(the image is only opened and brightened once for every variant)"
+                        )
+
+    parsed_args = parser.parse_args(argv)
 
     # Interpret string arguments
     if parsed_args.screen_type is not None:
@@ -697,110 +1653,500 @@ def parse_args_sequence():
         else:
             parser.error(f"\"{parsed_args.direction}\" is not a valid direction")
 
+    if parsed_args.png_strategy is not None:
+        try:
+            parsed_args.png_strategy = PngStrategy(parsed_args.png_strategy.upper())
+        except ValueError:
+            parser.error(f"\"{parsed_args.png_strategy}\" is not a valid PNG strategy")
+
+    if parsed_args.quality is not None:
+        try:
+            parsed_args.quality = Quality(parsed_args.quality.upper())
+        except ValueError:
+            parser.error(f"\"{parsed_args.quality}\" is not a valid quality")
+
+    # Verify the encoder settings are in range
+    for value, minimum, maximum, name in (
+            (parsed_args.png_compress_level, 0, 9, "PNG compress level"),
+            (parsed_args.webp_method, 0, 6, "WEBP method"),
+            (parsed_args.jpeg_quality, 0, 100, "JPEG quality"),
+            (parsed_args.jpeg_subsampling, 0, 2, "JPEG subsampling")
+    ):
+        if value is not None and not minimum <= value <= maximum:
+            parser.error(f"{name} must be between {minimum} and {maximum} (got {value})")
+
     # Verify the target file extensions are supported
     input_name, input_ext = os.path.splitext(parsed_args.image_in)
     input_ext = input_ext.lower()
-    if input_ext not in SUPPORTED_EXTENSIONS:
+    if input_ext not in get_supported_extensions():
         parser.error(f"\"{input_ext}\" is not a supported input format")
 
     output_name, output_ext = os.path.splitext(parsed_args.image_out)
     output_ext = output_ext.lower()
-    if output_ext not in SUPPORTED_EXTENSIONS:
+    if output_ext not in get_supported_extensions():
         parser.error(f"\"{output_ext}\" is not a supported output format")
 
     # Validate the input image actually represents an image sequence
     if helpers.parse_sequenced_image_name(parsed_args.image_in)["error"] is not None:
         parser.error("No image sequence found. Ensure they are named like this: name0000.png, name0001.png, etc.")
 
+    # Verify the frame range
+    if parsed_args.start is not None and parsed_args.start < 0:
+        parser.error(f"Start must be no less than 0 (got {parsed_args.start})")
+    if parsed_args.end is not None and parsed_args.start is not None and parsed_args.end < parsed_args.start:
+        parser.error(f"End must be no less than start (got {parsed_args.end})")
+    if parsed_args.step < 1:
+        parser.error(f"Step must be no less than 1 (got {parsed_args.step})")
+    if parsed_args.shard_interleaved and parsed_args.shard is None:
+        parser.error("Interleaved shards need a shard (-sh)")
+    if parsed_args.shard is not None and not parsed_args.shard_interleaved and (
+            parsed_args.start is None or parsed_args.end is None):
+        # The blocks are split from the frame range, not from the frames that were found (which can differ by machine)
+        parser.error("A shard (-sh) needs the start and end frames (-fs and -fe), or interleaved shards (-shi)")
+
+    # Verify the archive settings
+    if parsed_args.archive is not None:
+        archive_ext = os.path.splitext(parsed_args.archive)[1].lower()
+        if archive_ext not in ARCHIVE_EXTENSIONS:
+            parser.error(f"\"{archive_ext}\" is not a supported archive format")
+    if parsed_args.fsync_every is None:
+        parsed_args.fsync_every = ENCODER_DEFAULTS["fsync_every"]
+    elif parsed_args.fsync_every < 0:
+        parser.error(f"Frames between syncs must be no less than 0 (got {parsed_args.fsync_every})")
+
     # Set default scale
     if parsed_args.output_scale is None:
         parsed_args.output_scale = 1.0
 
+    # Set default encode threads
+    if parsed_args.encode_threads is None:
+        parsed_args.encode_threads = ENCODER_DEFAULTS["encode_threads"]
+    elif parsed_args.encode_threads < 0:
+        parser.error(f"Encode threads must be no less than 0 (got {parsed_args.encode_threads})")
+
+    parsed_args.variants = get_variant_args(
+        parser,
+        parse_args_sequence,
+        parsed_args,
+        argv,
+        variants,
+        SEQUENCE_VARIANT_ARGUMENTS
+    )
+
     return parsed_args
 
 
+# Save a converted image and then close it
+def save_and_close_image(image, output_name, mode, save_options):
+    helpers.save_image(image, output_name, mode=mode, save_options=save_options)
+    image.close()
+
+
+# Encode a converted image (for an archive) and then close it
+def encode_and_close_image(image, ext, mode, save_options):
+    data = helpers.encode_image(image, ext, mode=mode, save_options=save_options)
+    image.close()
+
+    return data
+
+
+# Run a function (ex. to save an image) and time it, returns its result and the seconds it took
+def run_timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start_time
+
+
+# Wait for an image to be saved (in the background) and, for archives, add it to its archive
+# Returns the seconds it took to save (or encode) and the bytes written
+def finish_save(pending_save):
+    future, archive, member_name, output_name = pending_save
+    data, duration = future.result()
+    if archive is not None:
+        archive.add(member_name, data)
+        return duration, len(data)
+
+    return duration, os.path.getsize(output_name)
+
+
+# Add a saved image to the frame it belongs to, and once every image of the frame is saved, report the frame
+def add_saved_image(frame, duration, size, progress_reporter):
+    frame["encode"] += duration
+    frame["bytes"] += size
+    frame["saves_left"] -= 1
+    if frame["saves_left"] == 0 and progress_reporter is not None:
+        progress_reporter.frame(frame["number"], frame["decode"], frame["apply"], frame["encode"], frame["bytes"],
+                                frame["started"])
+
+
 # Process an image sequence
 def sequence():
     args = parse_args_sequence()
+
+    # Report the progress as JSON lines, if asked to
+    # When it goes to the standard output, the other messages are moved to the standard error
+    if args.progress_json is None:
+        convert_sequence(args)
+    elif args.progress_json == "-":
+        progress_stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            convert_sequence(args, progress_stream=progress_stream)
+    else:
+        os.makedirs(os.path.dirname(args.progress_json) or ".", exist_ok=True)
+        with open(args.progress_json, "w") as progress_stream:
+            convert_sequence(args, progress_stream=progress_stream)
+
+
+# Convert an image sequence with the parsed arguments, writing the progress as JSON lines to progress_stream (if given)
+def convert_sequence(args, progress_stream=None):
+    import concurrent.futures
+    from .archive import SequenceArchive
+
     print("Preparing to process image sequence...")
 
     start_time = time.time()
 
-    # Get the full image sequence
-    sequence_info = helpers.get_all_images_in_sequence(args.image_in)
+    # Get the image sequence (only the frames in the range)
+    sequence_info = helpers.get_all_images_in_sequence(args.image_in, start=args.start, end=args.end, step=args.step)
+    if len(sequence_info["files"]) == 0:
+        sys.exit("No frames of the image sequence were found in the given range")
+    if len(sequence_info["missing"]) > 0:
+        print(f"Warning: these frames are missing and will be skipped: "
+              f"{helpers.format_frame_ranges(sequence_info['missing'], args.step)}")
 
     # Get the size and color mode of the first image
+    # This is always the first frame of the whole range, so every shard makes the same output size
     first_image = Image.open(sequence_info["files"][0])
     first_image_size = first_image.size
     first_image_mode = first_image.mode
     first_image.close()
 
-    # Get the output size
-    output_size = (
-        max(round(first_image_size[0] * args.output_scale), 3),
-        max(round(first_image_size[1] * args.output_scale), 3)
-    )
+    # Only keep the frames of this shard (the output names still use the frame numbers, so shards never collide)
+    if args.shard is not None:
+        shard_index, shard_count = args.shard
+        shard_numbers = set(helpers.get_shard_numbers(
+            sequence_info["numbers"],
+            shard_index,
+            shard_count,
+            interleaved=args.shard_interleaved,
+            start=args.start,
+            end=args.end,
+            step=args.step
+        ))
+        frames = [(image_name, number) for image_name, number in zip(sequence_info["files"], sequence_info["numbers"])
+                  if number in shard_numbers]
+        sequence_info["files"] = [image_name for image_name, number in frames]
+        sequence_info["numbers"] = [number for image_name, number in frames]
+        print(f"Converting part {shard_index} of {shard_count} ({len(frames)} frames)")
+        if len(frames) == 0:
+            print("Done, this part has no frames")
+            return
+
+    # Make the re-usable converter object (with every variant)
+    # Every image is converted to the output size of the first image
+    # A dry run only estimates the masks, so the converters are lazy then
+    all_args = [args] + args.variants
+    variants = list()
+    for this_args in all_args:
+        variant = get_variant_from_args(this_args, first_image_mode)
+        variant["output_size"] = get_output_size(first_image_size, variant.pop("output_scale"))
+        if args.dry_run:
+            variant["lazy"] = True
+        variants.append(variant)
+    converter = PixelgreatVariants(variants)
+
+    # Only describe what converting would do, timed at the size the first image is decoded at
+    if args.dry_run:
+        first_image = Image.open(sequence_info["files"][0])
+        if args.draft:
+            helpers.draft_image(first_image, converter.get_draft_size(first_image_size, first_image_mode))
+        input_size = first_image.size
+        first_image.close()
+
+        # Converters shared by several outputs only build their masks once
+        frame_time = 0.0
+        build_times = dict()
+        for this_args, this_converter in zip(all_args, converter.get_converters(first_image_size, first_image_mode)):
+            print(f"Plan for {this_args.image_out}:")
+            plan = this_converter.explain(input_size=input_size)
+            frame_time += plan["frame_time"]
+            build_times[id(this_converter)] = plan["build_time"]
+        total_time = sum(build_times.values()) + frame_time * len(sequence_info["files"])
+        print(f"Estimated time to convert {len(sequence_info['files'])} frames: {total_time:.1f} seconds "
+              f"(building the masks once, without decoding and saving)")
+        return
+
+    # Measure memory, if asked to
+    if args.memory_stats:
+        from .profiling import MemoryProfiler
+        memory_profiler = MemoryProfiler()
+    else:
+        memory_profiler = None
 
-    # Make the re-usable converter object
-    converter = Pixelgreat(
-        output_size=output_size,
-        pixel_size=args.pixel_size,
-        screen_type=args.screen_type,
-        pixel_padding=args.padding,
-        direction=args.direction,
-        washout=args.washout,
-        brighten=args.brighten,
-        blur=args.blur_amount,
-        bloom_size=args.bloom_size,
-        pixel_aspect=args.pixel_aspect,
-        rounding=args.rounding,
-        scanline_spacing=args.scanline_spacing,
-        scanline_size=args.scanline_size,
-        scanline_blur=args.scanline_blur,
-        scanline_strength=args.scanline_strength,
-        bloom_strength=args.bloom_strength,
-        grid_strength=args.grid_strength,
-        pixelate=args.pixelate,
-        color_mode=first_image_mode
+    image_count = len(sequence_info["files"])
+    if progress_stream is not None:
+        from .profiling import ProgressReporter
+        progress_reporter = ProgressReporter(progress_stream, image_count, encode_threads=args.encode_threads)
+    else:
+        progress_reporter = None
+
+    # Make the destination dirs (or archives) if they don't already exist, and decide how to save the images once,
+    # instead of for every image
+    outputs = list()
+    archives = dict()
+    encoder_pool = None
+    pending_saves = collections.deque()
+    try:
+        for this_args in all_args:
+            main_name, ext = os.path.splitext(this_args.image_out)
+
+            if this_args.archive is None:
+                output_dir = os.path.dirname(this_args.image_out)
+                os.makedirs(output_dir, exist_ok=True)
+                archive = None
+            else:
+                # Outputs can share an archive, as long as their file names are different
+                archive_name = os.path.realpath(this_args.archive)
+                if archive_name not in archives:
+                    os.makedirs(os.path.dirname(archive_name), exist_ok=True)
+                    archives[archive_name] = SequenceArchive(this_args.archive, fsync_every=this_args.fsync_every)
+                archive = archives[archive_name]
+                if any(output["archive"] is archive and os.path.basename(output["main_name"]) ==
+                       os.path.basename(main_name) and output["ext"] == ext for output in outputs):
+                    sys.exit(f"Two outputs have the same file name in the archive {this_args.archive}")
+
+            outputs.append({
+                "main_name": main_name,
+                "ext": ext,
+                "archive": archive,
+                "save_mode": helpers.get_save_mode(first_image_mode, ext),
+                "save_options": get_save_options_from_args(this_args, ext)
+            })
+        if args.archive is None:
+            output_dir = os.path.dirname(args.image_out)
+        else:
+            output_dir = args.archive
+
+        # Save images in the background, so compression doesn't stall the filtering
+        if args.encode_threads > 0:
+            encoder_pool = concurrent.futures.ThreadPoolExecutor(max_workers=args.encode_threads)
+
+        if progress_reporter is not None:
+            progress_reporter.start(outputs=len(outputs), encode_threads=args.encode_threads)
+
+        # Loop through the images
+        for i, (image_name, number) in enumerate(zip(sequence_info["files"], sequence_info["numbers"])):
+            print(f"Converting image {i + 1} of {image_count} (frame {number})...")
+
+            # Open image (and decode it now, so decoding is timed on its own)
+            frame_start_time = time.perf_counter()
+            image_in = Image.open(image_name)
+            if args.draft:
+                helpers.draft_image(image_in, converter.get_draft_size(image_in.size, image_in.mode))
+            image_in.load()
+            decode_time = time.perf_counter()
+
+            # Convert the image with the reusable converter
+            images_out = converter.apply(image_in, profiler=memory_profiler)
+            frame = {
+                "number": number,
+                "decode": decode_time - frame_start_time,
+                "apply": time.perf_counter() - decode_time,
+                "encode": 0.0,
+                "bytes": 0,
+                "started": frame_start_time,
+                "saves_left": len(outputs)
+            }
+
+            # Close the input image
+            image_in.close()
+
+            # Save the images (with the same frame number as the input)
+            this_number = str(number).rjust(sequence_info["digits"], "0")
+            for output, image_out in zip(outputs, images_out):
+                # Get new image filename
+                output_name = f"{output['main_name']}{this_number}{output['ext']}"
+
+                # Images for an archive are encoded in memory, and added to the archive in order
+                if output["archive"] is None:
+                    save_function = save_and_close_image
+                    save_args = (image_out, output_name, output["save_mode"], output["save_options"])
+                else:
+                    save_function = encode_and_close_image
+                    save_args = (image_out, output["ext"], output["save_mode"], output["save_options"])
+                member_name = os.path.basename(output_name)
+
+                if encoder_pool is None:
+                    print(f"  Saving image...")
+                    data, duration = run_timed(save_function, *save_args)
+                    if output["archive"] is not None:
+                        output["archive"].add(member_name, data)
+                        size = len(data)
+                    else:
+                        size = os.path.getsize(output_name)
+                    add_saved_image(frame, duration, size, progress_reporter)
+                else:
+                    # Limit how many converted images can wait in memory
+                    while len(pending_saves) >= args.encode_threads * 2 * len(outputs):
+                        pending_save, pending_frame = pending_saves.popleft()
+                        add_saved_image(pending_frame, *finish_save(pending_save), progress_reporter)
+
+                    print(f"  Saving image in the background...")
+                    pending_saves.append((
+                        (encoder_pool.submit(run_timed, save_function, *save_args), output["archive"], member_name,
+                         output_name),
+                        frame
+                    ))
+
+        # Wait for the remaining images to be saved
+        while len(pending_saves) > 0:
+            pending_save, pending_frame = pending_saves.popleft()
+            add_saved_image(pending_frame, *finish_save(pending_save), progress_reporter)
+    except BaseException as exception:
+        # Still save the images converted before the error (in order), so every frame before it is kept
+        for pending_save, pending_frame in pending_saves:
+            try:
+                add_saved_image(pending_frame, *finish_save(pending_save), progress_reporter)
+            except Exception:
+                break
+        if progress_reporter is not None:
+            progress_reporter.error(exception)
+        raise
+    finally:
+        # Even if a frame failed, stop the encoders and finish the archives (so the frames already saved can be read)
+        if encoder_pool is not None:
+            encoder_pool.shutdown(cancel_futures=True)
+        for archive in archives.values():
+            archive.close()
+
+    end_time = time.time()
+    process_time = round(end_time - start_time, 1)
+
+    print(f"Done converting {image_count} images in {process_time} seconds!\n"
+          f"Saved images to {output_dir}")
+
+    if progress_reporter is not None:
+        progress_reporter.summary()
+
+    if memory_profiler is not None:
+        print_memory_stats([converter], memory_profiler)
+
+
+def parse_args_verify(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f"{DESCRIPTION}\n\n"
+                    f"Checks that every frame of an image sequence was converted exactly once "
+                    f"(ex. after converting it in parts with -sh)\n\n"
+                    f"Valid values are shown in {{braces}}\n"
+                    f"Default values are shown in [brackets]",
+        formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
-    # Make the destination dir if it doesn't already exist
-    output_dir = os.path.dirname(args.image_out)
-    os.makedirs(output_dir, exist_ok=True)
+    parser.add_argument("-i", "--input", dest="image_in", type=helpers.file_path, required=True,
+                        help="an image of the input sequence (must be part of a sequence)"
+                        )
 
-    # Loop through the images
-    image_count = len(sequence_info["files"])
-    for i, image_name in enumerate(sequence_info["files"]):
-        print(f"Converting image {i + 1} of {image_count}...")
+    parser.add_argument("-o", "--output", dest="image_out", type=str, required=True, action="append",
+                        help="where the converted image sequence was saved (the same as for pixelgreat-sequence), "
+                             "can be given more than once to check every variant"
+                        )
+
+    parser.add_argument("-ar", "--archive", dest="archive", type=helpers.file_path, required=False,
+                        action="append",
+                        help="if given, check the images saved in this archive instead of separate files, can be "
+                             "given more than once (ex. for the archive of each part) [no archive]"
+                        )
+
+    parser.add_argument("-fs", "--start", dest="start", type=int, required=False,
+                        default=None,
+                        help="the first frame number that was converted {0 - no limit} [the first frame]"
+                        )
+
+    parser.add_argument("-fe", "--end", dest="end", type=int, required=False,
+                        default=None,
+                        help="the last frame number that was converted (inclusive) {0 - no limit} [the last frame]"
+                        )
 
-        # Open image
-        image_in = Image.open(image_name)
+    parser.add_argument("-fst", "--step", dest="step", type=int, required=False,
+                        default=1,
+                        help="only every step-th frame number was converted, counting from the start "
+                             "{1 - no limit} [1]"
+                        )
 
-        # Convert the image with the reusable converter
-        image_out = converter.apply(image_in)
+    parsed_args = parser.parse_args(argv)
 
-        # Get new image filename
-        main_name, ext = os.path.splitext(args.image_out)
-        this_number = str(i).rjust(sequence_info["digits"], "0")
-        output_name = f"{main_name}{this_number}{ext}"
+    # Validate the input image actually represents an image sequence
+    if helpers.parse_sequenced_image_name(parsed_args.image_in)["error"] is not None:
+        parser.error("No image sequence found. Ensure they are named like this: name0000.png, name0001.png, etc.")
 
-        print(f"  Saving image...")
+    for image_out in parsed_args.image_out:
+        output_ext = os.path.splitext(image_out)[1].lower()
+        if output_ext not in get_supported_extensions():
+            parser.error(f"\"{output_ext}\" is not a supported output format")
 
-        # Save the image
-        try:
-            image_out.save(output_name)
-        except OSError as e:
-            # Try converting it to RGB first
-            rgb_image_out = image_out.convert("RGB")
-            rgb_image_out.save(output_name)
-            rgb_image_out.close()
+    for archive in parsed_args.archive or list():
+        archive_ext = os.path.splitext(archive)[1].lower()
+        if archive_ext not in ARCHIVE_EXTENSIONS:
+            parser.error(f"\"{archive_ext}\" is not a supported archive format")
 
-        # Close the images
-        image_in.close()
-        image_out.close()
+    # Verify the frame range
+    if parsed_args.start is not None and parsed_args.start < 0:
+        parser.error(f"Start must be no less than 0 (got {parsed_args.start})")
+    if parsed_args.end is not None and parsed_args.start is not None and parsed_args.end < parsed_args.start:
+        parser.error(f"End must be no less than start (got {parsed_args.end})")
+    if parsed_args.step < 1:
+        parser.error(f"Step must be no less than 1 (got {parsed_args.step})")
 
-    end_time = time.time()
-    process_time = round(end_time - start_time, 1)
+    return parsed_args
 
-    print(f"Done converting {image_count} images in {process_time} seconds!\n"
-          f"Saved images to {output_dir}")
+
+# Check the outputs of a converted sequence, returns a dict with the frames that are missing or saved more than once
+# If archives are given, the outputs are looked for in the archives (together) instead of the output folder
+def verify_sequence_output(numbers, image_out, archives=None):
+    from .archive import list_archive
+
+    main_name, ext = os.path.splitext(image_out)
+    if archives is None:
+        found = helpers.find_sequence_files(main_name, ext)
+    else:
+        names = [name for archive_name in archives for name, offset, size in list_archive(archive_name)]
+        found = helpers.group_sequence_names(names, os.path.basename(main_name), ext)
+
+    expected = set(numbers)
+    return {
+        "missing": [number for number in numbers if number not in found],
+        "duplicated": sorted([number for number, files in found.items() if number in expected and len(files) > 1]),
+        "unexpected": sorted([number for number in found if number not in expected])
+    }
+
+
+# Check that every frame of an image sequence was converted exactly once
+def verify(argv=None):
+    args = parse_args_verify(argv)
+
+    sequence_info = helpers.get_all_images_in_sequence(args.image_in, start=args.start, end=args.end, step=args.step)
+    if len(sequence_info["files"]) == 0:
+        sys.exit("No frames of the image sequence were found in the given range")
+    print(f"Checking {len(sequence_info['numbers'])} frames...")
+
+    failed = False
+    for image_out in args.image_out:
+        result = verify_sequence_output(sequence_info["numbers"], image_out, archives=args.archive)
+
+        if len(result["missing"]) > 0:
+            failed = True
+            print(f"{image_out}: these frames are missing: "
+                  f"{helpers.format_frame_ranges(helpers.get_frame_ranges(result['missing'], args.step), args.step)}")
+        if len(result["duplicated"]) > 0:
+            failed = True
+            print(f"{image_out}: these frames were saved more than once: "
+                  f"{helpers.format_frame_ranges(helpers.get_frame_ranges(result['duplicated']))}")
+        if len(result["unexpected"]) > 0:
+            print(f"{image_out}: warning, these frames are not in the input range: "
+                  f"{helpers.format_frame_ranges(helpers.get_frame_ranges(result['unexpected']))}")
+        if len(result["missing"]) == 0 and len(result["duplicated"]) == 0:
+            print(f"{image_out}: every frame was saved exactly once")
+
+    if failed:
+        sys.exit("The converted sequence is not complete")
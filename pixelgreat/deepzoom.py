@@ -0,0 +1,218 @@
+import os
+import math
+from PIL import Image
+
+from . import helpers
+from .constants import DEEP_ZOOM_DEFAULTS
+from .profiling import NULL_PROFILER
+
+# The .dzi file that describes a Deep Zoom image (the tiles are in the "<name>_files" folder next to it)
+DZI_TEMPLATE = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+    "<Image xmlns=\"http://schemas.microsoft.com/deepzoom/2008\" Format=\"{format}\" Overlap=\"{overlap}\" "
+    "TileSize=\"{tile_size}\">\n"
+    "    <Size Width=\"{width}\" Height=\"{height}\"/>\n"
+    "</Image>\n"
+)
+
+
+# Get how many levels a Deep Zoom pyramid of an image size has (level 0 is 1x1, the last level is the full size)
+def get_level_count(size):
+    return (max(size) - 1).bit_length() + 1
+
+
+# Get the size of a level of a Deep Zoom pyramid (each level is half the size of the next, rounded up)
+def get_level_size(size, level, level_count):
+    scale = 2 ** (level_count - 1 - level)
+
+    return math.ceil(size[0] / scale), math.ceil(size[1] / scale)
+
+
+# Get the (start, end) of every tile along one side of a level, each tile overlaps its neighbors by overlap pixels
+def get_tile_spans(length, tile_size, overlap):
+    return [
+        (max(start - overlap, 0), min(start + tile_size + overlap, length))
+        for start in range(0, length, tile_size)
+    ]
+
+
+# The rows of one level of the pyramid that are still needed
+# Rows are added from the top down, each row of tiles is saved as soon as all of its rows are there, and rows are
+# passed down to the next level in pairs (halved), so only about one row of tiles is kept for each level
+class PyramidLevel:
+    def __init__(self, writer, level, size, lower=None):
+        self.writer = writer
+        self.level = level
+        self.size = size
+        self.lower = lower
+
+        self.column_spans = get_tile_spans(size[0], writer.tile_size, writer.overlap)
+        self.row_spans = get_tile_spans(size[1], writer.tile_size, writer.overlap)
+
+        # The rows kept, starting at the row top of the level
+        self.rows = None
+        self.top = 0
+
+        # The next row of tiles to save, and how many rows were passed down to the next level
+        self.next_tile_row = 0
+        self.halved = 0
+
+    # Add the next rows of the level (the full width)
+    def add(self, strip):
+        if self.rows is None:
+            self.rows = strip
+        else:
+            rows = Image.new(strip.mode, (self.size[0], self.rows.height + strip.height))
+            rows.paste(self.rows, (0, 0))
+            rows.paste(strip, (0, self.rows.height))
+            self.rows = rows
+        bottom = self.top + self.rows.height
+
+        # Save every row of tiles that has all of its rows
+        while self.next_tile_row < len(self.row_spans) and self.row_spans[self.next_tile_row][1] <= bottom:
+            tile_top, tile_bottom = self.row_spans[self.next_tile_row]
+            for column, (tile_left, tile_right) in enumerate(self.column_spans):
+                self.writer.save_tile(
+                    self.level,
+                    column,
+                    self.next_tile_row,
+                    self.rows.crop((tile_left, tile_top - self.top, tile_right, tile_bottom - self.top))
+                )
+            self.next_tile_row += 1
+
+        # Pass the rows down in pairs (or all of them at the bottom), so every pair is halved the same way as
+        # halving the whole level would
+        if self.lower is not None:
+            if bottom == self.size[1]:
+                end = bottom
+            else:
+                end = self.halved + (bottom - self.halved) // 2 * 2
+            if end > self.halved:
+                halved_rows = self.rows.crop((0, self.halved - self.top, self.size[0], end - self.top)).reduce(2)
+                self.halved = end
+                self.lower.add(halved_rows)
+
+        # Forget the rows that are no longer needed
+        keep_from = bottom
+        if self.next_tile_row < len(self.row_spans):
+            keep_from = min(keep_from, self.row_spans[self.next_tile_row][0])
+        if self.lower is not None:
+            keep_from = min(keep_from, self.halved)
+        if keep_from > self.top:
+            self.rows = self.rows.crop((0, keep_from - self.top, self.size[0], bottom - self.top))
+            self.top = keep_from
+
+
+# Writes an image into a Deep Zoom (.dzi) tile pyramid, given its rows from the top down
+# Every level below the full size is made by halving the level above it as its rows arrive, so the full image is
+# never kept in memory
+class DeepZoomWriter:
+    def __init__(self,
+                 file_name,  # The .dzi file, the tiles are saved in the "<name>_files" folder next to it
+                 size,
+                 color_mode="RGB",
+                 tile_size=None,  # Set to a static default
+                 overlap=None,  # Set to a static default
+                 tile_ext=None,  # Set to a static default
+                 save_options=None  # The Image.save() options of the tiles (see helpers.get_save_options)
+                 ):
+        self.file_name = file_name
+        self.size = tuple(size)
+
+        if tile_size is None:
+            tile_size = DEEP_ZOOM_DEFAULTS["tile_size"]
+        helpers.assert_value_in_range(tile_size, minimum=1, message="Tile size must be no less than {min} (got {val})")
+        self.tile_size = tile_size
+
+        if overlap is None:
+            overlap = DEEP_ZOOM_DEFAULTS["overlap"]
+        helpers.assert_value_in_range(overlap, minimum=0, message="Tile overlap must be no less than {min} (got {val})")
+        self.overlap = overlap
+
+        if tile_ext is None:
+            tile_ext = DEEP_ZOOM_DEFAULTS["tile_ext"]
+        self.tile_ext = tile_ext.lower()
+        self.save_mode = helpers.get_save_mode(color_mode, self.tile_ext)
+        self.save_options = dict(save_options or dict(), format=helpers.get_format_for_extension(self.tile_ext))
+
+        self.tiles_dir = f"{os.path.splitext(file_name)[0]}_files"
+
+        # Make every level, each one passing its rows down to the one below it
+        self.level_count = get_level_count(self.size)
+        self.levels = list()
+        lower = None
+        for level in range(self.level_count):
+            level_size = get_level_size(self.size, level, self.level_count)
+            os.makedirs(os.path.join(self.tiles_dir, str(level)), exist_ok=True)
+            lower = PyramidLevel(self, level, level_size, lower=lower)
+            self.levels.append(lower)
+
+        self.rows_added = 0
+
+    # Add the next rows of the full size image (the full width)
+    def add_rows(self, strip):
+        if strip.width != self.size[0] or self.rows_added + strip.height > self.size[1]:
+            raise ValueError(f"The rows \"{strip.size}\" don't fit in the rest of the image size \"{self.size}\"")
+
+        self.levels[-1].add(strip)
+        self.rows_added += strip.height
+
+    def save_tile(self, level, column, row, tile):
+        helpers.save_image(
+            tile,
+            os.path.join(self.tiles_dir, str(level), f"{column}_{row}{self.tile_ext}"),
+            mode=self.save_mode,
+            save_options=self.save_options
+        )
+
+    # Write the .dzi file, once every row was added
+    def close(self):
+        if self.rows_added != self.size[1]:
+            raise ValueError(f"Only {self.rows_added} of the {self.size[1]} rows of the image were added")
+
+        with open(self.file_name, "w") as dzi_file:
+            dzi_file.write(DZI_TEMPLATE.format(
+                format=self.tile_ext[1:],
+                overlap=self.overlap,
+                tile_size=self.tile_size,
+                width=self.size[0],
+                height=self.size[1]
+            ))
+
+
+# Render an image with a Pixelgreat object straight into a Deep Zoom tile pyramid, one row of tiles at a time
+# The image is only prepared (brightened and pixelated) once, and each row of tiles is rendered as a region, so with a
+# lazy converter (Pixelgreat(lazy=True)) the masks are also only made one row at a time
+# The tiles are identical to tiling the full output, which never has to be in memory
+def save_deep_zoom(converter,
+                   image,
+                   file_name,
+                   tile_size=None,
+                   overlap=None,
+                   tile_ext=None,
+                   save_options=None,
+                   profiler=None
+                   ):
+    if profiler is None:
+        profiler = NULL_PROFILER
+
+    composite_filter = converter.filter
+    writer = DeepZoomWriter(
+        file_name,
+        composite_filter.output_size,
+        color_mode=composite_filter.color_mode,
+        tile_size=tile_size,
+        overlap=overlap,
+        tile_ext=tile_ext,
+        save_options=save_options
+    )
+
+    source = composite_filter.prepare_source(image, profiler=profiler)
+    width, height = composite_filter.output_size
+    for top in range(0, height, writer.tile_size):
+        box = (0, top, width, min(top + writer.tile_size, height))
+        strip = composite_filter.render_region(source, box, profiler=profiler)
+        with profiler.stage("tiles"):
+            writer.add_rows(strip)
+
+    writer.close()
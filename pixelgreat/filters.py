@@ -1,13 +1,18 @@
 import math
-from PIL import Image, ImageDraw, ImageChops, ImageFilter, ImageEnhance
+import warnings
+import concurrent.futures
+from PIL import Image, ImageDraw, ImageChops, ImageFilter
 
 from . import helpers
-from .constants import Direction, ScreenType
+from . import backends
+from .profiling import NULL_PROFILER, StageTimer
+from .constants import Direction, ScreenType, EXPLAIN_DEFAULTS
 
 # TODO: XO-1 LCD Display
 
 
-def lcd(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", subpixels=8):
+def lcd(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", subpixels=8,
+        resample=Image.Resampling.LANCZOS):
     # Get main pixel dimensions (float, used in calculations)
     if direction == Direction.HORIZONTAL:
         # Adjust aspect for later rotation if needed
@@ -108,7 +113,7 @@ def lcd(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", sub
                 round(real_width),
                 round(real_width)
             ),
-            resample=Image.Resampling.LANCZOS
+            resample=resample
         )
 
     # Rotate if needed
@@ -118,7 +123,8 @@ def lcd(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", sub
     return filter_image
 
 
-def crt_tv(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", subpixels=8):
+def crt_tv(pixel_width, padding, direction, aspect, rounding, color_mode="RGB", subpixels=8,
+           resample=Image.Resampling.LANCZOS):
     # Get the first half of the filter
     single_pixel = lcd(pixel_width=pixel_width,
                        padding=padding,
@@ -126,7 +132,8 @@ def crt_tv(pixel_width, padding, direction, aspect, rounding, color_mode="RGB",
                        aspect=aspect,
                        rounding=rounding,
                        color_mode=color_mode,
-                       subpixels=subpixels
+                       subpixels=subpixels,
+                       resample=resample
                        )
 
     # Figure out the dimensions for the new filter
@@ -154,7 +161,7 @@ def crt_tv(pixel_width, padding, direction, aspect, rounding, color_mode="RGB",
     return both_pixels
 
 
-def crt_monitor(pixel_width, padding, direction, color_mode="RGB", subpixels=8):
+def crt_monitor(pixel_width, padding, direction, color_mode="RGB", subpixels=8, resample=Image.Resampling.LANCZOS):
     # Adjust size to more correctly match real mapping for pixel sizes
     pixel_width = (pixel_width / math.sqrt(3))
 
@@ -258,7 +265,7 @@ def crt_monitor(pixel_width, padding, direction, color_mode="RGB", subpixels=8):
                 round(real_width),
                 round(real_height)
             ),
-            resample=Image.Resampling.LANCZOS
+            resample=resample
         )
 
     # Rotate if needed
@@ -268,40 +275,59 @@ def crt_monitor(pixel_width, padding, direction, color_mode="RGB", subpixels=8):
     return filter_image
 
 
-def scanlines(size, spacing, offset, line_size, blur, direction, color_mode="RGB"):
+# With a box, only that box of the filter is made (identical to cropping the full filter)
+# With box_blur, the lines are blurred with a single box blur instead of a gaussian (see helpers.get_blur_filter)
+def scanlines(size, spacing, offset, line_size, blur, direction, color_mode="RGB", box=None, box_blur=False):
+    # Get line width (integer)
+    line_width = round(spacing * line_size)
+    blur_amt = line_width * blur
+
+    # Draw a box with enough extra space around it for the blur
+    if box is None:
+        box = (0, 0) + tuple(size)
+    outer_box = box
+    if blur > 0:
+        outer_box = helpers.expand_box(box, helpers.get_blur_halo(blur_amt), size)
+    left, top = outer_box[:2]
+
     # Create new black image for building the scanline filter
-    scanline_image = Image.new(color_mode, size, color=(0, 0, 0))
+    scanline_image = Image.new(color_mode, (outer_box[2] - left, outer_box[3] - top), color=(0, 0, 0))
 
     # If the line size is 0, we know it should be all black
     if line_size == 0:
-        return scanline_image
+        return scanline_image.crop((box[0] - left, box[1] - top, box[2] - left, box[3] - top))
 
     # Make drawing object
     scanline_draw = ImageDraw.Draw(scanline_image)
 
-    # Get line width (integer)
-    line_width = round(spacing * line_size)
-
     # Draw hard lines
     if direction == Direction.HORIZONTAL:
-        line_count = math.ceil(scanline_image.height / spacing)
+        line_count = math.ceil(size[1] / spacing)
         for line in range(line_count):
             line_start_y = round((line * spacing) + (offset * spacing))
             line_end_y = line_start_y + line_width
+            if line_end_y < outer_box[1] or line_start_y >= outer_box[3]:
+                continue
 
-            scanline_draw.rectangle(((0, line_start_y), (scanline_image.width, line_end_y)), fill=(255, 255, 255))
+            scanline_draw.rectangle(((0 - left, line_start_y - top), (size[0] - left, line_end_y - top)),
+                                    fill=(255, 255, 255))
     else:
-        line_count = math.ceil(scanline_image.width / spacing)
+        line_count = math.ceil(size[0] / spacing)
         for line in range(line_count):
             line_start_x = round((line * spacing) + (offset * spacing))
             line_end_x = line_start_x + line_width
+            if line_end_x < outer_box[0] or line_start_x >= outer_box[2]:
+                continue
 
-            scanline_draw.rectangle(((line_start_x, 0), (line_end_x, scanline_image.height)), fill=(255, 255, 255))
+            scanline_draw.rectangle(((line_start_x - left, 0 - top), (line_end_x - left, size[1] - top)),
+                                    fill=(255, 255, 255))
 
     # Apply blur
     if blur > 0:
-        blur_amt = line_width * blur
-        scanline_image = scanline_image.filter(ImageFilter.GaussianBlur(blur_amt))
+        scanline_image = scanline_image.filter(helpers.get_blur_filter(blur_amt, box_blur=box_blur))
+
+    if outer_box != box:
+        scanline_image = scanline_image.crop((box[0] - left, box[1] - top, box[2] - left, box[3] - top))
 
     return scanline_image
 
@@ -323,30 +349,66 @@ def get_approximate_pixel_count(size, pixel_width, pixel_aspect, make_int=True):
     return pixels_wide, pixels_tall
 
 
+# Downscale an image to one pixel per screen pixel (the first half of pixelate_image)
+# With a reducing gap, the image is first reduced by a whole factor (averaging blocks of pixels), leaving at least
+# reducing_gap times the target size for the exact resize. Smaller gaps are faster but further from the exact resize
+def downscale_image(image,
+                    pixel_width,
+                    pixel_aspect,
+                    output_size,
+                    downscale_mode=Image.Resampling.HAMMING,
+                    reducing_gap=None  # Defaults to one exact resize
+                    ):
+    pixels_wide, pixels_tall = get_approximate_pixel_count(
+        size=output_size,
+        pixel_width=pixel_width,
+        pixel_aspect=pixel_aspect
+    )
+
+    return image.resize((pixels_wide, pixels_tall), resample=downscale_mode, reducing_gap=reducing_gap)
+
+
 def pixelate_image(image,
                    pixel_width,
                    pixel_aspect,
                    output_size=None,  # Defaults to the input image size
-                   downscale_mode=Image.Resampling.HAMMING
+                   downscale_mode=Image.Resampling.HAMMING,
+                   reducing_gap=None  # Defaults to one exact resize (see downscale_image)
                    ):
     if output_size is None:
         output_size = image.size
 
-    pixels_wide, pixels_tall = get_approximate_pixel_count(
-        size=output_size,
+    # Downscale image
+    small_image = downscale_image(
+        image=image,
         pixel_width=pixel_width,
-        pixel_aspect=pixel_aspect
+        pixel_aspect=pixel_aspect,
+        output_size=output_size,
+        downscale_mode=downscale_mode,
+        reducing_gap=reducing_gap
     )
 
-    # Downscale image
-    small_image = image.resize((pixels_wide, pixels_tall), resample=downscale_mode)
-
     # Upscale to the final size
     result = small_image.resize(output_size, resample=Image.Resampling.NEAREST)
 
     return result
 
 
+# Clip the colors of an image to the range that brightening by value (see backends) doesn't push to black or white
+# Brightening is then only a linear map, so brightening after a downscale gives (almost) the same result as before it
+def clip_for_tone(image, value, mean):
+    # Below low the contrast gives black, and above high the brightness gives white
+    low = math.floor(mean - mean / value)
+    high = math.ceil(mean + (255 / value - mean) / value)
+
+    color_table = [min(max(x, low), high) for x in range(256)]
+    table = list()
+    for band in image.getbands():
+        table += list(range(256)) if band == "A" else color_table
+
+    return image.point(table)
+
+
 def bloom_image(image, bloom_size, bloom_strength):
     if bloom_strength <= 0 or bloom_size <= 0:
         return image
@@ -377,7 +439,9 @@ class ScanlineFilter:
                  line_blur,
                  direction,
                  strength=1.0,
-                 color_mode="RGB"
+                 color_mode="RGB",
+                 precompute=True,  # If False, the filter images are made the first time they're needed
+                 box_blur=False  # If True, the lines are blurred with a single box blur (faster, not identical)
                  ):
         self.size = size
 
@@ -395,26 +459,52 @@ class ScanlineFilter:
 
         self.color_mode = color_mode
 
-        # Pre-compute filter image
-        self.filter_raw = scanlines(
+        self.box_blur = box_blur
+
+        self.filter_raw = None
+        self.filter = None
+        if precompute:
+            self.build()
+
+    # Pre-compute the filter images
+    def build(self):
+        self.filter_raw = self.get_region((0, 0) + self.size, adjusted=False)
+
+        # Pre-computed adjusted filter image
+        self.filter = helpers.mix_color_with_image(
+            self.filter_raw,
+            (255, 255, 255),
+            1 - self.strength
+        )
+
+    # Identifies the filter image, filters with the same key make the same image
+    def get_key(self):
+        return (self.size, self.line_spacing, self.line_offset, self.line_size, self.line_blur, self.direction,
+                self.strength, self.color_mode, self.box_blur)
+
+    # Make only one box of the filter image (identical to a crop of the full filter)
+    def get_region(self, box, adjusted=True):
+        region = scanlines(
             size=self.size,
             spacing=self.line_spacing,
             offset=self.line_offset,
             line_size=self.line_size,
             blur=self.line_blur,
             direction=self.direction,
-            color_mode=self.color_mode
+            color_mode=self.color_mode,
+            box=box,
+            box_blur=self.box_blur
         )
 
-        # Pre-computed adjusted filter image
-        self.filter = helpers.mix_color_with_image(
-            self.filter_raw,
-            (255, 255, 255),
-            1 - self.strength
-        )
+        if adjusted:
+            region = helpers.mix_color_with_image(region, (255, 255, 255), 1 - self.strength)
+
+        return region
 
     # Apply the filter to a desired image
     def apply(self, image):
+        if self.filter is None:
+            self.build()
         if image.size != self.size:
             raise ValueError(f"Input image size \"{image.size}\" "
                              f"does not match filter size \"{self.size}\"")
@@ -427,6 +517,8 @@ class ScanlineFilter:
         return result
 
     def get_filter(self, adjusted=False):
+        if self.filter_raw is None:
+            self.build()
         return self.filter_raw
 
 
@@ -441,7 +533,10 @@ class ScreenFilter:
                  pixel_aspect=None,
                  rounding=None,
                  strength=1.0,
-                 color_mode="RGB"
+                 color_mode="RGB",
+                 precompute=True,  # If False, the filter images are made the first time they're needed
+                 subpixels=8,  # How many times larger the tile is drawn before it is scaled down (antialiasing)
+                 resample=Image.Resampling.LANCZOS  # How the tile is scaled down, and resized to fit the screen
                  ):
         self.size = size
 
@@ -458,13 +553,18 @@ class ScreenFilter:
 
         self.color_mode = color_mode
 
+        self.subpixels = subpixels
+        self.resample = resample
+
         # Get the filter tile image
         if self.screen_type == ScreenType.CRT_MONITOR:
             self.filter_tile = crt_monitor(
                 pixel_width=self.pixel_width,
                 padding=self.pixel_padding,
                 direction=self.direction,
-                color_mode=self.color_mode
+                color_mode=self.color_mode,
+                subpixels=self.subpixels,
+                resample=self.resample
             )
         elif self.screen_type == ScreenType.CRT_TV:
             self.filter_tile = crt_tv(
@@ -473,7 +573,9 @@ class ScreenFilter:
                 direction=self.direction,
                 aspect=self.pixel_aspect,
                 rounding=self.rounding,
-                color_mode=self.color_mode
+                color_mode=self.color_mode,
+                subpixels=self.subpixels,
+                resample=self.resample
             )
         else:  # Default to LCD
             self.filter_tile = lcd(
@@ -482,7 +584,9 @@ class ScreenFilter:
                 direction=self.direction,
                 aspect=self.pixel_aspect,
                 rounding=self.rounding,
-                color_mode=self.color_mode
+                color_mode=self.color_mode,
+                subpixels=self.subpixels,
+                resample=self.resample
             )
 
         self.strength = strength
@@ -520,13 +624,15 @@ class ScreenFilter:
                 size=self.size
             )
 
+        self.filter_raw = None
+        self.filter = None
+        if precompute:
+            self.build()
+
+    # Pre-compute the filter images
+    def build(self):
         # Pre-compute a tiled filter image
-        self.filter_raw = helpers.tile_image(
-            self.filter_tile,
-            self.size,
-            background_color=(0, 0, 0),
-            count=self.pixel_count
-        )
+        self.filter_raw = self.get_region((0, 0) + self.size, adjusted=False)
 
         # Pre-computed adjusted filter image
         self.filter = helpers.mix_color_with_image(
@@ -535,8 +641,32 @@ class ScreenFilter:
             1 - self.strength
         )
 
+    # Identifies the filter image, filters with the same key make the same image
+    def get_key(self):
+        return (self.size, self.screen_type, self.pixel_width, self.pixel_padding, self.direction, self.pixel_aspect,
+                self.rounding, self.strength, self.color_mode, self.subpixels, self.resample)
+
+    # Make only one box of the filter image (identical to a crop of the full filter)
+    # Only the tiles that touch the box are placed, at the same positions as in the full filter
+    def get_region(self, box, adjusted=True):
+        region = helpers.tile_image(
+            self.filter_tile,
+            self.size,
+            background_color=(0, 0, 0),
+            count=self.pixel_count,
+            box=box,
+            resample=self.resample
+        )
+
+        if adjusted:
+            region = helpers.mix_color_with_image(region, (255, 255, 255), 1 - self.strength)
+
+        return region
+
     # Apply the filter to a desired image
     def apply(self, image):
+        if self.filter is None:
+            self.build()
         if image.size != self.size:
             raise ValueError(f"Input image size \"{image.size}\" "
                              f"does not match filter size \"{self.size}\"")
@@ -549,6 +679,8 @@ class ScreenFilter:
         return result
 
     def get_filter(self, adjusted=False):
+        if self.filter_raw is None:
+            self.build()
         if adjusted:
             return self.filter
         else:
@@ -579,7 +711,17 @@ class CompositeFilter:
                  bloom_strength=1.0,
                  grid_strength=1.0,
                  pixelate=True,
-                 color_mode="RGB"
+                 color_mode="RGB",
+                 backend=None,  # Defaults to the PIXELGREAT_BACKEND environment variable, or Pillow
+                 threads=1,
+                 masks=None,  # Precomputed adjusted masks to use instead of building them: {"scanline": ..., "grid": ...}
+                 lazy_masks=False,  # If True, masks are built on the first full render (regions only build their part)
+                 fast_blur=False,  # If True, pixelated images are upscaled and blurred in one step (needs NumPy)
+                 fast_tone=False,  # If True, pixelated images are brightened after they are downscaled
+                 reducing_gap=None,  # If given, pixelated images are reduced by a whole factor first (see downscale_image)
+                 subpixels=8,  # How many times larger the grid tile is drawn before it is scaled down
+                 tile_resample=Image.Resampling.LANCZOS,  # How the grid tile is scaled down and resized to fit
+                 box_blur=False  # If True, the bloom and scanlines use a single box blur instead of a gaussian
                  ):
         self.screen_type = screen_type
 
@@ -647,10 +789,28 @@ class CompositeFilter:
 
         self.pixelate = pixelate
 
+        # The one step upscale and blur uses an exact gaussian, so it isn't identical to Pillow's GaussianBlur
+        self.fast_blur = fast_blur and self.pixelate and self.blur_px > 0
+        if self.fast_blur and "numpy" not in backends.get_available_backends():
+            warnings.warn("The fast blur needs NumPy, using the normal blur")
+            self.fast_blur = False
+
+        # Brightening the small image is much less work, but its clipping and rounding happen after the downscale
+        self.fast_tone = fast_tone and self.pixelate and self.brighten > 0
+
+        self.reducing_gap = reducing_gap if self.pixelate else None
+
+        self.subpixels = subpixels
+        self.tile_resample = tile_resample
+        self.box_blur = box_blur
+
         self.output_size = output_size
 
         self.color_mode = color_mode
 
+        # Large outputs are split into horizontal strips rendered on this many threads
+        self.threads = max(threads, 1)
+
         # Get scanline direction based on screen type
         if self.screen_type in [ScreenType.CRT_MONITOR]:
             self.scanline_direction = self.direction
@@ -680,8 +840,13 @@ class CompositeFilter:
             if self.pixel_aspect is None:
                 raise ValueError("Pixelate enabled, requires the argument pixel_aspect")
 
+        # Masks given here (ex. from shared memory) don't have to be built again
+        if masks is None:
+            masks = dict()
+        self.given_masks = {name: mask for name, mask in masks.items() if mask is not None}
+
         # Make the scanline filter object (if needed)
-        if self.scanline_strength > 0:
+        if self.scanline_strength > 0 and "scanline" not in self.given_masks:
             self.scanline_filter = ScanlineFilter(
                 size=self.output_size,
                 line_spacing=self.scanline_spacing_px,
@@ -690,13 +855,15 @@ class CompositeFilter:
                 line_blur=self.scanline_blur,
                 direction=self.scanline_direction,
                 strength=self.scanline_strength,
-                color_mode=self.color_mode
+                color_mode=self.color_mode,
+                precompute=not lazy_masks,
+                box_blur=self.box_blur
             )
         else:
             self.scanline_filter = None
 
         # Make the screen filter object (if needed)
-        if self.grid_strength > 0:
+        if self.grid_strength > 0 and "grid" not in self.given_masks:
             self.screen_filter = ScreenFilter(
                 size=self.output_size,
                 screen_type=self.screen_type,
@@ -706,65 +873,451 @@ class CompositeFilter:
                 pixel_aspect=self.pixel_aspect,
                 rounding=self.rounding,
                 strength=self.grid_strength,
-                color_mode=self.color_mode
+                color_mode=self.color_mode,
+                precompute=not lazy_masks,
+                subpixels=self.subpixels,
+                resample=self.tile_resample
             )
         else:
             self.screen_filter = None
 
+        # Get the backend that runs the stages, and give it the masks in the form it uses
+        self.backend = backends.get_backend(backend, color_mode=self.color_mode)
+        self.scanline_mask = None
+        self.grid_mask = None
+        self.masks_built = False
+        if not lazy_masks or self.given_masks:
+            self.build_masks()
+
+        if self.washout > 0:
+            self.washout_color = backends.get_mode_color(
+                self.color_mode,
+                (self.washout_value, self.washout_value, self.washout_value)
+            )
+        else:
+            self.washout_color = None
+
+    # Give the backend the full size masks in the form it uses (building them if needed)
+    def build_masks(self):
+        if self.scanline_strength > 0 and "scanline" in self.given_masks:
+            self.scanline_mask = self.backend.prepare_mask(self.given_masks["scanline"])
+        elif self.scanline_filter is not None:
+            if self.scanline_filter.filter is None:
+                self.scanline_filter.build()
+            self.scanline_mask = self.backend.prepare_mask(self.scanline_filter.filter)
+
+        if self.grid_strength > 0 and "grid" in self.given_masks:
+            self.grid_mask = self.backend.prepare_mask(self.given_masks["grid"])
+        elif self.screen_filter is not None:
+            if self.screen_filter.filter is None:
+                self.screen_filter.build()
+            self.grid_mask = self.backend.prepare_mask(self.screen_filter.filter)
+
+        for name, mask in [("scanline", self.scanline_mask), ("grid", self.grid_mask)]:
+            if mask is not None and self.backend.get_mask_size(mask) != self.output_size:
+                raise ValueError(f"The {name} mask size \"{self.backend.get_mask_size(mask)}\" "
+                                 f"does not match the output size \"{self.output_size}\"")
+
+        self.masks_built = True
+
+    # Get the masks covering a box of the output, and the box of those masks to use
+    # Before the full masks are built, only the box is made (with the same phase as in the full masks)
+    def get_mask_regions(self, box):
+        if self.masks_built:
+            return self.scanline_mask, self.grid_mask, box
+
+        scanline_mask = None
+        if self.scanline_filter is not None:
+            scanline_mask = self.backend.prepare_mask(self.scanline_filter.get_region(box))
+        grid_mask = None
+        if self.screen_filter is not None:
+            grid_mask = self.backend.prepare_mask(self.screen_filter.get_region(box))
+
+        return scanline_mask, grid_mask, (0, 0, box[2] - box[0], box[3] - box[1])
+
     # Apply the filter to a desired image
-    def apply(self, image):
+    # An optional profiler (see profiling.py) is told about each stage as it runs
+    # With a region (a box of the output image), only that box is rendered (identical to cropping the full output)
+    def apply(self, image, profiler=None, region=None):
+        source = self.prepare_source(image, profiler=profiler)
+        if region is None:
+            return self.render(source, profiler=profiler)
+
+        region = tuple(region)
+        if len(region) != 4 or not (0 <= region[0] < region[2] <= self.output_size[0]) or \
+                not (0 <= region[1] < region[3] <= self.output_size[1]):
+            raise ValueError(f"The region \"{region}\" must be a box (left, top, right, bottom) "
+                             f"inside the output size \"{self.output_size}\"")
+
+        return self.render_region(source, region, profiler=profiler)
+
+    # Get the names of the stages apply() will run, in order
+    def get_stage_plan(self):
+        stages = ["convert"]
+        if self.brighten > 0 and not self.fast_tone:
+            stages.append("tone")
+        if self.pixelate:
+            stages.append("downscale")
+        if self.fast_tone:
+            stages.append("tone")
+        if self.fast_blur:
+            stages.append("upscale_blur")
+        else:
+            stages.append("upscale")
+            if self.blur > 0:
+                stages.append("blur")
+        if self.scanline_filter is not None or self.screen_filter is not None or self.washout_color is not None or \
+                self.scanline_mask is not None or self.grid_mask is not None:
+            stages.append("masks")
+        if self.bloom_size_px > 0 and self.bloom_strength > 0:
+            stages.append("bloom")
+
+        return stages
+
+    # Make the low resolution source image that render() scales up to the output size
+    def prepare_source(self, image, profiler=None):
+        return self.downscale_source(self.tone_source(image, profiler=profiler), profiler=profiler)
+
+    # Identifies the output of tone_source(), filters with the same key give the same image
+    def get_tone_key(self):
+        if self.brighten > 0 and not self.fast_tone:
+            return self.color_mode, self.brighten_value
+        return self.color_mode, None
+
+    # Identifies the output of prepare_source(), filters with the same key give the same image
+    def get_source_key(self):
+        if self.fast_tone:
+            return self.get_tone_key() + (self.pixel_width, self.pixel_aspect, self.output_size, self.reducing_gap,
+                                          self.brighten_value)
+        if self.pixelate:
+            return self.get_tone_key() + (self.pixel_width, self.pixel_aspect, self.output_size, self.reducing_gap)
+        return self.get_tone_key()
+
+    # Get the size downscale_source() pixelates images to, or None if it doesn't pixelate
+    def get_downscale_size(self):
+        if not self.pixelate:
+            return None
+
+        return get_approximate_pixel_count(
+            size=self.output_size,
+            pixel_width=self.pixel_width,
+            pixel_aspect=self.pixel_aspect
+        )
+
+    # The first half of prepare_source(): convert the color mode and brighten
+    # With the fast tone, it only converts the color mode (downscale_source() brightens the small image)
+    def tone_source(self, image, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
         # Make input image the correct color mode
-        if image.mode != self.color_mode:
-            image = image.convert(self.color_mode)
+        with profiler.stage("convert"):
+            if image.mode != self.color_mode:
+                image = image.convert(self.color_mode)
 
         # Brighten if applicable
-        if self.brighten > 0:
-            image = ImageEnhance.Contrast(image).enhance(self.brighten_value)
-            image = ImageEnhance.Brightness(image).enhance(self.brighten_value)
+        if self.brighten > 0 and not self.fast_tone:
+            with profiler.stage("tone"):
+                image = self.backend.tone(image, self.brighten_value)
+
+        return image
+
+    # The second half of prepare_source(): pixelate (first half, the upscale happens while rendering)
+    # With the fast tone, the small image is brightened here
+    def downscale_source(self, image, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        # Clip away what the brightening would clip, so brightening the small image gives almost the same result
+        # The contrast uses the mean of the full image, the same as brightening before the downscale
+        if self.fast_tone:
+            with profiler.stage("tone"):
+                mean = backends.get_contrast_mean(image)
+                image = clip_for_tone(image, self.brighten_value, mean)
 
-        # Pixelate / scale to final size
         if self.pixelate:
-            result = pixelate_image(
-                image=image,
-                pixel_width=self.pixel_width,
-                pixel_aspect=self.pixel_aspect,
-                output_size=self.output_size
-            )
-        else:
-            if image.size != self.output_size:
-                result = image.resize(self.output_size, resample=Image.Resampling.NEAREST)
+            with profiler.stage("downscale"):
+                image = downscale_image(
+                    image=image,
+                    pixel_width=self.pixel_width,
+                    pixel_aspect=self.pixel_aspect,
+                    output_size=self.output_size,
+                    reducing_gap=self.reducing_gap
+                )
+
+        if self.fast_tone:
+            with profiler.stage("tone"):
+                image = self.backend.tone(image, self.brighten_value, mean=mean)
+
+        return image
+
+    # How far (in output pixels) a change in the upscaled source can spread
+    # Without the blur, only how far the stages after the upscale (and blur) can spread it
+    def get_halo(self, include_blur=True):
+        halo = 0
+        if self.blur > 0 and include_blur:
+            halo += helpers.get_blur_halo(self.blur_px)
+        if self.bloom_size_px > 0 and self.bloom_strength > 0:
+            halo += helpers.get_blur_halo(self.bloom_size_px)
+
+        return halo
+
+    # Render the full output image from a prepared source image
+    def render(self, source, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        # A full render needs all of the masks, so keep them for the next render too
+        if not self.masks_built:
+            self.build_masks()
+
+        # Render in strips on several threads, if it's worth it
+        strips = self.get_strip_boxes()
+        if len(strips) > 1:
+            return self.render_strips(source, strips, profiler=profiler)
+
+        # Scale to final size (and blur, with the fast blur)
+        if self.fast_blur:
+            with profiler.stage("upscale_blur"):
+                result = helpers.resample_blur_region(source, self.output_size, (0, 0) + self.output_size,
+                                                      self.blur_px)
+            return self.apply_output_stages(result, (0, 0) + self.output_size, profiler=profiler)
+
+        with profiler.stage("upscale"):
+            if source.size != self.output_size:
+                result = source.resize(self.output_size, resample=Image.Resampling.NEAREST)
             else:
-                result = image.copy()
+                result = source.copy()
 
-        # Blur, if relevant
-        if self.blur > 0:
-            result = result.filter(ImageFilter.GaussianBlur(self.blur_px))
+        return self.apply_output_stages(result, (0, 0) + self.output_size, profiler=profiler)
 
-        # Add scanlines if applicable
-        if self.scanline_filter is not None:
-            result = self.scanline_filter.apply(result)
+    # Render only one box of the output image from a prepared source image
+    # The result is identical to cropping the output of render()
+    def render_region(self, source, box, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
 
-        # Apply washout, if needed
-        if self.washout > 0:
-            result = ImageChops.lighter(
-                result,
-                Image.new(
-                    self.color_mode,
-                    self.output_size,
-                    (self.washout_value, self.washout_value, self.washout_value)
-                )
+        # Grow the box so the blur and bloom near its edges see the same pixels as a full render
+        # The fast blur is exact for any box, so then only the bloom needs it
+        outer_box = helpers.expand_box(box, self.get_halo(include_blur=not self.fast_blur), self.output_size)
+
+        if self.fast_blur:
+            with profiler.stage("upscale_blur"):
+                result = helpers.resample_blur_region(source, self.output_size, outer_box, self.blur_px)
+        else:
+            with profiler.stage("upscale"):
+                result = helpers.resize_nearest_region(source, self.output_size, outer_box)
+
+        result = self.apply_output_stages(result, outer_box, profiler=profiler)
+
+        return result.crop((
+            box[0] - outer_box[0],
+            box[1] - outer_box[1],
+            box[2] - outer_box[0],
+            box[3] - outer_box[1]
+        ))
+
+    # Split the output into horizontal strips, one per thread
+    # Strips are never shorter than their halos, so the extra work stays small
+    def get_strip_boxes(self):
+        minimum_height = max(2 * self.get_halo(include_blur=not self.fast_blur), 64)
+        strip_count = min(self.threads, self.output_size[1] // minimum_height)
+        if strip_count <= 1:
+            return [(0, 0) + self.output_size]
+
+        return [
+            (
+                0,
+                round((strip / strip_count) * self.output_size[1]),
+                self.output_size[0],
+                round(((strip + 1) / strip_count) * self.output_size[1])
             )
+            for strip in range(strip_count)
+        ]
+
+    # Render strips on a thread pool and stitch them together
+    # Most Pillow operations release the GIL, so the strips really do run in parallel
+    # The strips run at the same time, so they are profiled as one "strips" stage (per-stage times would overlap)
+    def render_strips(self, source, strips, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        result = Image.new(self.color_mode, self.output_size)
+        with profiler.stage("strips"):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(strips)) as pool:
+                futures = [pool.submit(self.render_region, source, box) for box in strips]
+                for box, future in zip(strips, futures):
+                    result.paste(future.result(), box[:2])
 
-        # Add pixel grid if applicable
-        if self.screen_filter is not None:
-            result = self.screen_filter.apply(result)
+        return result
+
+    # Apply every output resolution stage to an image covering a box of the output
+    def apply_output_stages(self, result, box, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        # Blur, if relevant (the fast blur was already done while upscaling)
+        if self.blur > 0 and not self.fast_blur:
+            with profiler.stage("blur"):
+                result = result.filter(ImageFilter.GaussianBlur(self.blur_px))
+
+        # Add scanlines, washout, and the pixel grid, if applicable
+        with profiler.stage("masks"):
+            scanline_mask, grid_mask, mask_box = self.get_mask_regions(box)
+            result = self.backend.apply_masks(
+                result,
+                mask_box,
+                scanline_mask=scanline_mask,
+                washout_color=self.washout_color,
+                grid_mask=grid_mask
+            )
 
         # Add bloom, if applicable
         if self.bloom_size_px > 0 and self.bloom_strength > 0:
-            result = bloom_image(result, self.bloom_size_px, self.bloom_strength)
+            with profiler.stage("bloom"):
+                result = self.backend.bloom(result, self.bloom_size_px, self.bloom_strength, box_blur=self.box_blur)
 
         return result
 
+    # Get the adjusted masks used while rendering, in the form the backend uses
+    def get_masks(self):
+        if not self.masks_built:
+            self.build_masks()
+
+        return {"scanline": self.scanline_mask, "grid": self.grid_mask}
+
+    # Get the sizes in output pixels the settings work out to, and how the grid tile covers the output
+    def get_derived_values(self):
+        values = {
+            "output_size": self.output_size,
+            "downscale_size": self.get_downscale_size(),
+            "pixel_width": self.pixel_width,
+            "blur_px": self.blur_px if self.blur > 0 else 0,
+            "bloom_size_px": self.bloom_size_px if self.bloom_strength > 0 else 0,
+            "scanline_spacing_px": self.scanline_spacing_px if self.scanline_strength > 0 else None,
+            "grid_tile_size": None,
+            "grid_tile_count": None,
+            "strips": len(self.get_strip_boxes())
+        }
+
+        if self.screen_filter is not None:
+            tile_size = self.screen_filter.filter_tile.size
+            if self.screen_filter.pixel_count is None:
+                tile_count = (self.output_size[0] / tile_size[0], self.output_size[1] / tile_size[1])
+            else:
+                tile_count = self.screen_filter.pixel_count
+            values["grid_tile_size"] = tile_size
+            values["grid_tile_count"] = (math.ceil(tile_count[0]), math.ceil(tile_count[1]))
+
+        return values
+
+    # Get the bytes memory_report() gives once the full masks are built, without building them
+    def estimate_mask_memory(self):
+        if self.masks_built:
+            return self.memory_report()["total"]
+
+        # Bytes per pixel of a mask image, and of the backend's form of it (0 if it uses the image itself)
+        sample = Image.new(self.color_mode, (1, 1))
+        prepared_sample = self.backend.prepare_mask(sample)
+        pixel_count = self.output_size[0] * self.output_size[1]
+        image_bytes = helpers.get_image_bytes(sample) * pixel_count
+        if prepared_sample is sample:
+            prepared_bytes = 0
+        else:
+            prepared_bytes = helpers.get_image_bytes(prepared_sample) * pixel_count
+
+        total = 0
+        if self.screen_filter is not None:
+            total += helpers.get_image_bytes(self.screen_filter.filter_tile)
+        for mask_filter in [self.screen_filter, self.scanline_filter]:
+            if mask_filter is None:
+                continue
+            total += image_bytes + prepared_bytes
+            # Below full strength, the adjusted mask is a separate image
+            if mask_filter.strength < 1:
+                total += image_bytes
+
+        return total
+
+    # Time rendering a few synthetic frames, returns the seconds each stage takes per frame, and the seconds building
+    # the full masks takes (None if they are already built)
+    # Large outputs only render a band of the output, and the output stages are scaled up from it
+    # Nothing is kept, masks that aren't built yet are only made for the band (and that is timed on its own)
+    def calibrate(self, input_size, samples=None):
+        if samples is None:
+            samples = EXPLAIN_DEFAULTS["samples"]
+        helpers.assert_value_in_range(samples, minimum=1, message="Samples must be no less than {min} (got {val})")
+
+        width, height = self.output_size
+        band_height = min(max(EXPLAIN_DEFAULTS["calibration_pixels"] // width, 1), height)
+        box = (0, 0, width, band_height)
+
+        image = Image.effect_noise(tuple(input_size), 64).convert(self.color_mode)
+        masks_built = self.masks_built
+        source_timer = StageTimer()
+        render_timer = StageTimer()
+        for sample in range(samples + 1):
+            if sample == 1:
+                # The first frame only warms up (ex. compiling the Numba backend)
+                source_timer.reset()
+                render_timer.reset()
+            source = self.prepare_source(image, profiler=source_timer)
+            if band_height == height and masks_built:
+                self.render(source, profiler=render_timer)
+            else:
+                self.render_region(source, box, profiler=render_timer)
+            if not masks_built:
+                with render_timer.stage("build"):
+                    self.get_mask_regions(box)
+
+        # The output stages ran on the band and its halo
+        outer_box = helpers.expand_box(box, self.get_halo(include_blur=not self.fast_blur), self.output_size)
+        scale = height / (outer_box[3] - outer_box[1])
+        timings = {name: seconds / samples for name, seconds in source_timer.timings.items()}
+        for name, seconds in render_timer.timings.items():
+            timings[name] = timings.get(name, 0.0) + (seconds / samples) * scale
+
+        # Building the band's masks was part of the masks stage, a full render builds them once instead
+        build_time = None
+        if not masks_built:
+            build_time = timings.pop("build")
+            timings["masks"] = max(timings["masks"] - build_time, 0.0)
+
+        return timings, build_time
+
+    # Get the bytes held by each mask this filter keeps in memory, plus a "total"
+    # Masks that are the same object (ex. an adjusted mask at full strength) are only counted once
+    def memory_report(self):
+        masks = list()
+        if self.screen_filter is not None:
+            masks += [
+                ("grid_tile", self.screen_filter.filter_tile),
+                ("grid_filter_raw", self.screen_filter.filter_raw),
+                ("grid_filter", self.screen_filter.filter),
+                ("grid_mask", self.grid_mask)
+            ]
+        else:
+            masks.append(("grid_mask", self.grid_mask))
+        if self.scanline_filter is not None:
+            masks += [
+                ("scanline_filter_raw", self.scanline_filter.filter_raw),
+                ("scanline_filter", self.scanline_filter.filter),
+                ("scanline_mask", self.scanline_mask)
+            ]
+        else:
+            masks.append(("scanline_mask", self.scanline_mask))
+
+        report = dict()
+        seen = set()
+        for name, mask in masks:
+            if mask is None or id(mask) in seen:
+                continue
+            seen.add(id(mask))
+            report[name] = helpers.get_image_bytes(mask)
+        report["total"] = sum(report.values())
+
+        return report
+
     def get_grid_filter(self, adjusted=False):
         if self.screen_filter is not None:
             return self.screen_filter.get_filter(adjusted=adjusted)
@@ -774,6 +1327,11 @@ class CompositeFilter:
     def get_grid_filter_tile(self):
         if self.screen_filter is not None:
             return self.screen_filter.get_filter_tile()
+        elif "grid_tile" in self.given_masks:
+            tile = self.given_masks["grid_tile"]
+            if not isinstance(tile, Image.Image):
+                tile = Image.fromarray(tile)
+            return tile
         else:
             return None
 
@@ -782,3 +1340,73 @@ class CompositeFilter:
             return self.scanline_filter.get_filter(adjusted=adjusted)
         else:
             return None
+
+
+# A reusable class that only re-renders the parts of a frame that changed since the previous frame
+class IncrementalFilter:
+    def __init__(self, composite_filter):
+        self.composite_filter = composite_filter
+
+        # Snap re-rendered boxes to the pixel grid period
+        self.snap_period = (
+            max(round(self.composite_filter.pixel_width), 1),
+            max(round(self.composite_filter.pixel_width / self.composite_filter.pixel_aspect), 1)
+        )
+
+        self.previous_source = None
+        self.previous_result = None
+
+        # The box re-rendered by the last call to apply(), None if nothing changed
+        self.last_box = None
+
+    # Get the bytes held for the previous frame, plus a "total"
+    def memory_report(self):
+        report = dict()
+        if self.previous_source is not None:
+            report["previous_source"] = helpers.get_image_bytes(self.previous_source)
+            report["previous_result"] = helpers.get_image_bytes(self.previous_result)
+        report["total"] = sum(report.values())
+
+        return report
+
+    # Forget the previous frame, so the next frame is fully rendered
+    def reset(self):
+        self.previous_source = None
+        self.previous_result = None
+        self.last_box = None
+
+    # Apply the filter to a desired image, reusing as much of the previous result as possible
+    def apply(self, image, profiler=None):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        source = self.composite_filter.prepare_source(image, profiler=profiler)
+        output_size = self.composite_filter.output_size
+
+        with profiler.stage("diff"):
+            if self.previous_source is None or self.previous_source.size != source.size:
+                changed_box = (0, 0) + source.size
+            else:
+                changed_box = ImageChops.difference(source, self.previous_source).getbbox()
+
+        if changed_box is None:
+            # Nothing changed at all
+            self.last_box = None
+            result = self.previous_result.copy()
+        else:
+            # Find the output pixels that the changed source pixels can reach
+            box = helpers.map_nearest_box(changed_box, source.size, output_size)
+            box = helpers.expand_box(box, self.composite_filter.get_halo(), output_size)
+            box = helpers.snap_box(box, self.snap_period, output_size)
+            self.last_box = box
+
+            if box == (0, 0) + output_size:
+                result = self.composite_filter.render(source, profiler=profiler)
+            else:
+                result = self.previous_result.copy()
+                result.paste(self.composite_filter.render_region(source, box, profiler=profiler), box[:2])
+
+        self.previous_source = source
+        self.previous_result = result.copy()
+
+        return result
@@ -1,7 +1,13 @@
 import os
+import io
 import math
-import glob
-from PIL import Image
+import zlib
+import array
+import bisect
+import functools
+from PIL import Image, ImageFilter
+
+from .constants import PngStrategy
 
 
 # General purpose text input stripper
@@ -18,6 +24,20 @@ def file_path(string):
         raise FileNotFoundError(string)
 
 
+# Makes sure a string represents a shard, "K/N" (the K-th of N shards, counting from 1)
+# This can be used with argparse as a valid argument type
+def shard(string):
+    parts = string.split("/")
+    if len(parts) != 2:
+        raise ValueError(string)
+
+    index, count = int(parts[0]), int(parts[1])
+    if not 1 <= index <= count:
+        raise ValueError(string)
+
+    return index, count
+
+
 # A short function to clip a value to a range
 def clip(value, min_value, max_value):
     return min(max(value, min_value), max_value)
@@ -44,33 +64,53 @@ def round_to_division(value, division=1.0):
 
 
 # Tile a PIL Image to fit a given frame size
-def tile_image(image_tile, size, background_color=(0, 0, 0), count=None):
-    new_image = Image.new(image_tile.mode, size, color=background_color)
+# With a box, only that box of the tiled image is made (identical to cropping the full tiled image)
+def tile_image(image_tile, size, background_color=(0, 0, 0), count=None, box=None, resample=Image.Resampling.LANCZOS):
+    if box is None:
+        box = (0, 0) + tuple(size)
+    new_image = Image.new(image_tile.mode, (box[2] - box[0], box[3] - box[1]), color=background_color)
 
     if count is None:
         # Position pastes based on tile size
-        x_count = math.ceil(new_image.width / image_tile.width)
-        y_count = math.ceil(new_image.height / image_tile.height)
-
-        for x in range(x_count):
-            for y in range(y_count):
-                new_image.paste(image_tile, (x * image_tile.width, y * image_tile.height))
+        x_count = math.ceil(size[0] / image_tile.width)
+        y_count = math.ceil(size[1] / image_tile.height)
+
+        # Only the tiles that touch the box
+        for x in range(box[0] // image_tile.width, min(math.ceil(box[2] / image_tile.width), x_count)):
+            for y in range(box[1] // image_tile.height, min(math.ceil(box[3] / image_tile.height), y_count)):
+                tile_start = (x * image_tile.width, y * image_tile.height)
+                new_image.paste(image_tile, (tile_start[0] - box[0], tile_start[1] - box[1]))
     else:
         # Position pastes based on count tuple (can be a float)
         x_count, y_count = count
         x_count_int = math.ceil(x_count)
         y_count_int = math.ceil(y_count)
-        for x in range(x_count_int):
-            for y in range(y_count_int):
+
+        # Only the tiles near the box (tile edges are rounded, so one more tile on each side is checked)
+        x_range = range(
+            max(math.floor(box[0] * x_count / size[0]) - 1, 0),
+            min(math.ceil(box[2] * x_count / size[0]) + 1, x_count_int)
+        )
+        y_range = range(
+            max(math.floor(box[1] * y_count / size[1]) - 1, 0),
+            min(math.ceil(box[3] * y_count / size[1]) + 1, y_count_int)
+        )
+        for x in x_range:
+            for y in y_range:
                 tile_start = (
-                        round((x / x_count) * new_image.width),
-                        round((y / y_count) * new_image.height)
+                        round((x / x_count) * size[0]),
+                        round((y / y_count) * size[1])
                     )
                 tile_end = (
-                    round(((x + 1) / x_count) * new_image.width),
-                    round(((y + 1) / y_count) * new_image.height)
+                    round(((x + 1) / x_count) * size[0]),
+                    round(((y + 1) / y_count) * size[1])
                 )
 
+                # Skip tiles outside of the box
+                if tile_end[0] <= box[0] or tile_end[1] <= box[1] or tile_start[0] >= box[2] or \
+                        tile_start[1] >= box[3]:
+                    continue
+
                 target_size = (
                     tile_end[0] - tile_start[0],
                     tile_end[1] - tile_start[1]
@@ -79,13 +119,233 @@ def tile_image(image_tile, size, background_color=(0, 0, 0), count=None):
                 if image_tile.size == target_size:
                     this_tile = image_tile
                 else:
-                    this_tile = image_tile.resize(target_size, resample=Image.Resampling.LANCZOS)
+                    this_tile = image_tile.resize(target_size, resample=resample)
 
-                new_image.paste(this_tile, tile_start)
+                new_image.paste(this_tile, (tile_start[0] - box[0], tile_start[1] - box[1]))
 
     return new_image
 
 
+# Get the source index Pillow's NEAREST resize uses for every destination index along one axis
+@functools.lru_cache(maxsize=64)
+def get_nearest_mapping(source_length, target_length):
+    index_image = Image.new("I", (source_length, 1))
+    index_image.putdata(range(source_length))
+    index_image = index_image.resize((target_length, 1), resample=Image.Resampling.NEAREST)
+
+    return tuple(array.array("i", index_image.tobytes()))
+
+
+# Split a span of a NEAREST mapping into (source index, offset, length) runs
+def get_nearest_runs(mapping, start, end):
+    runs = list()
+    run_start = start
+    for x in range(start + 1, end + 1):
+        if x == end or mapping[x] != mapping[run_start]:
+            runs.append((mapping[run_start], run_start - start, x - run_start))
+            run_start = x
+
+    return runs
+
+
+# Get the box of destination pixels that a box of source pixels maps to with a NEAREST resize
+def map_nearest_box(box, source_size, target_size):
+    x_mapping = get_nearest_mapping(source_size[0], target_size[0])
+    y_mapping = get_nearest_mapping(source_size[1], target_size[1])
+
+    return (
+        bisect.bisect_left(x_mapping, box[0]),
+        bisect.bisect_left(y_mapping, box[1]),
+        bisect.bisect_left(x_mapping, box[2]),
+        bisect.bisect_left(y_mapping, box[3])
+    )
+
+
+# Render just one box of a NEAREST resize, pixel-identical to cropping the full resize
+def resize_nearest_region(image, size, box):
+    # Without any resizing it's only a crop (ex. when not pixelating)
+    if image.size == tuple(size):
+        return image.crop(box)
+
+    x_runs = get_nearest_runs(get_nearest_mapping(image.width, size[0]), box[0], box[2])
+    y_runs = get_nearest_runs(get_nearest_mapping(image.height, size[1]), box[1], box[3])
+
+    # Only the source rows used by this box are needed
+    source_top = y_runs[0][0]
+    source_bottom = y_runs[-1][0] + 1
+
+    # Stretch the source columns first
+    columns = Image.new(image.mode, (box[2] - box[0], source_bottom - source_top))
+    for source_x, offset, length in x_runs:
+        column = image.crop((source_x, source_top, source_x + 1, source_bottom))
+        columns.paste(column.resize((length, columns.height), resample=Image.Resampling.NEAREST), (offset, 0))
+
+    # Then stretch the rows
+    result = Image.new(image.mode, (box[2] - box[0], box[3] - box[1]))
+    for source_y, offset, length in y_runs:
+        row = columns.crop((0, source_y - source_top, columns.width, source_y - source_top + 1))
+        result.paste(row.resize((result.width, length), resample=Image.Resampling.NEAREST), (0, offset))
+
+    return result
+
+
+# Get how far (in pixels) a Pillow GaussianBlur can carry a change
+def get_blur_halo(radius):
+    if radius <= 0:
+        return 0
+
+    # Pillow approximates the gaussian with 3 box blur passes
+    return 3 * (math.ceil(radius) + 1)
+
+
+# Get the Pillow filter for a gaussian blur, or with box_blur a single box blur with the same spread
+# One box blur is about 2-3x faster than the 3 passes of GaussianBlur, but blockier (and reaches less far, so
+# get_blur_halo() covers both)
+def get_blur_filter(radius, box_blur=False):
+    if box_blur:
+        return ImageFilter.BoxBlur(radius * math.sqrt(3))
+
+    return ImageFilter.GaussianBlur(radius)
+
+
+# Get the weights that NEAREST upscale a line of source pixels and then blur it with an exact gaussian, in one step
+# Returns, for every target index from start to end, the first source index it uses and its weights (float32)
+# The blur is truncated to the same halo as Pillow's, and the line's edge pixels are repeated past its ends
+@functools.lru_cache(maxsize=64)
+def get_resample_blur_weights(source_length, target_length, radius, start, end):
+    import numpy as np
+
+    halo = get_blur_halo(radius)
+    offsets = np.arange(-halo, halo + 1)
+    kernel = np.exp(-(offsets * offsets) / (2 * radius * radius))
+    kernel /= kernel.sum()
+
+    # The source index under every tap of every target index
+    mapping = np.asarray(get_nearest_mapping(source_length, target_length))
+    targets = np.clip(np.arange(start, end)[:, None] + offsets[None, :], 0, target_length - 1)
+    sources = mapping[targets]
+    first_sources = sources[:, 0]
+
+    # Taps that land on the same source pixel add up
+    positions = sources - first_sources[:, None]
+    weights = np.zeros((end - start, int(positions.max()) + 1))
+    rows = np.repeat(np.arange(end - start), len(offsets))
+    np.add.at(weights, (rows, positions.ravel()), np.tile(kernel, end - start))
+
+    return first_sources, weights.astype(np.float32)
+
+
+# Multiply a (sources, values) float32 array by banded weights from get_resample_blur_weights()
+# Target rows are done in blocks, each a small matrix product with only the source rows the block uses
+def apply_resample_weights(first_sources, weights, values, block_size=128):
+    import numpy as np
+
+    target_count, tap_count = weights.shape
+    result = np.empty((target_count, values.shape[1]), dtype=np.float32)
+    for block_start in range(0, target_count, block_size):
+        block_end = min(block_start + block_size, target_count)
+        source_start = first_sources[block_start]
+        source_end = min(first_sources[block_end - 1] + tap_count, values.shape[0])
+
+        block = np.zeros((block_end - block_start, first_sources[block_end - 1] + tap_count - source_start),
+                         dtype=np.float32)
+        rows = np.arange(block_end - block_start)[:, None]
+        columns = (first_sources[block_start:block_end] - source_start)[:, None] + np.arange(tap_count)[None, :]
+        block[rows, columns] = weights[block_start:block_end]
+
+        np.matmul(block[:, :source_end - source_start], values[source_start:source_end],
+                  out=result[block_start:block_end])
+
+    return result
+
+
+# Render one box of a NEAREST upscale followed by an exact gaussian blur, without making the full size image
+# The same as blurring the upscaled image with a true gaussian (Pillow's GaussianBlur is a close approximation)
+# Any box is identical to cropping the full image, needs NumPy
+def resample_blur_region(image, size, box, radius):
+    import numpy as np
+
+    x_sources, x_weights = get_resample_blur_weights(image.width, size[0], radius, box[0], box[2])
+    y_sources, y_weights = get_resample_blur_weights(image.height, size[1], radius, box[1], box[3])
+
+    # Only the source pixels used by this box are needed
+    left = x_sources[0]
+    right = min(x_sources[-1] + x_weights.shape[1], image.width)
+    top = y_sources[0]
+    bottom = min(y_sources[-1] + y_weights.shape[1], image.height)
+    source = np.asarray(image.crop((left, top, right, bottom)))
+    if source.ndim == 2:
+        source = source[:, :, None]
+    channels = source.shape[2]
+
+    # Resample the columns of the small source first, then the rows (the row pass writes the result in order)
+    columns = source.transpose(1, 0, 2).reshape(right - left, (bottom - top) * channels).astype(np.float32)
+    columns = apply_resample_weights(x_sources - left, x_weights, columns)
+    width = columns.shape[0]
+    rows = np.ascontiguousarray(columns.reshape(width, bottom - top, channels).transpose(1, 0, 2))
+    result = apply_resample_weights(y_sources - top, y_weights, rows.reshape(bottom - top, width * channels))
+
+    # Round to the nearest value
+    result += 0.5
+    np.clip(result, 0, 255, out=result)
+    result = result.astype(np.uint8).reshape(-1, width, channels)
+    if channels == 1:
+        result = result[:, :, 0]
+
+    # Modes NumPy can't tell apart by their channel count (ex. RGBX) are given back their own mode
+    result_image = Image.fromarray(result)
+    if result_image.mode != image.mode:
+        result_image = Image.frombytes(image.mode, result_image.size, result.tobytes())
+
+    return result_image
+
+
+# Grow a box by a margin on every side, clipped to a frame size
+def expand_box(box, margin, size):
+    return (
+        max(box[0] - margin, 0),
+        max(box[1] - margin, 0),
+        min(box[2] + margin, size[0]),
+        min(box[3] + margin, size[1])
+    )
+
+
+# Grow a box outwards to the nearest multiples of a (width, height) period, clipped to a frame size
+def snap_box(box, period, size):
+    return (
+        max((box[0] // period[0]) * period[0], 0),
+        max((box[1] // period[1]) * period[1], 0),
+        min(math.ceil(box[2] / period[0]) * period[0], size[0]),
+        min(math.ceil(box[3] / period[1]) * period[1], size[1])
+    )
+
+
+# Get how many bytes are used to hold an image's pixels
+# Pillow stores anything wider than 2 bytes (ex. RGB) as 4 bytes per pixel, NumPy arrays know their own size
+def get_image_bytes(image):
+    if hasattr(image, "nbytes"):
+        return image.nbytes
+
+    if image.mode in ["1", "L", "P"]:
+        pixel_bytes = 1
+    elif image.mode.startswith("I;16"):
+        pixel_bytes = 2
+    else:
+        pixel_bytes = 4
+
+    return image.width * image.height * pixel_bytes
+
+
+# Format a byte count for people to read
+def format_bytes(byte_count):
+    for unit in ["B", "KiB", "MiB"]:
+        if abs(byte_count) < 1024:
+            return f"{byte_count:.1f} {unit}" if unit != "B" else f"{byte_count} {unit}"
+        byte_count /= 1024
+
+    return f"{byte_count:.1f} GiB"
+
+
 # Mix a PIL image with white
 def mix_color_with_image(image, color, factor):
     if factor <= 0:
@@ -130,8 +390,8 @@ def parse_sequenced_image_name(image_file):
     number = ""
 
     for x in file_basename[::-1]:
-        if x.isdigit():
-            number += x
+        if x in "0123456789":
+            number = x + number
         else:
             break
 
@@ -139,21 +399,304 @@ def parse_sequenced_image_name(image_file):
         return {"error": None,
                 "digits": len(number),
                 "image_number": int(number),
-                "prefix": os.path.join(main_path, "".join(file_basename.split(number)[:-1])),
+                "prefix": os.path.join(main_path, file_basename[:-len(number)]),
                 "ext": ext}
     else:
         return {"error": "No trailing digits found."}
 
 
-def get_all_images_in_sequence(image_file):
+# Find every image in the same sequence as an image, sorted by frame number
+# This lists the directory once (it never opens or checks files that aren't needed)
+# Only frames from start to end (inclusive) are kept, and only every step-th frame number after the first
+def get_all_images_in_sequence(image_file, start=None, end=None, step=1):
     info = parse_sequenced_image_name(image_file)
 
-    if info["error"] is None:
-        return {
-            "files": glob.glob(info["prefix"] + ("[0-9]" * info["digits"]) + info["ext"]),
-            "digits": info["digits"],
-            "ext": info["ext"],
-            "prefix": info["prefix"]
-        }
-    else:
+    if info["error"] is not None:
         return None
+
+    main_path, name_prefix = os.path.split(info["prefix"])
+    frames = dict()
+    with os.scandir(main_path if main_path != "" else ".") as entries:
+        for entry in entries:
+            name = entry.name
+            if not (name.startswith(name_prefix) and name.endswith(info["ext"])):
+                continue
+
+            number = name[len(name_prefix):len(name) - len(info["ext"])]
+            if len(number) != info["digits"] or not all(x in "0123456789" for x in number):
+                continue
+
+            number = int(number)
+            if (start is not None and number < start) or (end is not None and number > end):
+                continue
+
+            frames[number] = os.path.join(main_path, name)
+
+    numbers = sorted(frames)
+
+    # Keep every step-th frame number, counting from the start (or the first frame)
+    if step > 1 and len(numbers) > 0:
+        first = start if start is not None else numbers[0]
+        numbers = [number for number in numbers if (number - first) % step == 0]
+
+    return {
+        "files": [frames[number] for number in numbers],
+        "numbers": numbers,
+        "missing": get_missing_frames(numbers, start, end, step),
+        "digits": info["digits"],
+        "ext": info["ext"],
+        "prefix": info["prefix"]
+    }
+
+
+# Get the ranges of frame numbers (first, last) missing from a sorted list of frame numbers
+# Frames before the first one are only missing if a start is given, and after the last one if an end is given
+def get_missing_frames(numbers, start=None, end=None, step=1):
+    if len(numbers) == 0:
+        if start is not None and end is not None and start <= end:
+            return [(start, end - ((end - start) % step))]
+        return list()
+
+    expected = list()
+    if start is not None:
+        expected.append(start - step)
+    expected += numbers
+    if end is not None:
+        expected.append(end - ((end - numbers[0]) % step) + step)
+
+    missing = list()
+    for previous, number in zip(expected, expected[1:]):
+        if number - previous > step:
+            missing.append((previous + step, number - step))
+
+    return missing
+
+
+# Get the frame numbers that belong to one shard (index, counting from 1) of a sequence split into count shards
+# Frames are assigned by their absolute frame number, never by the frames that were found, so a missing frame
+# (even the first or the last one) never moves any other frame to another shard
+# Interleaved shards get every count-th frame, block shards need the start and end of the range to split into blocks
+def get_shard_numbers(numbers, index, count, interleaved=False, start=None, end=None, step=1):
+    if not interleaved and (start is None or end is None):
+        raise ValueError("Block shards need the start and end frame numbers")
+
+    shard_numbers = list()
+    for number in numbers:
+        if interleaved:
+            number_shard = (number // step) % count
+        else:
+            # Positions count every step-th frame number from the start
+            frame_count = (end - start) // step + 1
+            number_shard = (((number - start) // step) * count) // frame_count
+        if number_shard == index - 1:
+            shard_numbers.append(number)
+
+    return shard_numbers
+
+
+# Get the ranges of frame numbers (first, last) in a sorted list of frame numbers, ex. [5, 6, 7, 9] -> [(5, 7), (9, 9)]
+def get_frame_ranges(numbers, step=1):
+    ranges = list()
+    for number in numbers:
+        if len(ranges) > 0 and number - ranges[-1][1] == step:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+
+    return ranges
+
+
+# Find every file in a sequence (a path prefix and extension), with any number of digits
+# Returns a dict of frame numbers to lists of files (more than one if a frame was saved with different padding)
+def find_sequence_files(prefix, ext):
+    main_path, name_prefix = os.path.split(prefix)
+    if not os.path.isdir(main_path if main_path != "" else "."):
+        return dict()
+
+    with os.scandir(main_path if main_path != "" else ".") as entries:
+        names = [entry.name for entry in entries]
+
+    frames = group_sequence_names(names, name_prefix, ext)
+    return {number: [os.path.join(main_path, name) for name in frame_names] for number, frame_names in frames.items()}
+
+
+# Get the file names that are part of a sequence (a name prefix and extension), with any number of digits
+# Returns a dict of frame numbers to lists of names (names can be given more than once, ex. from several archives)
+def group_sequence_names(names, name_prefix, ext):
+    frames = dict()
+    for name in names:
+        if not (name.startswith(name_prefix) and name.lower().endswith(ext.lower())):
+            continue
+
+        number = name[len(name_prefix):len(name) - len(ext)]
+        if len(number) == 0 or not all(x in "0123456789" for x in number):
+            continue
+
+        frames.setdefault(int(number), list()).append(name)
+
+    return frames
+
+
+# Write ranges of frame numbers as text, ex. "5-9, 12"
+def format_frame_ranges(ranges, step=1):
+    if step > 1:
+        every = f" (every {step})"
+    else:
+        every = ""
+
+    return ", ".join([f"{first}" if first == last else f"{first}-{last}{every}" for first, last in ranges])
+
+
+# Get the Pillow format name used to save a file extension
+def get_format_for_extension(ext):
+    return Image.registered_extensions().get(ext.lower())
+
+
+# Get the keyword arguments for Image.save() for an output file extension
+def get_save_options(ext,
+                     png_compress_level=None,
+                     png_strategy=None,
+                     webp_method=None,
+                     jpeg_quality=None,
+                     jpeg_subsampling=None
+                     ):
+    image_format = get_format_for_extension(ext)
+    options = dict()
+
+    if image_format == "PNG":
+        if png_compress_level is not None:
+            options["compress_level"] = png_compress_level
+        if png_strategy is not None:
+            options["compress_type"] = {
+                PngStrategy.DEFAULT: zlib.Z_DEFAULT_STRATEGY,
+                PngStrategy.FILTERED: zlib.Z_FILTERED,
+                PngStrategy.HUFFMAN_ONLY: zlib.Z_HUFFMAN_ONLY,
+                PngStrategy.RLE: zlib.Z_RLE,
+                PngStrategy.FIXED: zlib.Z_FIXED
+            }[png_strategy]
+    elif image_format == "WEBP":
+        if webp_method is not None:
+            options["lossless"] = True
+            options["method"] = webp_method
+    elif image_format == "JPEG":
+        if jpeg_quality is not None:
+            options["quality"] = jpeg_quality
+        if jpeg_subsampling is not None:
+            options["subsampling"] = jpeg_subsampling
+
+    return options
+
+
+# Make an opened (not yet loaded) JPEG image decode at a reduced size, if it can without going below size
+# JPEGs are scaled while decoding by the largest of 1/2, 1/4 or 1/8 that still leaves at least size, other formats
+# (and a size of None) are left as they are. Returns if the image was reduced
+def draft_image(image, size):
+    if size is None or image.format != "JPEG":
+        return False
+
+    original_size = image.size
+    image.draft(image.mode, size)
+
+    return image.size != original_size
+
+
+# Get the color mode an image must be converted to before it can be saved with a file extension
+# This test-encodes a tiny image once, instead of catching errors on every saved image
+def get_save_mode(mode, ext):
+    test_image = Image.new(mode, (1, 1))
+    try:
+        test_image.save(io.BytesIO(), format=get_format_for_extension(ext))
+    except (OSError, KeyError, ValueError):
+        return "RGB"
+
+    return mode
+
+
+# Save an image with pre-computed save options and color mode
+def save_image(image, file_name, mode=None, save_options=None):
+    if save_options is None:
+        save_options = dict()
+
+    if mode is None or image.mode == mode:
+        image.save(file_name, **save_options)
+    else:
+        converted_image = image.convert(mode)
+        converted_image.save(file_name, **save_options)
+        converted_image.close()
+
+
+# Encode an image as the bytes of a file with an extension, with pre-computed save options and color mode
+def encode_image(image, ext, mode=None, save_options=None):
+    if save_options is None:
+        save_options = dict()
+
+    output = io.BytesIO()
+    save_image(image, output, mode=mode, save_options=dict(save_options, format=get_format_for_extension(ext)))
+
+    return output.getvalue()
+
+
+# Save a dict of NumPy arrays as an .npz file (the file name is used as-is)
+def save_npz(file_name, arrays, compress=False):
+    import numpy as np
+
+    with open(file_name, "wb") as f:
+        if compress:
+            np.savez_compressed(f, **arrays)
+        else:
+            np.savez(f, **arrays)
+
+
+# Load every array in an .npz file into a dict
+# With mmap, uncompressed arrays are memory-mapped from the file instead of read (compressed ones are read)
+def load_npz(file_name, mmap=False):
+    import zipfile
+    import numpy as np
+
+    arrays = dict()
+    with zipfile.ZipFile(file_name) as archive:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                arrays[name] = memmap_zip_member(file_name, info)
+            else:
+                with archive.open(info) as f:
+                    arrays[name] = np.lib.format.read_array(f, allow_pickle=False)
+
+    return arrays
+
+
+# Memory-map an uncompressed .npy file stored in a zip file
+def memmap_zip_member(file_name, info):
+    import struct
+    import numpy as np
+
+    with open(file_name, "rb") as f:
+        # Skip the local file header (its name and extra field lengths can differ from the central directory)
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if dtype.hasobject:
+        raise ValueError(f"Can't memory-map \"{info.filename}\", it holds Python objects")
+
+    return np.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
+
+
+# Get a hash that identifies a dict of JSON-compatible settings
+def get_settings_hash(settings):
+    import json
+    import hashlib
+
+    text = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
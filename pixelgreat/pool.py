@@ -0,0 +1,122 @@
+import os
+import asyncio
+import multiprocessing
+import concurrent.futures
+
+from . import backends, shared
+
+
+# Renders images with a Pixelgreat object on a pool of threads (or processes), for asyncio code
+# At most max_in_flight renders are given to the pool at once, the rest wait in the event loop without using a worker
+# Use it as an async context manager: "async with ConverterPool(converter) as pool: image = await pool.apply(image)"
+class ConverterPool:
+    def __init__(self,
+                 converter,
+                 workers=None,  # How many threads (or processes) render at once, defaults to the CPU count
+                 processes=False,  # If True, render in processes instead of threads (images are pickled to them)
+                 max_in_flight=None  # How many renders can be in the pool at once, defaults to workers
+                 ):
+        # Incremental renders depend on the previous image, so they can't be done in any order
+        if converter.incremental:
+            raise ValueError("Incremental converters can't be used in a pool")
+        self.converter = converter
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f"Workers must be no less than 1 (got {workers})")
+        self.workers = workers
+
+        if max_in_flight is None:
+            max_in_flight = workers
+        if max_in_flight < 1:
+            raise ValueError(f"Max in flight must be no less than 1 (got {max_in_flight})")
+        self.max_in_flight = max_in_flight
+
+        self.processes = processes
+        self.executor = None
+        self.shared_converter = None
+        self.semaphore = None
+        self.loop = None
+
+        # How many renders are in the pool (running, or waiting for a worker)
+        self.in_flight = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # If the block failed (or was cancelled), renders that haven't started are cancelled
+        await self.close(cancel=exc_type is not None)
+
+    # Make the executor (done by "async with", only call this when not using it)
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        if self.processes:
+            # Workers use the masks in shared memory if NumPy is available, and otherwise build their own
+            # Workers are spawned, forking a process that has other threads running (ex. numba's) can deadlock
+            if "numpy" in backends.get_available_backends():
+                self.shared_converter = shared.SharedConverter(self.converter)
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=shared.init_worker,
+                initargs=(self.shared_converter, self.converter.backend, self.converter.get_settings())
+            )
+        else:
+            # Build the masks now, so threads never build them at the same time
+            self.converter.get_masks()
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+    # Render an image (a coroutine), the same as Pixelgreat.apply()
+    # Cancelling it while it waits for a free slot (or worker) means it is never rendered
+    # A render that has already started can't be stopped, it finishes in the background and the result is dropped
+    async def apply(self, image, region=None):
+        if self.executor is None:
+            raise RuntimeError("The pool isn't running, use it with \"async with\"")
+
+        await self.semaphore.acquire()
+        self.in_flight += 1
+        try:
+            if self.processes:
+                future = self.executor.submit(shared.apply_in_worker, image, region)
+            else:
+                future = self.executor.submit(self.converter.apply, image, region=region)
+        except BaseException:
+            self.free_slot()
+            raise
+
+        # The slot is only given back when the render is really done (or cancelled before it started)
+        future.add_done_callback(self.release_slot)
+
+        return await asyncio.wrap_future(future)
+
+    # Called from the thread that finished (or cancelled) a render
+    def release_slot(self, future):
+        try:
+            self.loop.call_soon_threadsafe(self.free_slot)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def free_slot(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    # Wait for every render to finish and stop the workers (done by "async with")
+    # With cancel, renders that haven't started yet are cancelled instead
+    async def close(self, cancel=False):
+        if self.executor is None:
+            return
+
+        executor = self.executor
+        self.executor = None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=cancel)
+
+        if self.shared_converter is not None:
+            self.shared_converter.close()
+            self.shared_converter.unlink()
+            self.shared_converter = None
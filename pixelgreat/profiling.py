@@ -0,0 +1,233 @@
+import sys
+import math
+import json
+import time
+import contextlib
+import collections
+import tracemalloc
+
+
+# A profiler that doesn't measure anything, used when no profiler is given
+class NullProfiler:
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+
+NULL_PROFILER = NullProfiler()
+
+
+# A profiler that adds up the time spent in each stage (in seconds)
+class StageTimer:
+    def __init__(self):
+        self.timings = dict()
+        self.counts = dict()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - start_time)
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reset(self):
+        self.timings = dict()
+        self.counts = dict()
+
+
+# Get the current and peak resident memory of this process (in bytes)
+# The peak is only available on Linux, elsewhere it is None
+def get_rss():
+    try:
+        with open("/proc/self/status") as status_file:
+            values = dict()
+            for line in status_file:
+                key, value = line.split(":", 1)
+                if key in ["VmRSS", "VmHWM"]:
+                    values[key] = int(value.split()[0]) * 1024
+        return values["VmRSS"], values["VmHWM"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024  # Kilobytes everywhere but macOS
+
+    return max_rss, None
+
+
+# Reset the peak resident memory of this process to the current value, if possible (Linux only)
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs_file:
+            clear_refs_file.write("5")
+    except OSError:
+        return False
+
+    return True
+
+
+# A profiler that records the largest extra memory each stage needed while it ran (in bytes)
+# "rss" measures the whole process, including Pillow's image buffers
+# (the true peak is only available on Linux, elsewhere it is the growth from start to end of the stage)
+# "tracemalloc" measures only Python allocations (including NumPy arrays, but not Pillow images)
+class MemoryProfiler:
+    def __init__(self, method="rss"):
+        if method not in ["rss", "tracemalloc"]:
+            raise ValueError(f"Unknown memory profiling method \"{method}\" (expected rss or tracemalloc)")
+        self.method = method
+        self.peaks = dict()
+
+        if self.method == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.method == "tracemalloc":
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        else:
+            start_memory = get_rss()[0]
+            peak_was_reset = reset_peak_rss()
+
+        try:
+            yield
+        finally:
+            if self.method == "tracemalloc":
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            else:
+                end_memory, end_peak = get_rss()
+                if peak_was_reset and end_peak is not None:
+                    peak_memory = end_peak
+                else:
+                    peak_memory = end_memory
+
+            self.peaks[name] = max(self.peaks.get(name, 0), peak_memory - start_memory)
+
+    def reset(self):
+        self.peaks = dict()
+
+
+# Send each stage to several profilers at once
+class MultiProfiler:
+    def __init__(self, *profilers):
+        self.profilers = profilers
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        with contextlib.ExitStack() as stack:
+            for profiler in self.profilers:
+                stack.enter_context(profiler.stage(name))
+            yield
+
+
+# Get a percentile (0 - 100) of a list of values, with the nearest-rank method (None if there are no values)
+def get_percentile(values, percent):
+    if len(values) == 0:
+        return None
+
+    values = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+# Writes the progress of a long run as JSON lines (one JSON object per line), for other programs to follow
+# Events are "start", then one "frame" for every frame once all of its images are saved, then "summary" (or "error")
+# Durations are in seconds, and the frames per second (and ETA) are measured over the last "window" frames
+class ProgressReporter:
+    def __init__(self, stream, frame_count, encode_threads=0, window=10):
+        self.stream = stream
+        self.frame_count = frame_count
+        self.encode_threads = encode_threads
+
+        self.start_time = None
+        self.done_times = collections.deque(maxlen=window + 1)
+        self.frames_done = 0
+        self.bytes_written = 0
+        self.totals = {"decode": 0.0, "apply": 0.0, "encode": 0.0}
+        self.latencies = list()
+
+    def write(self, event):
+        self.stream.write(json.dumps(event) + "\n")
+        self.stream.flush()
+
+    def start(self, **info):
+        self.start_time = time.perf_counter()
+        self.done_times.append(self.start_time)
+        self.write({"event": "start", "frames": self.frame_count, **info})
+
+    # How busy the converting thread and the encoder threads have been, from 0 to 1
+    # The encoders are None when images are saved by the converting thread
+    def get_utilization(self, elapsed):
+        if elapsed <= 0:
+            return {"convert": None, "encode": None}
+
+        if self.encode_threads > 0:
+            convert = self.totals["decode"] + self.totals["apply"]
+            encode = round(min(1.0, self.totals["encode"] / (elapsed * self.encode_threads)), 3)
+        else:
+            convert = sum(self.totals.values())
+            encode = None
+
+        return {"convert": round(min(1.0, convert / elapsed), 3), "encode": encode}
+
+    # Report a frame that is done, with the time it took to decode, apply and encode (all of its images),
+    # the bytes written for it, and the time (from time.perf_counter()) its decoding started
+    def frame(self, number, decode, apply, encode, bytes_written, started):
+        now = time.perf_counter()
+        elapsed = now - self.start_time
+
+        self.frames_done += 1
+        self.bytes_written += bytes_written
+        self.totals["decode"] += decode
+        self.totals["apply"] += apply
+        self.totals["encode"] += encode
+        self.latencies.append(now - started)
+
+        self.done_times.append(now)
+        window_time = self.done_times[-1] - self.done_times[0]
+        fps = (len(self.done_times) - 1) / window_time if window_time > 0 else None
+        eta = (self.frame_count - self.frames_done) / fps if fps else None
+
+        self.write({
+            "event": "frame",
+            "frame": number,
+            "done": self.frames_done,
+            "frames": self.frame_count,
+            "decode": round(decode, 6),
+            "apply": round(apply, 6),
+            "encode": round(encode, 6),
+            "latency": round(now - started, 6),
+            "bytes": bytes_written,
+            "bytes_total": self.bytes_written,
+            "fps": round(fps, 3) if fps else None,
+            "eta": round(eta, 1) if eta is not None else None,
+            "elapsed": round(elapsed, 3),
+            "utilization": self.get_utilization(elapsed)
+        })
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time
+        self.write({
+            "event": "summary",
+            "frames": self.frames_done,
+            "elapsed": round(elapsed, 3),
+            "fps": round(self.frames_done / elapsed, 3) if elapsed > 0 else None,
+            "bytes_total": self.bytes_written,
+            "totals": {name: round(total, 6) for name, total in self.totals.items()},
+            "latency": {
+                f"p{percent}": round(get_percentile(self.latencies, percent), 6) if self.frames_done > 0 else None
+                for percent in [50, 95, 99]
+            },
+            "utilization": self.get_utilization(elapsed)
+        })
+
+    def error(self, exception):
+        self.write({
+            "event": "error",
+            "frames": self.frames_done,
+            "elapsed": round(time.perf_counter() - self.start_time, 3) if self.start_time is not None else None,
+            "error": f"{type(exception).__name__}: {exception}"
+        })
@@ -0,0 +1,267 @@
+import math
+import itertools
+import collections
+from PIL import Image, ImageDraw, ImageFilter
+
+from .core import Pixelgreat
+from .profiling import NULL_PROFILER
+
+# The pipeline stages, in order (each one only depends on the stages before it)
+STAGES = ["tone", "pixelate", "blur", "scanline", "washout", "grid", "bloom"]
+
+# The first stage each setting changes (settings that change the defaults of others count as "tone")
+SETTING_STAGES = {
+    "screen_type": "tone",
+    "direction": "tone",
+    "color_mode": "tone",
+    "brighten": "tone",
+    "output_size": "pixelate",
+    "pixel_size": "pixelate",
+    "pixel_aspect": "pixelate",
+    "pixelate": "pixelate",
+    "blur": "blur",
+    "scanline_strength": "scanline",
+    "scanline_spacing": "scanline",
+    "scanline_size": "scanline",
+    "scanline_blur": "scanline",
+    "washout": "washout",
+    "grid_strength": "grid",
+    "pixel_padding": "grid",
+    "rounding": "grid",
+    "bloom_strength": "bloom",
+    "bloom_size": "bloom"
+}
+
+
+# Renders one image over and over with changing settings, only re-running the stages a change affects
+# The output of every stage is kept, keyed by every setting it (and the stages before it) depends on
+class Session:
+    def __init__(self,
+                 image,
+                 output_size,
+                 pixel_size,
+                 cache_size=2,  # How many outputs to keep for each stage (and masks of each type)
+                 backend=None,
+                 **settings  # Any other Pixelgreat() settings
+                 ):
+        self.image = image
+
+        self.settings = dict(settings)
+        self.settings["output_size"] = output_size
+        self.settings["pixel_size"] = pixel_size
+        if "color_mode" not in self.settings:
+            self.settings["color_mode"] = image.mode
+        for name in self.settings:
+            if name not in SETTING_STAGES:
+                raise ValueError(f"\"{name}\" is not a setting that can be used in a session")
+
+        if cache_size < 1:
+            raise ValueError(f"Cache size must be no less than 1 (got {cache_size})")
+        self.cache_size = cache_size
+
+        self.backend = backend
+
+        # The outputs of each stage, and the masks, by key (the most recently used last)
+        self.cache = {name: collections.OrderedDict() for name in STAGES + ["scanline_mask", "grid_mask"]}
+
+        # The stages that ran during the last render
+        self.last_run = list()
+
+    # Change settings for every render after this one
+    def update(self, **changes):
+        for name in changes:
+            if name not in SETTING_STAGES:
+                raise ValueError(f"\"{name}\" is not a setting that can be used in a session")
+        self.settings.update(changes)
+
+    # Render the image with the current settings, and optionally some changes just for this render
+    # An optional profiler (see profiling.py) is told about each stage that runs
+    def render(self, profiler=None, **changes):
+        if profiler is None:
+            profiler = NULL_PROFILER
+
+        settings = dict(self.settings)
+        settings.update(changes)
+
+        # The masks are never built by this object, the session builds (and keeps) them itself
+        composite_filter = Pixelgreat(backend=self.backend, lazy=True, **settings).filter
+        output_box = (0, 0) + composite_filter.output_size
+        self.last_run = list()
+
+        # Every key includes the key of the stage before it
+        key = composite_filter.get_tone_key()
+        result = self.run_stage("tone", key, profiler, lambda: composite_filter.tone_source(self.image))
+
+        toned = result
+        key = composite_filter.get_source_key() + (composite_filter.pixelate, composite_filter.output_size)
+        result = self.run_stage(
+            "pixelate",
+            key,
+            profiler,
+            lambda: self.upscale(composite_filter.downscale_source(toned), composite_filter.output_size)
+        )
+
+        if composite_filter.blur > 0:
+            source = result
+            key += (composite_filter.blur_px,)
+            result = self.run_stage(
+                "blur",
+                key,
+                profiler,
+                lambda: source.filter(ImageFilter.GaussianBlur(composite_filter.blur_px))
+            )
+
+        if composite_filter.scanline_filter is not None:
+            source = result
+            mask = self.get_mask("scanline_mask", composite_filter, composite_filter.scanline_filter)
+            key += composite_filter.scanline_filter.get_key()
+            result = self.run_stage(
+                "scanline",
+                key,
+                profiler,
+                lambda: composite_filter.backend.apply_masks(source, output_box, scanline_mask=mask)
+            )
+
+        if composite_filter.washout_color is not None:
+            source = result
+            key += composite_filter.washout_color
+            result = self.run_stage(
+                "washout",
+                key,
+                profiler,
+                lambda: composite_filter.backend.apply_masks(
+                    source,
+                    output_box,
+                    washout_color=composite_filter.washout_color
+                )
+            )
+
+        if composite_filter.screen_filter is not None:
+            source = result
+            mask = self.get_mask("grid_mask", composite_filter, composite_filter.screen_filter)
+            key += composite_filter.screen_filter.get_key()
+            result = self.run_stage(
+                "grid",
+                key,
+                profiler,
+                lambda: composite_filter.backend.apply_masks(source, output_box, grid_mask=mask)
+            )
+
+        if composite_filter.bloom_size_px > 0 and composite_filter.bloom_strength > 0:
+            source = result
+            key += (composite_filter.bloom_size_px, composite_filter.bloom_strength)
+            result = self.run_stage(
+                "bloom",
+                key,
+                profiler,
+                lambda: composite_filter.backend.bloom(
+                    source,
+                    composite_filter.bloom_size_px,
+                    composite_filter.bloom_strength
+                )
+            )
+
+        # Cached images are shared, so give the caller their own copy
+        return result.copy()
+
+    # Render every combination of some settings (a dict of setting names to lists of values)
+    # Returns a list of (changes, image) tuples, in the same order as itertools.product()
+    # Combinations are rendered with the most downstream settings changing fastest, so the cache is reused
+    def sweep(self, grid, profiler=None):
+        names = list(grid.keys())
+        for name in names:
+            if name not in SETTING_STAGES:
+                raise ValueError(f"\"{name}\" is not a setting that can be used in a session")
+
+        combinations = list(itertools.product(*[grid[name] for name in names]))
+
+        # Render order: sort by the values of the most upstream settings first
+        render_names = sorted(names, key=lambda name: STAGES.index(SETTING_STAGES[name]))
+        render_order = sorted(
+            range(len(combinations)),
+            key=lambda index: [
+                list(grid[name]).index(combinations[index][names.index(name)]) for name in render_names
+            ]
+        )
+
+        results = [None] * len(combinations)
+        for index in render_order:
+            changes = dict(zip(names, combinations[index]))
+            results[index] = (changes, self.render(profiler=profiler, **changes))
+
+        return results
+
+    # Render every combination of some settings, and put them together in one labeled image
+    # Each image is shrunk to thumbnail_width (keeping the aspect ratio), with columns images per row
+    def contact_sheet(self, grid, columns=None, thumbnail_width=None, profiler=None):
+        results = self.sweep(grid, profiler=profiler)
+
+        if columns is None:
+            columns = math.ceil(math.sqrt(len(results)))
+        output_size = results[0][1].size
+        if thumbnail_width is None:
+            thumbnail_width = min(output_size[0], 320)
+        thumbnail_size = (thumbnail_width, max(round(output_size[1] * (thumbnail_width / output_size[0])), 1))
+
+        label_height = 14
+        rows = math.ceil(len(results) / columns)
+        sheet = Image.new("RGB", (columns * thumbnail_size[0], rows * (thumbnail_size[1] + label_height)))
+        sheet_draw = ImageDraw.Draw(sheet)
+        for index, (changes, image) in enumerate(results):
+            left = (index % columns) * thumbnail_size[0]
+            top = (index // columns) * (thumbnail_size[1] + label_height)
+
+            sheet.paste(image.convert("RGB").resize(thumbnail_size, resample=Image.Resampling.LANCZOS), (left, top))
+            label = ", ".join([f"{name}={get_label_value(value)}" for name, value in changes.items()])
+            sheet_draw.text((left + 2, top + thumbnail_size[1] + 2), label, fill=(255, 255, 255))
+
+        return sheet
+
+    # Get the output of a stage from the cache, or run it and add it to the cache
+    def run_stage(self, name, key, profiler, function):
+        cache = self.cache[name]
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        with profiler.stage(name):
+            result = function()
+        self.last_run.append(name)
+
+        self.add_to_cache(cache, key, result)
+
+        return result
+
+    # Get an adjusted mask in the form the backend uses, building it only if it isn't in the cache
+    def get_mask(self, name, composite_filter, mask_filter):
+        cache = self.cache[name]
+        key = mask_filter.get_key() + (composite_filter.backend.name,)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        mask = composite_filter.backend.prepare_mask(mask_filter.get_region((0, 0) + mask_filter.size))
+        self.add_to_cache(cache, key, mask)
+
+        return mask
+
+    def add_to_cache(self, cache, key, value):
+        cache[key] = value
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    # Scale a prepared source image up to the output size (the second half of pixelating)
+    @staticmethod
+    def upscale(source, output_size):
+        if source.size != output_size:
+            return source.resize(output_size, resample=Image.Resampling.NEAREST)
+
+        return source
+
+
+# Get the text used for a setting value in a contact sheet label
+def get_label_value(value):
+    if hasattr(value, "value"):
+        return value.value
+
+    return value
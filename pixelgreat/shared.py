@@ -0,0 +1,117 @@
+from multiprocessing import shared_memory
+
+from . import backends
+from .core import Pixelgreat
+
+
+# Publishes the masks of a Pixelgreat object in shared memory, so process pool workers can use them
+# The parent builds the masks once, and each worker attaches zero-copy, read-only views of them
+# Objects of this class can be pickled (only the settings and the shared memory names are sent)
+class SharedConverter:
+    def __init__(self, converter):
+        import numpy as np
+
+        self.settings = converter.get_settings()
+
+        # Copy each mask into its own shared memory block
+        self.mask_info = dict()
+        self.owned_blocks = list()
+        for name, mask in converter.get_masks().items():
+            if mask is None:
+                continue
+            array = np.asarray(mask)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.owned_blocks.append(block)
+            self.mask_info[name] = (block.name, array.shape, array.dtype.str)
+
+        self.attached_blocks = list()
+
+    def __getstate__(self):
+        return {"settings": self.settings, "mask_info": self.mask_info}
+
+    def __setstate__(self, state):
+        self.settings = state["settings"]
+        self.mask_info = state["mask_info"]
+        self.owned_blocks = list()
+        self.attached_blocks = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        self.unlink()
+
+    # Make a Pixelgreat object that uses the shared masks instead of building its own
+    # Array backends (NumPy or numba) use the shared memory directly, Pillow has to copy the masks
+    def attach(self, backend=None):
+        import numpy as np
+
+        if backend is None and "numpy" in backends.get_available_backends() \
+                and backends.BACKENDS["numpy"].supports_mode(self.settings["color_mode"]):
+            backend = "numpy"
+
+        masks = dict()
+        for name, (block_name, shape, dtype) in self.mask_info.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            self.attached_blocks.append(block)
+
+            view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            view.flags.writeable = False
+            masks[name] = view
+
+        return Pixelgreat(backend=backend, masks=masks, **self.settings)
+
+    # Get the total bytes of shared memory used by the masks
+    def get_shared_bytes(self):
+        import numpy as np
+
+        total = 0
+        for block_name, shape, dtype in self.mask_info.values():
+            total += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        return total
+
+    # Stop using the shared memory in this process
+    # Blocks still used by a Pixelgreat object made with attach() stay open until that object is gone
+    def close(self):
+        for block in self.owned_blocks + self.attached_blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass
+        self.attached_blocks = list()
+
+    # Free the shared memory (only done by the process that made this object, after the workers are done)
+    def unlink(self):
+        for block in self.owned_blocks:
+            block.unlink()
+        self.owned_blocks = list()
+
+
+# The converter used by this worker process, set by init_worker()
+worker_converter = None
+
+
+# Use as the initializer of a process pool: init_worker(shared_converter[, backend])
+# Without shared masks (shared_converter is None), each worker builds its own converter from the settings instead
+def init_worker(shared_converter, backend=None, settings=None):
+    global worker_converter
+    if shared_converter is not None:
+        worker_converter = shared_converter.attach(backend=backend)
+    else:
+        worker_converter = Pixelgreat(backend=backend, **settings)
+
+
+# Get the converter made for this worker process by init_worker()
+def get_worker_converter():
+    if worker_converter is None:
+        raise RuntimeError("This process has no converter, use init_worker() as the process pool initializer")
+
+    return worker_converter
+
+
+# Render an image with the converter of this worker process (can be sent to a process pool)
+def apply_in_worker(image, region=None):
+    return get_worker_converter().apply(image, region=region)
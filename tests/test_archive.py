@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+import tarfile
+import zipfile
+import io
+import os
+from PIL import Image, ImageChops
+
+from pixelgreat import helpers
+from pixelgreat.archive import SequenceArchive, list_archive, read_archive
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((96, 72))
+
+
+class TestArchive(unittest.TestCase):
+    def test_frames_can_be_read_while_writing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for ext in [".tar", ".zip"]:
+                file_name = os.path.join(temp_dir, f"frames{ext}")
+                frames = [(f"frame{number:04}.png", helpers.encode_image(test_image.rotate(number), ".png"))
+                          for number in range(3)]
+
+                # 1) Every frame added so far can be read, in order, before the archive is closed
+                archive = SequenceArchive(file_name, fsync_every=2)
+                for count, (name, data) in enumerate(frames, start=1):
+                    archive.add(name, data)
+                    self.assertEqual(list(read_archive(file_name)), frames[:count])
+                archive.close()
+
+                # 2) The closed archive can be read normally, and the frames are unchanged
+                if ext == ".tar":
+                    with tarfile.open(file_name) as reader:
+                        self.assertEqual(reader.getnames(), [name for name, data in frames])
+                        self.assertEqual(reader.extractfile(frames[1][0]).read(), frames[1][1])
+                else:
+                    with zipfile.ZipFile(file_name) as reader:
+                        self.assertEqual(reader.namelist(), [name for name, data in frames])
+                        self.assertEqual(reader.read(frames[1][0]), frames[1][1])
+                decoded = Image.open(io.BytesIO(frames[2][1]))
+                self.assertIsNone(ImageChops.difference(decoded.convert("RGB"), test_image.rotate(2)).getbbox())
+
+    def test_partial_frames_are_skipped(self):
+        # 1) A frame that isn't completely written yet isn't listed
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for ext in [".tar", ".zip"]:
+                file_name = os.path.join(temp_dir, f"frames{ext}")
+                with SequenceArchive(file_name) as archive:
+                    archive.add("a.png", b"a" * 1000)
+                    archive.add("b.png", b"b" * 1000)
+
+                    # Cut the archive in the middle of the second frame
+                    name, offset, size = list_archive(file_name)[1]
+                    with open(file_name, "rb") as file:
+                        data = file.read(offset + size // 2)
+                    with open(file_name + ".part" + ext, "wb") as file:
+                        file.write(data)
+                    self.assertEqual([name for name, offset, size in list_archive(file_name + ".part" + ext)],
+                                     ["a.png"])
+
+                    # 2) Names can't be added twice
+                    with self.assertRaises(ValueError):
+                        archive.add("a.png", b"")
+
+        with self.assertRaises(ValueError):
+            SequenceArchive(os.path.join(tempfile.gettempdir(), "frames.tar.gz"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import contextlib
+import io
+import os
+from PIL import Image, ImageChops
+
+from pixelgreat import core, Pixelgreat, ScreenType
+from pixelgreat.deepzoom import DeepZoomWriter, save_deep_zoom, get_level_count, get_level_size
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((192, 144))
+
+
+# Check if two images are exactly the same
+def images_equal(image_a, image_b):
+    return image_a.size == image_b.size and ImageChops.difference(image_a, image_b).getbbox() is None
+
+
+class TestDeepZoom(unittest.TestCase):
+    def test_levels(self):
+        # 1) Level 0 is 1x1, and every level is half of the next (rounded up)
+        self.assertEqual(get_level_count((1, 1)), 1)
+        self.assertEqual(get_level_count((301, 203)), 10)
+        self.assertEqual(get_level_count((256, 100)), 9)
+        self.assertEqual(get_level_size((301, 203), 9, 10), (301, 203))
+        self.assertEqual(get_level_size((301, 203), 8, 10), (151, 102))
+        self.assertEqual(get_level_size((301, 203), 0, 10), (1, 1))
+
+    def test_save_deep_zoom(self):
+        # 1) Every tile of every level is identical to tiling the full output (halved for each lower level)
+        # 2) A lazy converter never builds its full masks
+        converter = Pixelgreat(output_size=(301, 203), pixel_size=12, screen_type=ScreenType.CRT_TV, blur=1.0,
+                               backend="pillow", lazy=True)
+        result = Pixelgreat(**dict(converter.get_settings(), lazy=False)).apply(test_image)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, "out.dzi")
+            save_deep_zoom(converter, test_image, file_name, tile_size=64, overlap=2)
+            self.assertFalse(converter.filter.masks_built)
+
+            with open(file_name) as dzi_file:
+                dzi = dzi_file.read()
+            self.assertIn("TileSize=\"64\"", dzi)
+            self.assertIn("<Size Width=\"301\" Height=\"203\"/>", dzi)
+
+            level_image = result
+            for level in reversed(range(get_level_count(result.size))):
+                self.assertEqual(level_image.size, get_level_size(result.size, level, get_level_count(result.size)))
+                names = os.listdir(os.path.join(temp_dir, "out_files", str(level)))
+                self.assertEqual(len(names), ((level_image.width + 63) // 64) * ((level_image.height + 63) // 64))
+                for name in names:
+                    column, row = [int(number) for number in os.path.splitext(name)[0].split("_")]
+                    box = (max(column * 64 - 2, 0), max(row * 64 - 2, 0),
+                           min(column * 64 + 66, level_image.width), min(row * 64 + 66, level_image.height))
+                    with Image.open(os.path.join(temp_dir, "out_files", str(level), name)) as tile:
+                        self.assertTrue(images_equal(tile, level_image.crop(box)), f"{level}/{name}")
+                level_image = level_image.reduce(2)
+
+    def test_writer(self):
+        # 1) Rows must fit the image, and every row must be added before closing
+        with tempfile.TemporaryDirectory() as temp_dir:
+            writer = DeepZoomWriter(os.path.join(temp_dir, "out.dzi"), (40, 30), tile_size=16)
+            with self.assertRaises(ValueError):
+                writer.add_rows(Image.new("RGB", (41, 10)))
+            writer.add_rows(Image.new("RGB", (40, 20)))
+            with self.assertRaises(ValueError):
+                writer.close()
+            with self.assertRaises(ValueError):
+                writer.add_rows(Image.new("RGB", (40, 20)))
+            writer.add_rows(Image.new("RGB", (40, 10)))
+            writer.close()
+            self.assertTrue(os.path.isfile(os.path.join(temp_dir, "out_files", "0", "0_0.png")))
+
+    def test_args(self):
+        # 1) Deep Zoom outputs and their tile settings are accepted, unsupported tile formats aren't
+        argv = ["-i", os.path.join(tests_dir, "images", "PM5544.png"), "-o", "out.dzi", "-s", "12"]
+        args = core.parse_args_single(argv + ["-dtf", "JPG", "-v", "o=out_2.dzi dts=512"])
+        self.assertEqual(args.dzi_tile_ext, ".jpg")
+        self.assertEqual(args.variants[0].dzi_tile_size, 512)
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            core.parse_args_single(argv + ["-dtf", "bogus"])
+
+
+if __name__ == '__main__':
+    unittest.main()
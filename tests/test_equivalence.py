@@ -0,0 +1,298 @@
+import unittest
+import os
+import json
+import time
+import itertools
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+
+from pixelgreat import backends, filters, Pixelgreat, ScreenType, Direction, Quality
+from pixelgreat.profiling import StageTimer
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+# Committed stage timings, relative to the calibration time (see get_calibration_time())
+BASELINE_FILE = os.path.join(tests_dir, "baselines", "stage_timings.json")
+
+# The performance check only runs when asked to: PIXELGREAT_PERF=check compares against the baseline,
+# PIXELGREAT_PERF=record overwrites the baseline with this machine's timings
+PERF_MODE = os.environ.get("PIXELGREAT_PERF")
+
+# How many times slower than the baseline a stage can get before the check fails
+PERF_THRESHOLD = float(os.environ.get("PIXELGREAT_PERF_THRESHOLD", 1.5))
+
+# Stages faster than this (relative to the calibration time) are too noisy to check
+PERF_MINIMUM = 0.05
+
+# The largest allowed per-channel difference from the reference Pillow render, by implementation
+TOLERANCES = {
+    "pillow": 0,
+    "numpy": 0,
+    "numba": 0,
+    "regions": 0,
+    "incremental": 0,
+    "threads": 0,
+    "fast_blur": 4,  # An exact gaussian instead of Pillow's box blur approximation
+    "fast_tone": 3,  # Brightened after the downscale, so it is rounded after the downscale instead of before
+    "reducing_gap": 5,  # Reduced by a whole factor (a box average) before the exact downscale
+    "balanced": 5,  # The fast blur, fast tone and a reducing gap of 3
+    "draft": 96  # Also less antialiasing of the grid, and box blurs (only a coarse check, see MEAN_TOLERANCES)
+}
+
+# The largest allowed mean per-channel difference from the reference Pillow render, by implementation
+# This is the real check of the approximations, a few grid edges can differ a lot while the image barely changes
+MEAN_TOLERANCES = {
+    "pillow": 0,
+    "numpy": 0,
+    "numba": 0,
+    "regions": 0,
+    "incremental": 0,
+    "threads": 0,
+    "fast_blur": 0.5,
+    "fast_tone": 0.5,
+    "reducing_gap": 0.5,
+    "balanced": 0.5,
+    "draft": 7  # About 3.6 over the whole matrix, at most 6 for one entry
+}
+
+INPUT_SIZE = (160, 120)
+
+OUTPUT_SIZE = (480, 360)
+
+# Key parameters, each is rendered for every screen type and direction
+PARAMETER_SETS = (
+    {"pixel_size": 12},
+    {"pixel_size": 10, "pixel_aspect": 0.5, "pixelate": False, "blur": 1.0, "bloom_size": 1.0},
+    {"pixel_size": 16, "pixel_aspect": 2.0, "brighten": 0.0, "washout": 1.0, "scanline_strength": 0.5,
+     "grid_strength": 0.5, "rounding": 1.0}
+)
+
+
+# Make fixed synthetic test images (no randomness, so every run sees the same pixels)
+def make_test_images():
+    gradients = Image.merge("RGB", (
+        Image.linear_gradient("L").resize(INPUT_SIZE),
+        Image.radial_gradient("L").resize(INPUT_SIZE),
+        Image.effect_mandelbrot(INPUT_SIZE, (-2.0, -1.2, 1.0, 1.2), 64)
+    ))
+
+    shapes = Image.new("RGB", INPUT_SIZE, (20, 20, 20))
+    shapes_draw = ImageDraw.Draw(shapes)
+    for x in range(0, INPUT_SIZE[0], 20):
+        for y in range(0, INPUT_SIZE[1], 20):
+            if (x + y) % 40 == 0:
+                shapes_draw.rectangle((x, y, x + 9, y + 9), fill=(255, 255, 255))
+    shapes_draw.ellipse((40, 20, 120, 100), fill=(255, 40, 0))
+    shapes_draw.line((0, INPUT_SIZE[1], INPUT_SIZE[0], 0), fill=(0, 255, 255), width=3)
+
+    return {"gradients": gradients, "shapes": shapes}
+
+
+# Render with the full-frame path of a backend
+def render_full(converter, image, profiler):
+    return converter.apply(image, profiler=profiler)
+
+
+# Render in 4 horizontal strips with render_region() and stitch them together
+def render_regions(converter, image, profiler):
+    composite_filter = converter.filter
+    source = composite_filter.prepare_source(image, profiler=profiler)
+    result = Image.new(composite_filter.color_mode, composite_filter.output_size)
+    for strip in range(4):
+        box = (
+            0,
+            round((strip / 4) * result.height),
+            result.width,
+            round(((strip + 1) / 4) * result.height)
+        )
+        result.paste(composite_filter.render_region(source, box, profiler=profiler), box[:2])
+
+    return result
+
+
+# Render after a slightly different frame, so only part of the image is re-rendered
+def render_incremental(converter, image, profiler):
+    incremental_filter = filters.IncrementalFilter(converter.filter)
+    previous_image = image.copy()
+    previous_image.paste((0, 0, 255), (10, 10, 30, 30))
+    incremental_filter.apply(previous_image)
+
+    return incremental_filter.apply(image, profiler=profiler)
+
+
+# Every implementation: (extra converter arguments, render function)
+def get_implementations():
+    implementations = dict()
+    for backend in backends.get_available_backends():
+        implementations[backend] = ({"backend": backend}, render_full)
+    implementations["regions"] = ({"backend": "pillow"}, render_regions)
+    implementations["incremental"] = ({"backend": "pillow"}, render_incremental)
+    implementations["threads"] = ({"backend": "pillow", "threads": 4}, render_full)
+    if "numpy" in implementations:
+        implementations["fast_blur"] = ({"backend": "pillow", "fast_blur": True}, render_full)
+    implementations["fast_tone"] = ({"backend": "pillow", "fast_tone": True}, render_full)
+    implementations["reducing_gap"] = ({"backend": "pillow", "reducing_gap": 3.0}, render_full)
+    implementations["balanced"] = ({"backend": "pillow", "quality": Quality.BALANCED}, render_full)
+    implementations["draft"] = ({"backend": "pillow", "quality": Quality.DRAFT}, render_full)
+
+    return implementations
+
+
+# Every (name, converter arguments) in the test matrix
+def get_matrix():
+    for screen_type, direction, (parameter_index, parameters) in itertools.product(
+            ScreenType, Direction, enumerate(PARAMETER_SETS)):
+        name = f"{screen_type.value}_{direction.value}_{parameter_index}"
+        arguments = dict(output_size=OUTPUT_SIZE, screen_type=screen_type, direction=direction, **parameters)
+        yield name, arguments
+
+
+# Get the largest per-channel difference between two images
+def get_max_difference(image_a, image_b):
+    extrema = ImageChops.difference(image_a, image_b).getextrema()
+
+    return max(band_max for band_min, band_max in extrema)
+
+
+# Get the mean per-channel difference between two images
+def get_mean_difference(image_a, image_b):
+    means = ImageStat.Stat(ImageChops.difference(image_a, image_b)).mean
+
+    return sum(means) / len(means)
+
+
+# Time a fixed Pillow operation, used to make timings comparable between machines
+def get_calibration_time():
+    image = Image.linear_gradient("L").resize(OUTPUT_SIZE).convert("RGB")
+    best_time = None
+    for x in range(30):
+        start_time = time.perf_counter()
+        image.filter(ImageFilter.GaussianBlur(4))
+        ImageChops.multiply(image, image)
+        this_time = time.perf_counter() - start_time
+        if best_time is None or this_time < best_time:
+            best_time = this_time
+
+    return best_time
+
+
+# Render the whole matrix with one implementation
+# Returns the largest and mean differences from the reference per matrix entry, and the best stage timings of a
+# few runs (plus the time to make the converters and their masks, as "build")
+def run_matrix(extra_arguments, render_function, references, repeats=1):
+    differences = dict()
+    mean_differences = dict()
+    stage_timings = {"build": 0.0}
+    images = make_test_images()
+    for name, arguments in get_matrix():
+        start_time = time.perf_counter()
+        converter = Pixelgreat(**extra_arguments, **arguments)
+        stage_timings["build"] += time.perf_counter() - start_time
+        for image_name, image in images.items():
+            best_timings = None
+            for x in range(repeats):
+                profiler = StageTimer()
+                result = render_function(converter, image, profiler)
+                if best_timings is None:
+                    best_timings = dict(profiler.timings)
+                else:
+                    for stage, seconds in profiler.timings.items():
+                        best_timings[stage] = min(best_timings.get(stage, seconds), seconds)
+
+            differences[f"{name}_{image_name}"] = get_max_difference(result, references[f"{name}_{image_name}"])
+            mean_differences[f"{name}_{image_name}"] = get_mean_difference(result, references[f"{name}_{image_name}"])
+            for stage, seconds in best_timings.items():
+                stage_timings[stage] = stage_timings.get(stage, 0.0) + seconds
+
+    return differences, mean_differences, stage_timings
+
+
+# Render the matrix with the reference Pillow backend
+def make_references():
+    references = dict()
+    images = make_test_images()
+    for name, arguments in get_matrix():
+        converter = Pixelgreat(backend="pillow", **arguments)
+        for image_name, image in images.items():
+            references[f"{name}_{image_name}"] = converter.apply(image)
+
+    return references
+
+
+class TestEquivalence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.references = make_references()
+
+    def test_implementations_match_reference(self):
+        # 1) Every implementation must be within its tolerances of the reference for the whole matrix
+        for implementation, (extra_arguments, render_function) in get_implementations().items():
+            differences, mean_differences, stage_timings = run_matrix(extra_arguments, render_function,
+                                                                      self.references)
+            for name, difference in differences.items():
+                self.assertLessEqual(
+                    difference,
+                    TOLERANCES[implementation],
+                    f"{implementation} differs from the reference by {difference} for {name}"
+                )
+                self.assertLessEqual(
+                    mean_differences[name],
+                    MEAN_TOLERANCES[implementation],
+                    f"{implementation} differs from the reference by {mean_differences[name]:.3f} on average for "
+                    f"{name}"
+                )
+
+    @unittest.skipUnless(PERF_MODE in ["check", "record"], "Set PIXELGREAT_PERF=check or record to run")
+    def test_stage_performance(self):
+        # 1) Time every stage of every implementation, relative to the calibration time
+        # Calibrating right before and after each implementation follows the speed of a busy or throttled machine
+        results = dict()
+        summaries = dict()
+        calibration_times = list()
+        for implementation, (extra_arguments, render_function) in get_implementations().items():
+            start_calibration_time = get_calibration_time()
+            differences, mean_differences, stage_timings = run_matrix(
+                extra_arguments, render_function, self.references, repeats=3)
+            calibration_time = max(start_calibration_time, get_calibration_time())
+            calibration_times.append(calibration_time)
+
+            for stage, seconds in stage_timings.items():
+                results[f"{implementation}/{stage}"] = round(seconds / calibration_time, 3)
+            summaries[implementation] = (
+                sum(stage_timings.values()) - stage_timings["build"],
+                max(differences.values()),
+                sum(mean_differences.values()) / len(mean_differences)
+            )
+
+        calibration_time = sum(calibration_times) / len(calibration_times)
+        print(f"\nCalibration time: {calibration_time * 1000:.2f} ms")
+        for key, value in sorted(results.items()):
+            print(f"  {key}: {value}")
+
+        # The speed of each implementation (rendering only, relative to Pillow) and its difference from the reference
+        print("Implementations (speed, largest difference, mean difference):")
+        for implementation, (seconds, largest_difference, mean_difference) in summaries.items():
+            print(f"  {implementation}: {summaries['pillow'][0] / seconds:.2f}x, {largest_difference}, "
+                  f"{mean_difference:.2f}")
+
+        # 2) Record a new baseline, or compare against the committed one
+        if PERF_MODE == "record":
+            with open(BASELINE_FILE, "w") as baseline_file:
+                json.dump(results, baseline_file, indent=4, sort_keys=True)
+                baseline_file.write("\n")
+            return
+
+        with open(BASELINE_FILE) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = list()
+        for key, value in results.items():
+            if key not in baseline or max(value, baseline[key]) < PERF_MINIMUM:
+                continue
+            if value > baseline[key] * PERF_THRESHOLD:
+                regressions.append(f"{key}: {value} (baseline {baseline[key]})")
+
+        self.assertEqual(regressions, [], "Stages slower than the baseline allows")
+
+
+if __name__ == '__main__':
+    unittest.main()
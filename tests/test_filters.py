@@ -0,0 +1,452 @@
+import unittest
+import asyncio
+import os
+import random
+from PIL import Image, ImageChops, ImageStat
+
+from pixelgreat import filters, backends, Pixelgreat, PixelgreatVariants, ScreenType, Direction, Quality, pixelgreat
+from pixelgreat.pool import ConverterPool
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((192, 144))
+
+
+# Check if two images are exactly the same
+def images_equal(image_a, image_b):
+    return image_a.size == image_b.size and ImageChops.difference(image_a, image_b).getbbox() is None
+
+
+class TestCompositeFilter(unittest.TestCase):
+    def make_converters(self):
+        for screen_type in ScreenType:
+            for direction in Direction:
+                for pixelate, fast in ((True, False), (False, False), (True, True)):
+                    yield Pixelgreat(
+                        output_size=(384, 288),
+                        pixel_size=12,
+                        screen_type=screen_type,
+                        direction=direction,
+                        pixelate=pixelate,
+                        blur=0.5,
+                        fast_blur=fast,
+                        fast_tone=fast
+                    )
+
+    def test_render_region(self):
+        # 1) Any region must match the same crop of a full render
+        random.seed(0)
+        for converter in self.make_converters():
+            full = converter.apply(test_image)
+            source = converter.filter.prepare_source(test_image)
+            for x in range(5):
+                left = random.randint(0, full.width - 1)
+                top = random.randint(0, full.height - 1)
+                box = (left, top, random.randint(left + 1, full.width), random.randint(top + 1, full.height))
+
+                self.assertTrue(images_equal(converter.filter.render_region(source, box), full.crop(box)))
+
+    def test_apply_region(self):
+        # 1) A region of a lazy converter must match the same crop of a full render, without building the masks
+        random.seed(2)
+        for converter in self.make_converters():
+            full = converter.apply(test_image)
+            lazy_converter = Pixelgreat(lazy=True, **converter.get_settings())
+            for x in range(5):
+                left = random.randint(0, full.width - 1)
+                top = random.randint(0, full.height - 1)
+                box = (left, top, random.randint(left + 1, full.width), random.randint(top + 1, full.height))
+
+                self.assertTrue(images_equal(lazy_converter.apply(test_image, region=box), full.crop(box)))
+            self.assertFalse(lazy_converter.filter.masks_built)
+
+        # 2) Regions must be inside the output
+        with self.assertRaises(ValueError):
+            lazy_converter.apply(test_image, region=(0, 0, 385, 10))
+        with self.assertRaises(ValueError):
+            lazy_converter.apply(test_image, region=(10, 10, 10, 20))
+
+    def test_incremental_filter(self):
+        # 1) Change small areas of consecutive frames and compare against full renders
+        random.seed(1)
+        for converter in self.make_converters():
+            incremental = filters.IncrementalFilter(converter.filter)
+            frame = test_image.copy()
+            for x in range(4):
+                frame = frame.copy()
+                left = random.randint(0, frame.width - 10)
+                top = random.randint(0, frame.height - 10)
+                frame.paste((255, 0, 0), (left, top, left + 5, top + 5))
+
+                self.assertTrue(images_equal(incremental.apply(frame), converter.filter.apply(frame)))
+
+        # 2) An unchanged frame shouldn't re-render anything
+        incremental.apply(frame)
+        self.assertIsNone(incremental.last_box)
+
+    def test_fast_blur(self):
+        # 1) The fast blur replaces the upscale and blur stages, and stays close to the normal blur
+        converter = Pixelgreat(output_size=(384, 288), pixel_size=12, blur=1.0, backend="pillow")
+        fast_converter = Pixelgreat(**dict(converter.get_settings(), fast_blur=True))
+        self.assertEqual(fast_converter.filter.get_stage_plan()[:4], ["convert", "tone", "downscale", "upscale_blur"])
+        difference = ImageChops.difference(converter.apply(test_image), fast_converter.apply(test_image))
+        self.assertLessEqual(max(band_max for band_min, band_max in difference.getextrema()), 4)
+
+        # 2) Threaded strips are identical to a single strip
+        threaded_converter = Pixelgreat(**dict(fast_converter.get_settings(), threads=3))
+        self.assertTrue(images_equal(threaded_converter.apply(test_image), fast_converter.apply(test_image)))
+
+        # 3) Without pixelating (or blurring) there is nothing to do in one step
+        self.assertFalse(Pixelgreat(**dict(fast_converter.get_settings(), pixelate=False)).filter.fast_blur)
+        self.assertFalse(Pixelgreat(**dict(fast_converter.get_settings(), blur=0.0)).filter.fast_blur)
+
+    def test_fast_tone(self):
+        # 1) The fast tone brightens after the downscale, and stays close to brightening before it
+        for color_mode in ["RGB", "RGBA"]:
+            image = test_image.convert(color_mode)
+            converter = Pixelgreat(output_size=(384, 288), pixel_size=12, color_mode=color_mode, backend="pillow")
+            fast_converter = Pixelgreat(**dict(converter.get_settings(), fast_tone=True))
+            self.assertEqual(fast_converter.filter.get_stage_plan()[:3], ["convert", "downscale", "tone"])
+            difference = ImageChops.difference(converter.filter.prepare_source(image),
+                                               fast_converter.filter.prepare_source(image))
+            self.assertLessEqual(max(band_max for band_min, band_max in difference.getextrema()), 4)
+
+        # 2) Variants share the small image only with variants that brighten it the same way
+        variants = PixelgreatVariants([{"pixel_size": 12}, {"pixel_size": 12, "fast_tone": True},
+                                       {"pixel_size": 12, "fast_tone": True, "brighten": 0.5}])
+        results = variants.apply(test_image)
+        for result, settings in zip(results, variants.variants):
+            self.assertTrue(images_equal(result, pixelgreat(test_image, **settings)))
+
+        # 3) Without pixelating (or brightening) the order doesn't matter
+        self.assertFalse(Pixelgreat(**dict(fast_converter.get_settings(), pixelate=False)).filter.fast_tone)
+        self.assertFalse(Pixelgreat(**dict(fast_converter.get_settings(), brighten=0.0)).filter.fast_tone)
+
+    def test_reducing_gap(self):
+        # 1) Reducing by a whole factor first stays close to one exact downscale, closer with a larger gap
+        image = test_image.resize((960, 720))
+        converter = Pixelgreat(output_size=(384, 288), pixel_size=12, backend="pillow")
+        source = converter.filter.prepare_source(image)
+        mean_differences = list()
+        for reducing_gap in (1.0, 3.0):
+            reduced_converter = Pixelgreat(**dict(converter.get_settings(), reducing_gap=reducing_gap))
+            difference = ImageChops.difference(source, reduced_converter.filter.prepare_source(image))
+            self.assertLessEqual(max(band_max for band_min, band_max in difference.getextrema()), 32 / reducing_gap)
+            mean_differences.append(sum(ImageStat.Stat(difference).mean))
+        self.assertLess(mean_differences[1], mean_differences[0])
+
+        # 2) Variants only share the small image with variants that downscale it the same way
+        variants = PixelgreatVariants([{"pixel_size": 12}, {"pixel_size": 12, "reducing_gap": 1.0}])
+        for result, settings in zip(variants.apply(image), variants.variants):
+            self.assertTrue(images_equal(result, pixelgreat(image, **settings)))
+
+        # 3) The gap can't be below 1
+        with self.assertRaises(ValueError):
+            Pixelgreat(**dict(converter.get_settings(), reducing_gap=0.5))
+
+    def test_quality(self):
+        # 1) The final quality is the default, and the other qualities turn on the fast options
+        settings = {"output_size": (384, 288), "pixel_size": 12, "screen_type": ScreenType.CRT_TV, "backend": "pillow"}
+        converter = Pixelgreat(**settings)
+        self.assertEqual(converter.quality, Quality.FINAL)
+        self.assertTrue(images_equal(converter.apply(test_image),
+                                     Pixelgreat(**settings, quality=Quality.FINAL).apply(test_image)))
+        balanced_converter = Pixelgreat(**settings, quality=Quality.BALANCED)
+        self.assertTrue(balanced_converter.fast_tone)
+        self.assertEqual(balanced_converter.reducing_gap, 3.0)
+        self.assertEqual(Pixelgreat(**settings, quality=Quality.BALANCED, reducing_gap=1.5).reducing_gap, 1.5)
+
+        # 2) Draft masks are rendered the same way in regions, strips and from their settings
+        draft_converter = Pixelgreat(**settings, quality=Quality.DRAFT, scanline_blur=0.5, lazy=True)
+        box = (37, 51, 290, 200)
+        region = draft_converter.apply(test_image, region=box)
+        result = draft_converter.apply(test_image)
+        self.assertTrue(images_equal(region, result.crop(box)))
+        threaded_converter = Pixelgreat(**dict(draft_converter.get_settings(), threads=3))
+        self.assertTrue(images_equal(threaded_converter.apply(test_image), result))
+        self.assertNotEqual(draft_converter.filter.screen_filter.get_key(), converter.filter.screen_filter.get_key())
+
+        # 3) The quality must be a Quality
+        with self.assertRaises(ValueError):
+            Pixelgreat(**settings, quality="DRAFT")
+
+    def test_memory_report(self):
+        # 1) Every held mask is listed, shared masks are only counted once, and the total adds up
+        converter = Pixelgreat(output_size=(384, 288), pixel_size=12, screen_type=ScreenType.CRT_TV,
+                               grid_strength=1.0, scanline_strength=0.5, backend="pillow")
+        report = converter.memory_report()
+        self.assertEqual(report["grid_filter_raw"], 384 * 288 * 4)
+        self.assertNotIn("grid_filter", report)
+        self.assertIn("scanline_filter", report)
+        self.assertEqual(report["total"], sum(value for key, value in report.items() if key != "total"))
+
+
+    def test_explain(self):
+        import io
+        settings = {"output_size": (384, 288), "pixel_size": 12, "screen_type": ScreenType.CRT_TV,
+                    "grid_strength": 0.7, "scanline_strength": 0.5, "blur": 0.5, "backend": "pillow"}
+
+        # 1) The mask memory estimated before the masks are built is what they hold once they are
+        for backend in backends.get_available_backends():
+            lazy_converter = Pixelgreat(**dict(settings, backend=backend), lazy=True)
+            converter = Pixelgreat(**dict(settings, backend=backend))
+            self.assertEqual(lazy_converter.filter.estimate_mask_memory(), converter.memory_report()["total"])
+            self.assertFalse(lazy_converter.filter.masks_built)
+
+        # 2) The plan has the stages, derived sizes and a time for every stage, and explaining keeps no masks
+        stream = io.StringIO()
+        plan = lazy_converter.explain(input_size=(192, 144), samples=1, stream=stream)
+        self.assertFalse(lazy_converter.filter.masks_built)
+        self.assertEqual(plan["stages"], ["convert", "tone", "downscale", "upscale", "blur", "masks", "bloom"])
+        self.assertEqual(set(plan["timings"]), set(plan["stages"]))
+        self.assertGreater(plan["build_time"], 0)
+        self.assertEqual(plan["values"]["blur_px"], 3)
+        self.assertEqual(plan["values"]["grid_tile_count"], (16, 24))
+        self.assertIn("Mask memory:", stream.getvalue())
+        self.assertIsNone(converter.explain(samples=1, verbose=False)["build_time"])
+
+
+    def test_dry_run(self):
+        import io
+        import sys
+        import tempfile
+        import contextlib
+        from unittest import mock
+        from pixelgreat import core
+
+        # 1) A dry run describes every output without building any full masks or saving anything
+        with tempfile.TemporaryDirectory() as temp_dir:
+            test_image.save(os.path.join(temp_dir, "frame0000.png"))
+            argv = ["-i", os.path.join(temp_dir, "frame0000.png"), "-o", os.path.join(temp_dir, "out", "a.png"),
+                    "-s", "12", "-t", "CRT_TV", "-dr", "-v"]
+            for command, ext in [(core.single, ".dzi"), (core.sequence, ".png")]:
+                variant = f"o={os.path.join(temp_dir, 'out', 'b' + ext)} os=2"
+                with mock.patch.object(sys, "argv", ["pixelgreat"] + argv + [variant]), \
+                        mock.patch.object(filters.CompositeFilter, "build_masks", side_effect=AssertionError), \
+                        contextlib.redirect_stdout(io.StringIO()) as output:
+                    command()
+                self.assertEqual(output.getvalue().count("not built yet"), 2)
+            self.assertIn("Estimated time to convert 1 frames", output.getvalue())
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, "out")))
+
+
+class TestBackends(unittest.TestCase):
+    def test_backends_match_pillow(self):
+        # 1) Every available backend must give exactly the same output as Pillow
+        for color_mode in ("RGB", "RGBA"):
+            image = test_image.convert(color_mode)
+            for screen_type in ScreenType:
+                results = dict()
+                for backend in backends.get_available_backends():
+                    converter = Pixelgreat(
+                        output_size=(384, 288),
+                        pixel_size=12,
+                        screen_type=screen_type,
+                        washout=0.5,
+                        color_mode=color_mode,
+                        backend=backend
+                    )
+                    results[backend] = converter.apply(image)
+
+                for backend, result in results.items():
+                    self.assertTrue(images_equal(result, results["pillow"]), f"{backend} {screen_type}")
+
+    def test_get_backend(self):
+        # 1) Unknown backends are an error
+        self.assertRaises(ValueError, backends.get_backend, "not_a_backend")
+
+        # 2) Unsupported color modes fall back to Pillow
+        with self.assertWarns(UserWarning):
+            self.assertEqual(backends.get_backend("numpy", color_mode="RGBX").name, "pillow")
+
+
+# Runs in a worker process of TestShared.test_process_pool
+def apply_in_worker(image):
+    from pixelgreat import shared
+    return shared.get_worker_converter().apply(image).tobytes()
+
+
+class TestVariants(unittest.TestCase):
+    def test_variants(self):
+        # 1) Every variant must match a separate pixelgreat() call
+        # 2) Variants with the same settings must share a converter
+        variants = [
+            {"pixel_size": 12},
+            {"pixel_size": 12, "output_scale": 1.5},
+            {"pixel_size": 12, "screen_type": ScreenType.CRT_TV, "brighten": 0.5},
+            {"pixel_size": 12, "pixelate": False},
+            {"pixel_size": 12}
+        ]
+        converter = PixelgreatVariants(variants)
+        results = converter.apply(test_image)
+        self.assertEqual(len(results), len(variants))
+        for variant, result in zip(variants, results):
+            self.assertTrue(images_equal(result, pixelgreat(test_image, **variant)), variant)
+
+        converters = converter.get_converters(test_image.size, test_image.mode)
+        self.assertIs(converters[0], converters[4])
+        self.assertIsNot(results[0], results[4])
+
+        # 3) Images can be decoded down to the largest pixelated size, unless a variant doesn't pixelate
+        self.assertIsNone(converter.get_draft_size(test_image.size, test_image.mode))
+        draft_size = PixelgreatVariants(variants[:3]).get_draft_size(test_image.size, test_image.mode)
+        self.assertEqual(draft_size, converters[1].get_draft_size())
+        self.assertLess(converters[0].get_draft_size()[0], draft_size[0])
+
+        # 4) Variants need a pixel size, and can't have both an output size and scale
+        with self.assertRaises(ValueError):
+            PixelgreatVariants([{"output_scale": 2}])
+        with self.assertRaises(ValueError):
+            PixelgreatVariants([{"pixel_size": 12, "output_scale": 2, "output_size": (100, 100)}])
+
+    def test_variant_args(self):
+        import contextlib
+        import io
+        from pixelgreat import core
+        argv = ["-i", os.path.join(tests_dir, "images", "PM5544.png"), "-o", "out.png", "-s", "12"]
+
+        # 1) Variants change the arguments they give, by short or long name
+        args = core.parse_args_single(argv + ["-v", "os=2 output=out_2x.png", "-v", "t=CRT_TV o=out_tv.png"])
+        self.assertEqual([variant.output_scale for variant in args.variants], [2.0, None])
+        self.assertEqual(args.variants[1].screen_type, ScreenType.CRT_TV)
+        self.assertEqual(core.parse_args_single(argv + ["-q", "draft"]).quality, Quality.DRAFT)
+        self.assertTrue(core.parse_args_single(argv + ["--dry-run"]).dry_run)
+
+        # 2) Arguments for the whole run, unknown arguments, and reused outputs are rejected
+        for spec in ["ms o=out_2.png", "dr o=out_2.png", "i=other.png o=out_2.png", "bogus=1 o=out_2.png", "os=2"]:
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                core.parse_args_single(argv + ["-v", spec])
+
+
+class TestPreview(unittest.TestCase):
+    def test_preview(self):
+        # 1) A lazy converter must not build its masks until they are needed
+        # 2) The preview must come first and be smaller, and the last step must be the full render
+        converter = Pixelgreat(output_size=(384, 288), pixel_size=12, lazy=True)
+        self.assertFalse(converter.filter.masks_built)
+        steps = list(converter.preview(test_image))
+        self.assertEqual(len(steps), 2)
+        self.assertLess(steps[0][0], 1.0)
+        self.assertEqual(steps[0][1].size, converter.get_preview_converter().output_size)
+        self.assertEqual(steps[1][0], 1.0)
+        self.assertTrue(images_equal(steps[1][1], Pixelgreat(output_size=(384, 288), pixel_size=12).apply(test_image)))
+
+        # 3) The async version must call back with the same steps
+        results = list()
+        future = converter.preview_async(test_image, lambda scale, image: results.append((scale, image)))
+        self.assertTrue(images_equal(future.result(), steps[1][1]))
+        self.assertEqual([scale for scale, image in results], [scale for scale, image in steps])
+
+        # 4) There is no preview when it couldn't be smaller
+        with self.assertWarns(UserWarning):
+            converter = Pixelgreat(output_size=(96, 72), pixel_size=3)
+        self.assertEqual(len(list(converter.preview(test_image))), 1)
+
+
+@unittest.skipUnless("numpy" in backends.get_available_backends(), "NumPy is not installed")
+class TestShared(unittest.TestCase):
+    def make_converter(self):
+        return Pixelgreat(output_size=(384, 288), pixel_size=12, screen_type=ScreenType.CRT_TV)
+
+    def test_attach(self):
+        # 1) An attached converter must render the same as the original, for every backend
+        # 2) The masks must be read-only views of the shared memory
+        from pixelgreat import shared
+        converter = self.make_converter()
+        expected = converter.apply(test_image)
+        with shared.SharedConverter(converter) as shared_converter:
+            mask_bytes = [len(mask.tobytes()) for mask in converter.get_masks().values() if mask is not None]
+            self.assertEqual(shared_converter.get_shared_bytes(), sum(mask_bytes))
+            for name in backends.get_available_backends():
+                attached = shared_converter.attach(backend=name)
+                self.assertTrue(images_equal(attached.apply(test_image), expected), name)
+            for mask in shared_converter.attach().get_masks().values():
+                self.assertFalse(mask.flags.writeable)
+                self.assertFalse(mask.flags.owndata)
+
+    def test_process_pool(self):
+        # 1) Workers started with init_worker() must render the same as the original
+        import concurrent.futures
+        import multiprocessing
+        from pixelgreat import shared
+        converter = self.make_converter()
+        expected = converter.apply(test_image).tobytes()
+        with shared.SharedConverter(converter) as shared_converter:
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=2,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=shared.init_worker,
+                    initargs=(shared_converter,)
+            ) as pool:
+                for result in pool.map(apply_in_worker, [test_image] * 2):
+                    self.assertEqual(result, expected)
+
+
+class TestPool(unittest.IsolatedAsyncioTestCase):
+    def make_converter(self):
+        return Pixelgreat(output_size=(384, 288), pixel_size=12, screen_type=ScreenType.CRT_TV)
+
+    async def test_apply_async(self):
+        # 1) The result must be the same as apply()
+        converter = self.make_converter()
+        expected = converter.apply(test_image)
+        self.assertTrue(images_equal(await converter.apply_async(test_image), expected))
+        self.assertTrue(images_equal(
+            await converter.apply_async(test_image, region=(10, 20, 110, 90)),
+            expected.crop((10, 20, 110, 90))
+        ))
+
+    async def test_pool(self):
+        converter = self.make_converter()
+        expected = converter.apply(test_image)
+        for processes in [False, True]:
+            async with ConverterPool(converter, workers=2, processes=processes, max_in_flight=2) as pool:
+                # 1) No more than max_in_flight renders are given to the workers at once
+                tasks = [asyncio.create_task(pool.apply(test_image)) for x in range(5)]
+                await asyncio.sleep(0)
+                self.assertLessEqual(pool.in_flight, 2)
+
+                # 2) A cancelled render that hasn't started is never rendered, and the others still finish
+                tasks[-1].cancel()
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                self.assertIsInstance(results[-1], asyncio.CancelledError)
+                for result in results[:-1]:
+                    self.assertTrue(images_equal(result, expected), processes)
+                self.assertEqual(pool.in_flight, 0)
+
+        # 3) Incremental converters depend on the order of the images, so they can't be used
+        with self.assertRaises(ValueError):
+            ConverterPool(Pixelgreat(output_size=(384, 288), pixel_size=12, incremental=True))
+
+
+
+@unittest.skipUnless("numpy" in backends.get_available_backends(), "NumPy is not installed")
+class TestCompiled(unittest.TestCase):
+    def test_save_and_load(self):
+        # 1) A loaded converter must render the same as the original, compressed or not, memory-mapped or not
+        # 2) Files with changed settings must be rejected
+        import tempfile
+        import numpy as np
+        converter = Pixelgreat(output_size=(384, 288), pixel_size=12, screen_type=ScreenType.LCD)
+        expected = converter.apply(test_image)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_name = os.path.join(temp_dir, "compiled.npz")
+            for compress in (False, True):
+                converter.save_compiled(file_name, compress=compress)
+                for mmap in (False, True):
+                    for backend in ("pillow", "numpy"):
+                        loaded = Pixelgreat.load_compiled(file_name, mmap=mmap, backend=backend)
+                        self.assertTrue(images_equal(loaded.apply(test_image), expected), (compress, mmap, backend))
+                        self.assertTrue(images_equal(loaded.get_grid_filter_tile(), converter.get_grid_filter_tile()))
+                        self.assertEqual(loaded.get_settings(), converter.get_settings())
+                        del loaded
+
+            arrays = dict(np.load(file_name))
+            arrays["settings"] = np.array(str(arrays["settings"]).replace("384", "385"))
+            np.savez(file_name, **arrays)
+            with self.assertRaises(ValueError):
+                Pixelgreat.load_compiled(file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
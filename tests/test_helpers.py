@@ -1,8 +1,14 @@
 import unittest
 import tempfile
 import os
+import io
+import math
+import zlib
+
+from PIL import Image, ImageChops
 
 from pixelgreat import helpers
+from pixelgreat.constants import PngStrategy
 
 
 class TestHelpers(unittest.TestCase):
@@ -92,11 +98,168 @@ class TestHelpers(unittest.TestCase):
         pass
 
     def test_tile_image(self):
-        pass
+        # 1) A box of the tiled image must match the same crop of the full tiled image
+        image_tile = Image.effect_noise((7, 5), 80).convert("RGB")
+        size = (100, 61)
+        for count in (None, (13.3, 7.7), (3, 2.5)):
+            full_image = helpers.tile_image(image_tile, size, count=count)
+            for box in ((0, 0, 100, 61), (3, 5, 4, 6), (17, 0, 64, 40), (50, 30, 100, 61), (99, 60, 100, 61)):
+                region = helpers.tile_image(image_tile, size, count=count, box=box)
+                self.assertIsNone(ImageChops.difference(region, full_image.crop(box)).getbbox(), (count, box))
 
     def test_lighten_image(self):
         pass
 
+    def test_resize_nearest_region(self):
+        # 1) Regions of a NEAREST upscale must match a crop of the full upscale
+        small_image = Image.effect_noise((13, 7), 80).convert("RGB")
+        size = (100, 61)
+        full_image = small_image.resize(size, resample=Image.Resampling.NEAREST)
+        for box in ((0, 0, 100, 61), (3, 5, 4, 6), (17, 0, 64, 40), (50, 30, 100, 61)):
+            region = helpers.resize_nearest_region(small_image, size, box)
+            self.assertIsNone(ImageChops.difference(region, full_image.crop(box)).getbbox())
+
+        # 2) Without resizing, it's the same as a crop
+        self.assertIsNone(ImageChops.difference(
+            helpers.resize_nearest_region(full_image, size, (17, 0, 64, 40)),
+            full_image.crop((17, 0, 64, 40))
+        ).getbbox())
+
+    def test_snap_box(self):
+        # 1) Boxes grow outwards to the period and are clipped to the size
+        self.assertEqual(helpers.snap_box((5, 5, 15, 15), (10, 4), (100, 100)), (0, 4, 20, 16))
+        self.assertEqual(helpers.snap_box((95, 5, 97, 15), (10, 10), (98, 100)), (90, 0, 98, 20))
+
+    def test_get_save_options(self):
+        # 1) Options only apply to their own format
+        self.assertEqual(
+            helpers.get_save_options(".png", png_compress_level=1, png_strategy=PngStrategy.RLE, jpeg_quality=90),
+            {"compress_level": 1, "compress_type": zlib.Z_RLE}
+        )
+        self.assertEqual(
+            helpers.get_save_options(".JPG", png_compress_level=1, jpeg_quality=90, jpeg_subsampling=0),
+            {"quality": 90, "subsampling": 0}
+        )
+        self.assertEqual(helpers.get_save_options(".webp", webp_method=0), {"lossless": True, "method": 0})
+        self.assertEqual(helpers.get_save_options(".png"), {})
+
+    def test_get_save_mode(self):
+        # 1) Keep the mode if the format supports it, otherwise fall back to RGB
+        self.assertEqual(helpers.get_save_mode("RGBA", ".png"), "RGBA")
+        self.assertEqual(helpers.get_save_mode("RGBA", ".jpg"), "RGB")
+        self.assertEqual(helpers.get_save_mode("RGB", ".bmp"), "RGB")
+
+    def test_draft_image(self):
+        # 1) JPEGs are decoded at the smallest power of two reduction that isn't smaller than the size
+        # 2) Other formats, and no size, are decoded at full size
+        for ext, size, reduced_size in ((".jpg", (120, 40), (200, 80)), (".jpg", None, (800, 320)),
+                                        (".png", (100, 40), (800, 320))):
+            output = io.BytesIO()
+            Image.new("RGB", (800, 320), (200, 100, 50)).save(output, format=helpers.get_format_for_extension(ext))
+            image = Image.open(output)
+            self.assertEqual(helpers.draft_image(image, size), reduced_size != (800, 320))
+            image.load()
+            self.assertEqual(image.size, reduced_size)
+            self.assertEqual(image.mode, "RGB")
+
+    def test_parse_sequenced_image_name(self):
+        # 1) The whole trailing number is found, in the right order
+        info = helpers.parse_sequenced_image_name(os.path.join("frames", "shot2_0120.png"))
+        self.assertEqual(info["image_number"], 120)
+        self.assertEqual(info["digits"], 4)
+        self.assertEqual(info["prefix"], os.path.join("frames", "shot2_"))
+        self.assertIsNotNone(helpers.parse_sequenced_image_name("frames.png")["error"])
+
+    def test_get_all_images_in_sequence(self):
+        # 1) Frames are sorted by number, other files are ignored, and gaps are found
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ["f0010.png", "f0002.png", "f0003.png", "f0007.png", "f12.png", "g0001.png", "f0004.jpg"]:
+                open(os.path.join(temp_dir, name), "wb").close()
+
+            info = helpers.get_all_images_in_sequence(os.path.join(temp_dir, "f0003.png"))
+            self.assertEqual(info["numbers"], [2, 3, 7, 10])
+            self.assertEqual(info["files"][0], os.path.join(temp_dir, "f0002.png"))
+            self.assertEqual(info["missing"], [(4, 6), (8, 9)])
+
+            # 2) Ranges and steps
+            info = helpers.get_all_images_in_sequence(os.path.join(temp_dir, "f0003.png"), start=1, end=12, step=3)
+            self.assertEqual(info["numbers"], [7, 10])
+            self.assertEqual(info["missing"], [(1, 4)])
+            self.assertEqual(helpers.format_frame_ranges(info["missing"], 3), "1-4 (every 3)")
+
+    def test_get_missing_frames(self):
+        self.assertEqual(helpers.get_missing_frames([3, 4, 7]), [(5, 6)])
+        self.assertEqual(helpers.get_missing_frames([3, 4, 7], start=0, end=9), [(0, 2), (5, 6), (8, 9)])
+        self.assertEqual(helpers.get_missing_frames([], start=0, end=4, step=2), [(0, 4)])
+
+    def test_resample_blur_region(self):
+        import numpy as np
+
+        source = Image.effect_noise((30, 20), 60).convert("RGB")
+        size = (100, 70)
+        radius = 3
+
+        # 1) The same as a NEAREST upscale blurred by an exact gaussian (with the edge pixels repeated)
+        expected = np.asarray(source.resize(size, resample=Image.Resampling.NEAREST)).astype(np.float64)
+        halo = helpers.get_blur_halo(radius)
+        kernel = [math.exp(-(offset * offset) / (2 * radius * radius)) for offset in range(-halo, halo + 1)]
+        for axis in [0, 1]:
+            length = expected.shape[axis]
+            expected = sum(
+                weight * np.take(expected, np.clip(np.arange(length) + offset, 0, length - 1), axis=axis)
+                for offset, weight in zip(range(-halo, halo + 1), kernel)
+            ) / sum(kernel)
+        result = helpers.resample_blur_region(source, size, (0, 0) + size, radius)
+        self.assertLessEqual(np.abs(np.asarray(result) - expected).max(), 0.5 + 1e-3)
+
+        # 2) Any box is the same as cropping the full image
+        for box in [(0, 0, 1, 1), (13, 7, 99, 70), (40, 30, 41, 69)]:
+            self.assertIsNone(ImageChops.difference(
+                helpers.resample_blur_region(source, size, box, radius),
+                result.crop(box)
+            ).getbbox())
+
+    def test_shard(self):
+        self.assertEqual(helpers.shard("2/4"), (2, 4))
+        for value in ["0/4", "5/4", "2", "a/b"]:
+            with self.assertRaises(ValueError):
+                helpers.shard(value)
+
+    def test_get_shard_numbers(self):
+        # 1) Every frame is in exactly one shard, in blocks or interleaved
+        numbers = list(range(10, 20))
+        for interleaved in [False, True]:
+            shards = [helpers.get_shard_numbers(numbers, index, 3, interleaved=interleaved, start=10, end=19)
+                      for index in range(1, 4)]
+            self.assertEqual(sorted(sum(shards, [])), numbers)
+        self.assertEqual(helpers.get_shard_numbers(numbers, 1, 3, start=10, end=19), [10, 11, 12, 13])
+        self.assertEqual(helpers.get_shard_numbers(numbers, 2, 3, interleaved=True), [10, 13, 16, 19])
+        self.assertEqual(helpers.get_shard_numbers([1, 3, 5, 7], 2, 2, interleaved=True, step=2), [3, 7])
+
+        # 2) A missing frame (even the first or the last one) doesn't move the other frames to another shard
+        for missing in [10, 11, 19]:
+            without_frame = [number for number in numbers if number != missing]
+            for interleaved in [False, True]:
+                for index in range(1, 4):
+                    self.assertEqual(
+                        helpers.get_shard_numbers(without_frame, index, 3, interleaved=interleaved, start=10, end=19),
+                        [number for number in helpers.get_shard_numbers(numbers, index, 3, interleaved=interleaved,
+                                                                        start=10, end=19) if number != missing]
+                    )
+
+        # 3) Blocks need the whole range, it can't be guessed from the frames that were found
+        with self.assertRaises(ValueError):
+            helpers.get_shard_numbers(numbers, 1, 3, start=10)
+
+    def test_find_sequence_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ["f0001.png", "f0002.png", "f2.png", "f0003.jpg", "g0001.png"]:
+                open(os.path.join(temp_dir, name), "wb").close()
+
+            found = helpers.find_sequence_files(os.path.join(temp_dir, "f"), ".png")
+            self.assertEqual(sorted(found), [1, 2])
+            self.assertEqual(len(found[2]), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+import tempfile
+import io
+import contextlib
+import json
+import sys
+import os
+from PIL import Image
+
+from pixelgreat import core
+from pixelgreat.profiling import get_percentile
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((96, 72))
+
+
+class TestProgress(unittest.TestCase):
+    def test_progress_json(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for number in range(3):
+                test_image.rotate(number).save(os.path.join(temp_dir, f"frame{number:04}.png"))
+            argv = ["-i", os.path.join(temp_dir, "frame0000.png"), "-o", os.path.join(temp_dir, "out", "a.png"),
+                    "-s", "12", "-v", f"o={os.path.join(temp_dir, 'out', 'b.png')}"]
+
+            for encode_threads in ["0", "2"]:
+                progress = io.StringIO()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    core.convert_sequence(core.parse_args_sequence(argv + ["-et", encode_threads]),
+                                          progress_stream=progress)
+                events = [json.loads(line) for line in progress.getvalue().splitlines()]
+
+                # 1) A start event, one event for every frame (in order, once both outputs are saved), and a summary
+                self.assertEqual([event["event"] for event in events], ["start", "frame", "frame", "frame", "summary"])
+                frames = events[1:-1]
+                self.assertEqual([event["frame"] for event in frames], [0, 1, 2])
+                sizes = [os.path.getsize(os.path.join(temp_dir, "out", f"{name}{number:04}.png"))
+                         for number in range(3) for name in ["a", "b"]]
+                self.assertEqual(sum(event["bytes"] for event in frames), sum(sizes))
+                self.assertEqual(frames[-1]["bytes_total"], sum(sizes))
+                self.assertEqual(frames[-1]["eta"], 0)
+                for event in frames:
+                    self.assertGreater(event["apply"], 0)
+                    self.assertGreater(event["encode"], 0)
+                    self.assertGreaterEqual(event["latency"], event["decode"] + event["apply"])
+
+                # 2) The summary has the latency percentiles
+                summary = events[-1]
+                self.assertEqual(summary["frames"], 3)
+                latencies = sorted(event["latency"] for event in frames)
+                self.assertEqual(summary["latency"], {"p50": latencies[1], "p95": latencies[2], "p99": latencies[2]})
+                self.assertEqual(summary["utilization"]["encode"] is None, encode_threads == "0")
+
+    def test_progress_json_file(self):
+        # 1) The progress file's folder is made if it doesn't exist yet, the same as the output folder
+        with tempfile.TemporaryDirectory() as temp_dir:
+            test_image.save(os.path.join(temp_dir, "frame0000.png"))
+            progress_name = os.path.join(temp_dir, "progress", "p.jsonl")
+            argv = ["pixelgreat-sequence", "-i", os.path.join(temp_dir, "frame0000.png"),
+                    "-o", os.path.join(temp_dir, "out", "a.png"), "-s", "12", "-pj", progress_name]
+            with mock.patch.object(sys, "argv", argv), contextlib.redirect_stdout(io.StringIO()):
+                core.sequence()
+            with open(progress_name) as progress_file:
+                events = [json.loads(line) for line in progress_file]
+            self.assertEqual([event["event"] for event in events], ["start", "frame", "summary"])
+
+    def test_get_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(get_percentile(values, 50), 50)
+        self.assertEqual(get_percentile(values, 99), 99)
+        self.assertEqual(get_percentile(values, 0), 1)
+        self.assertIsNone(get_percentile([], 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+from PIL import Image, ImageChops
+
+from pixelgreat import Pixelgreat, ScreenType
+from pixelgreat.session import Session
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((192, 144))
+
+
+# Check if two images are exactly the same
+def images_equal(image_a, image_b):
+    return image_a.size == image_b.size and ImageChops.difference(image_a, image_b).getbbox() is None
+
+
+class TestSession(unittest.TestCase):
+    def make_session(self):
+        return Session(test_image, (384, 288), 12, screen_type=ScreenType.CRT_TV)
+
+    def test_render(self):
+        # 1) Every render must match a new Pixelgreat object with the same settings
+        session = self.make_session()
+        for changes in [{}, {"bloom_strength": 0.5}, {"washout": 0.2, "blur": 0.3},
+                        {"screen_type": ScreenType.LCD}, {"brighten": 0.2, "pixelate": False}]:
+            settings = dict(output_size=(384, 288), pixel_size=12, screen_type=ScreenType.CRT_TV)
+            settings.update(changes)
+            self.assertTrue(images_equal(session.render(**changes), Pixelgreat(**settings).apply(test_image)), changes)
+
+    def test_only_downstream_stages_run(self):
+        # 1) A change only re-runs the stage it affects and the stages after it
+        session = self.make_session()
+        session.render()
+        self.assertEqual(session.last_run, ["tone", "pixelate", "blur", "scanline", "washout", "grid", "bloom"])
+        session.render(bloom_strength=0.5)
+        self.assertEqual(session.last_run, ["bloom"])
+
+        # 2) Going back to cached settings doesn't run anything
+        session.render()
+        self.assertEqual(session.last_run, [])
+
+        session.render(grid_strength=0.5)
+        self.assertEqual(session.last_run, ["grid", "bloom"])
+
+        # 3) Unknown settings are rejected
+        with self.assertRaises(ValueError):
+            session.update(output_scale=2)
+
+    def test_sweep(self):
+        # 1) Every combination is rendered, in the order of itertools.product()
+        session = self.make_session()
+        grid = {"bloom_strength": [0.0, 1.0], "brighten": [0.0, 0.5]}
+        results = session.sweep(grid)
+        self.assertEqual([changes for changes, image in results], [
+            {"bloom_strength": 0.0, "brighten": 0.0},
+            {"bloom_strength": 0.0, "brighten": 0.5},
+            {"bloom_strength": 1.0, "brighten": 0.0},
+            {"bloom_strength": 1.0, "brighten": 0.5}
+        ])
+        for changes, image in results:
+            self.assertTrue(images_equal(image, session.render(**changes)))
+
+        # 2) The contact sheet has one thumbnail for each combination
+        sheet = session.contact_sheet(grid, columns=2, thumbnail_width=96)
+        self.assertEqual(sheet.width, 192)
+
+
+if __name__ == '__main__':
+    unittest.main()
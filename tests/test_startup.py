@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import json
+import subprocess
+
+package_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The import time budget is only checked when asked to (PIXELGREAT_PERF=check), wall-clock times vary on shared machines
+PERF_MODE = os.environ.get("PIXELGREAT_PERF")
+
+# The most time a cold "import pixelgreat" may take, in seconds (best of a few runs)
+# It takes about 45 ms (most of it is importing Pillow), it took about 90 ms before the heavy imports were made lazy
+STARTUP_BUDGET = float(os.environ.get("PIXELGREAT_STARTUP_BUDGET", 0.075))
+
+# Modules that must only be imported when the features that need them are used
+LAZY_MODULES = [
+    "pixelgreat.filters",
+    "pixelgreat.backends",
+    "pixelgreat.archive",
+    "pixelgreat.profiling",
+    "numpy",
+    "asyncio",
+    "concurrent.futures",
+    "tracemalloc",
+    "tarfile",
+    "zipfile",
+    "hashlib",
+    "json"
+]
+
+# Imports pixelgreat in a fresh interpreter and reports what it cost
+STARTUP_SCRIPT = """
+import sys
+import time
+modules_before = set(sys.modules)
+start_time = time.perf_counter()
+import pixelgreat
+end_time = time.perf_counter()
+modules_after = set(sys.modules)
+import json
+from PIL import Image
+print(json.dumps({
+    "seconds": end_time - start_time,
+    "plugins_loaded": Image._initialized,
+    "modules_loaded": [name for name in sys.argv[1:] if name in modules_after and name not in modules_before]
+}))
+"""
+
+
+def measure_startup():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = package_dir + os.pathsep + env.get("PYTHONPATH", "")
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT] + LAZY_MODULES,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_lazy(self):
+        # 1) Importing the package must not load the Pillow plugins, the filters, or any other heavy module
+        result = measure_startup()
+        self.assertEqual(result["plugins_loaded"], 0)
+        self.assertEqual(result["modules_loaded"], [])
+
+    @unittest.skipUnless(PERF_MODE in ["check", "record"], "Set PIXELGREAT_PERF=check or record to run")
+    def test_import_time_budget(self):
+        # 1) The best cold import time of a few runs must be within the budget
+        best_time = min(measure_startup()["seconds"] for x in range(3))
+        self.assertLess(best_time, STARTUP_BUDGET)
+
+    def test_supported_extensions(self):
+        # 1) The lazy value must still be available from the package
+        import pixelgreat
+        self.assertIn(".png", pixelgreat.SUPPORTED_EXTENSIONS)
+        self.assertIs(pixelgreat.SUPPORTED_EXTENSIONS, pixelgreat.get_supported_extensions())
+
+
+if __name__ == '__main__':
+    unittest.main()
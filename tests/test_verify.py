@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+import io
+import contextlib
+import os
+from PIL import Image
+
+from pixelgreat import helpers, core
+from pixelgreat.archive import SequenceArchive
+
+tests_dir = os.path.dirname(os.path.realpath(__file__))
+
+test_image = Image.open(os.path.join(tests_dir, "images", "PM5544.png")).convert("RGB").resize((96, 72))
+
+
+class TestVerify(unittest.TestCase):
+    def test_verify_sequence_output(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            frame = helpers.encode_image(test_image, ".png")
+            image_out = os.path.join(temp_dir, "out", "frame.png")
+            os.mkdir(os.path.dirname(image_out))
+
+            # 1) Frames that are missing, saved twice (with a different number of digits) or out of range are found
+            for name in ["frame0000.png", "frame0001.png", "frame0003.png", "frame003.png", "frame0009.png"]:
+                with open(os.path.join(temp_dir, "out", name), "wb") as file:
+                    file.write(frame)
+            self.assertEqual(core.verify_sequence_output([0, 1, 2, 3], image_out),
+                             {"missing": [2], "duplicated": [3], "unexpected": [9]})
+
+            # 2) Several archives are checked together
+            archives = [os.path.join(temp_dir, "part1.tar"), os.path.join(temp_dir, "part2.zip")]
+            for archive_name, names in zip(archives, [["frame0000.png", "frame0001.png"],
+                                                      ["frame0001.png", "frame0003.png"]]):
+                with SequenceArchive(archive_name) as archive:
+                    for name in names:
+                        archive.add(name, frame)
+            self.assertEqual(core.verify_sequence_output([0, 1, 2, 3], image_out, archives=archives),
+                             {"missing": [2], "duplicated": [1], "unexpected": []})
+
+    def test_verify(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            frame = helpers.encode_image(test_image, ".png")
+            for folder in ["in", "out"]:
+                os.mkdir(os.path.join(temp_dir, folder))
+            for number in range(4):
+                with open(os.path.join(temp_dir, "in", f"frame{number:04}.png"), "wb") as file:
+                    file.write(frame)
+            argv = ["-i", os.path.join(temp_dir, "in", "frame0000.png"), "-o", os.path.join(temp_dir, "out", "a.png")]
+
+            def run(names, extra_argv=None):
+                for name in os.listdir(os.path.join(temp_dir, "out")):
+                    os.remove(os.path.join(temp_dir, "out", name))
+                for name in names:
+                    with open(os.path.join(temp_dir, "out", name), "wb") as file:
+                        file.write(frame)
+                with contextlib.redirect_stdout(io.StringIO()) as output:
+                    core.verify(argv + (extra_argv or list()))
+                return output.getvalue()
+
+            # 1) A complete output passes, frames out of the range are only a warning
+            self.assertIn("exactly once", run(["a0000.png", "a0001.png", "a0002.png", "a0003.png", "a0007.png"]))
+            self.assertIn("exactly once", run(["a0001.png", "a0002.png"], ["-fs", "1", "-fe", "2"]))
+
+            # 2) Missing or duplicated frames fail
+            for names in [["a0000.png", "a0001.png", "a0003.png"],
+                          ["a0000.png", "a0001.png", "a0002.png", "a0003.png", "a003.png"]]:
+                with self.assertRaises(SystemExit):
+                    run(names)
+
+
+if __name__ == '__main__':
+    unittest.main()